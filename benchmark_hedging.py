@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+天气对冲测试：本地启动注入延迟的彩云和Open-Meteo替身服务，检查对冲的触发次数、
+胜出方、上游调用次数，以及缓存命中不会压低对冲延迟
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from src.hedging import Hedger, LatencyTracker
+from src.http_client import HttpTransport
+from src.weather import WeatherAPI
+from src.weather_cache import WeatherCache
+from src.weather_providers import OpenMeteoProvider
+
+class StubServer:
+    """注入延迟的本地替身服务，慢请求按slow_ratio的比例出现"""
+    
+    def __init__(self, respond, latency: float, slow_latency: float = 0.0, slow_ratio: float = 0.0):
+        self.respond = respond
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.slow_ratio = slow_ratio
+        self.calls = 0
+        self._rng = random.Random(7)
+        self._lock = threading.Lock()
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.calls += 1
+                    slow = stub._rng.random() < stub.slow_ratio
+                time.sleep(stub.slow_latency if slow else stub.latency)
+                body = json.dumps(stub.respond(urlsplit(self.path).path)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    
+    @property
+    def url(self) -> str:
+        """服务地址"""
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+    
+    def shutdown(self):
+        """停止服务"""
+        self._server.shutdown()
+
+def caiyun_response(path: str) -> dict:
+    """与彩云综合接口同结构的响应"""
+    hourly = {
+        "temperature": [{"value": 20 + i % 3} for i in range(48)],
+        "humidity": [{"value": 0.5} for _ in range(48)],
+        "skycon": [{"value": "CLOUDY"} for _ in range(48)],
+        "wind": [{"speed": 2, "direction": 10} for _ in range(48)],
+        "precipitation": [{"value": 0.0} for _ in range(48)],
+    }
+    realtime = {
+        "temperature": 21, "humidity": 0.5, "pressure": 100000, "visibility": 10, "skycon": "CLOUDY",
+        "wind": {"speed": 3, "direction": 90}, "precipitation": {"local": {"intensity": 0}},
+        "air_quality": {"aqi": {"chn": 40}, "pm25": 10, "pm10": 20},
+    }
+    return {"status": "ok", "result": {"realtime": realtime, "hourly": hourly, "daily": {}, "alert": {}}}
+
+def open_meteo_response(path: str) -> dict:
+    """与Open-Meteo forecast接口同结构的响应"""
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    times = [(now + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(48)]
+    return {
+        "current": {
+            "time": now.strftime("%Y-%m-%dT%H:%M"), "temperature_2m": 20.0, "relative_humidity_2m": 60,
+            "surface_pressure": 1012, "wind_speed_10m": 7.2, "wind_direction_10m": 90,
+            "weather_code": 3, "precipitation": 0, "visibility": 10000,
+        },
+        "hourly": {
+            "time": times,
+            "temperature_2m": [20.0] * 48, "relative_humidity_2m": [60] * 48, "weather_code": [3] * 48,
+            "wind_speed_10m": [7.2] * 48, "wind_direction_10m": [90] * 48, "precipitation": [0] * 48,
+        },
+    }
+
+def run(label: str, api: WeatherAPI, hedger: Hedger, caiyun: StubServer, open_meteo: StubServer,
+        requests_count: int, locations: int, base_longitude: float = 100.0):
+    """请求requests_count次，位置在locations个网格间轮换"""
+    caiyun.calls = open_meteo.calls = 0
+    latencies = []
+    sources = {}
+    for i in range(requests_count):
+        longitude = base_longitude + (i % locations) * 0.1
+        start = time.monotonic()
+        data = api.get_weather(longitude, 39.9)
+        latencies.append(time.monotonic() - start)
+        source = data.source if data else "失败"
+        sources[source] = sources.get(source, 0) + 1
+    
+    stats = hedger.get_stats()
+    p95 = f"{stats['p95'] * 1000:.0f}ms" if stats["p95"] is not None else "样本不足"
+    print(f"\n【{label}】")
+    print(f"  耗时 中位数 {statistics.median(latencies) * 1000:.0f}ms，最大 {max(latencies) * 1000:.0f}ms")
+    print(f"  对冲 {stats['hedged']}/{stats['calls']} 次（累计），备用胜出 {stats['secondary_wins']} 次，"
+          f"彩云p95 {p95}，对冲延迟 {stats['hedge_delay'] * 1000:.0f}ms")
+    print(f"  上游调用 彩云 {caiyun.calls} 次，Open-Meteo {open_meteo.calls} 次")
+    print(f"  数据来源 {sources}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="天气对冲测试")
+    parser.add_argument("--requests", type=int, default=60, help="每个场景的请求次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="彩云正常耗时（秒）")
+    parser.add_argument("--slow-latency", type=float, default=1.5, help="彩云慢请求耗时（秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.04, help="彩云慢请求比例")
+    parser.add_argument("--fallback-latency", type=float, default=0.1, help="Open-Meteo耗时（秒）")
+    args = parser.parse_args()
+    
+    caiyun = StubServer(caiyun_response, args.latency, args.slow_latency, args.slow_ratio)
+    open_meteo = StubServer(open_meteo_response, args.fallback_latency)
+    transport = HttpTransport(max_retries=0)
+    fallback = OpenMeteoProvider(open_meteo.url, transport=transport)
+    
+    def build(cache):
+        hedger = Hedger(LatencyTracker(min_samples=10), quantile=0.95)
+        api = WeatherAPI("stub-key", transport=transport, cache=cache, base_url=caiyun.url,
+                         fallback=fallback, hedger=hedger)
+        return api, hedger
+    
+    try:
+        # 无缓存：每次都请求彩云，只有慢请求才应触发对冲
+        api, hedger = build(cache=False)
+        run("无缓存，彩云偶发慢请求", api, hedger, caiyun, open_meteo, args.requests, locations=args.requests)
+        
+        # 有缓存：少量位置反复请求，大部分命中缓存；命中不应计入耗时样本，
+        # 彩云p95应与无缓存时接近，对冲次数不应明显增加
+        api, hedger = build(cache=WeatherCache(max_entries=1024, ttls={"weather": 3600}))
+        run("有缓存，多数请求命中", api, hedger, caiyun, open_meteo, args.requests, locations=5)
+        
+        # 继续请求新位置：命中缓存之后的真实请求仍按网络耗时对冲
+        caiyun.slow_ratio = 0.0
+        run("有缓存后请求新位置，彩云无慢请求", api, hedger, caiyun, open_meteo, args.requests // 2,
+            locations=args.requests // 2, base_longitude=110.0)
+    finally:
+        caiyun.shutdown()
+        open_meteo.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+热搜解析基准测试：比较逐次拆分路径的旧解析方式与编译后的SourceExtractor
+
+默认使用 benchmarks/payloads/<数据源>.json 中的响应样例，--record 从线上接口重新录制。
+"""
+
+import argparse
+import json
+import os
+import timeit
+from src.hotsearch import HotSearchAPI
+from src.hotsearch_sources import SourceExtractor
+
+# 响应样例目录
+PAYLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "payloads")
+
+def set_path(data: dict, path: str, value):
+    """按点分路径写入嵌套字典"""
+    keys = path.split(".")
+    for key in keys[:-1]:
+        data = data.setdefault(key, {})
+    data[keys[-1]] = value
+
+def build_payload(definition: dict, count: int) -> dict:
+    """按数据源定义构造与真实响应同结构的载荷"""
+    items = []
+    for i in range(count):
+        item = {"id": i, "extra": {"cover": f"https://example.com/{i}.jpg"}}
+        set_path(item, definition["title_key"], f"热搜话题 第{i + 1}条 #{definition['name']}")
+        if definition.get("hot_key"):
+            set_path(item, definition["hot_key"], 1000000 - i * 997)
+        # 约一半条目没有直接链接，走URL模板
+        if definition.get("url_key") and i % 2 == 0:
+            set_path(item, definition["url_key"], f"https://example.com/item/{i}")
+        items.append(item)
+    if not definition["path"]:
+        return items
+    payload = {}
+    set_path(payload, definition["path"], items)
+    return payload
+
+def get_nested_value(data, path: str):
+    """旧解析方式的取值：每次调用都拆分点分路径"""
+    keys = path.split('.')
+    value = data
+    try:
+        for key in keys:
+            if isinstance(value, list) and key.isdigit():
+                value = value[int(key)]
+            else:
+                value = value[key]
+        return value
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def legacy_extract(definition: dict, payload: dict, limit: int) -> list:
+    """旧解析方式：每个字段每次都拆分路径，循环内导入urllib.parse"""
+    rows = []
+    items_data = get_nested_value(payload, definition["path"])
+    for i, item_data in enumerate(items_data[:limit], 1):
+        title = get_nested_value(item_data, definition["title_key"])
+        hot_value = get_nested_value(item_data, definition["hot_key"])
+        url = get_nested_value(item_data, definition["url_key"]) if definition["url_key"] else ""
+        if not url and definition.get("url_template"):
+            if "{}" in definition["url_template"]:
+                import urllib.parse
+                encoded_title = urllib.parse.quote(str(title))
+                url = definition["url_template"].format(encoded_title)
+            else:
+                url = definition["url_template"]
+        if title:
+            rows.append((i, str(title), str(url) if url else "", str(hot_value) if hot_value else ""))
+    return rows
+
+def compiled_extract(extractor: SourceExtractor, payload: dict, limit: int) -> list:
+    """编译后的解析方式"""
+    return extractor.extract(extractor.get_list(payload), limit)
+
+def load_payload(directory: str, source: str):
+    """读取录制的响应（<数据源>.json），不存在时返回None"""
+    path = os.path.join(directory, f"{source}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def record_payloads(api: HotSearchAPI, directory: str, timeout: float = 10.0):
+    """请求各数据源并把原始响应写入 <数据源>.json"""
+    os.makedirs(directory, exist_ok=True)
+    for source, definition in api.api_configs.items():
+        try:
+            payload = api.fetch_raw(SourceExtractor(source, definition), timeout)
+        except Exception as e:
+            print(f"❌ {source} 录制失败: {e}")
+            continue
+        with open(os.path.join(directory, f"{source}.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.write("\n")
+        print(f"✅ {source} 已录制")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="热搜解析基准测试")
+    parser.add_argument("--payloads", default=PAYLOADS_DIR,
+                        help="响应样例目录，文件名为 <数据源>.json；缺少的数据源使用构造的载荷")
+    parser.add_argument("--record", action="store_true", help="先从线上接口录制响应写入样例目录")
+    parser.add_argument("--items", type=int, default=50, help="构造载荷的条目数")
+    parser.add_argument("--limit", type=int, default=15, help="每个数据源解析的条目数")
+    parser.add_argument("--number", type=int, default=2000, help="每个数据源的重复次数")
+    args = parser.parse_args()
+    
+    api = HotSearchAPI()
+    if args.record:
+        record_payloads(api, args.payloads)
+    
+    total_legacy = total_compiled = 0.0
+    print(f"{'数据源':<10}{'旧方式(μs/次)':>14}{'编译后(μs/次)':>14}{'加速':>8}  载荷")
+    for source, definition in api.api_configs.items():
+        payload = load_payload(args.payloads, source)
+        origin = "样例"
+        if payload is None:
+            payload = build_payload(definition, args.items)
+            origin = "构造"
+        
+        extractor = SourceExtractor(source, definition)
+        legacy_rows = legacy_extract(definition, payload, args.limit)
+        compiled_rows = compiled_extract(extractor, payload, args.limit)
+        if legacy_rows != compiled_rows:
+            print(f"❌ {source} 两种方式的解析结果不一致")
+            continue
+        
+        legacy = timeit.timeit(lambda: legacy_extract(definition, payload, args.limit), number=args.number)
+        compiled = timeit.timeit(lambda: compiled_extract(extractor, payload, args.limit), number=args.number)
+        total_legacy += legacy
+        total_compiled += compiled
+        print(f"{source:<12}{legacy / args.number * 1e6:>14.1f}{compiled / args.number * 1e6:>14.1f}"
+              f"{legacy / compiled:>8.2f}x  {origin}（{len(compiled_rows)}条）")
+    
+    if total_compiled:
+        print(f"\n总计加速 {total_legacy / total_compiled:.2f}x")
+
+if __name__ == "__main__":
+    main()
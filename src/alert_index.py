@@ -0,0 +1,87 @@
+"""已推送天气预警索引模块"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+from loguru import logger
+from .weather import WeatherAlert
+
+class AlertIndex:
+    """已推送预警的持久化索引
+    
+    启动时从SQLite载入内存集合，轮询时判断预警是否推送过只是一次集合查找；
+    同时按(位置, 预警类型)记录推送过的最高等级，用于识别预警升级。
+    """
+    
+    def __init__(self, path: Optional[str] = None, retention_days: float = 7.0):
+        self.path = path
+        self.retention = retention_days * 86400
+        
+        self._seen: Set[str] = set()
+        self._levels: Dict[Tuple[str, str], int] = {}  # (位置, 预警类型) -> 最高等级
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """打开数据库，清理过期记录并载入内存索引"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_alerts (
+                    alert_id TEXT PRIMARY KEY,
+                    location TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    seen_at REAL NOT NULL
+                )
+            """)
+            conn.execute("DELETE FROM seen_alerts WHERE seen_at < ?", (time.time() - self.retention,))
+            for alert_id, location, code in conn.execute("SELECT alert_id, location, code FROM seen_alerts"):
+                self._remember(alert_id, location, WeatherAlert(alert_id=alert_id, title="", code=code))
+            self._conn = conn
+            logger.info(f"已载入 {len(self._seen)} 条已推送预警记录")
+        except sqlite3.Error as e:
+            logger.warning(f"打开预警索引失败，只在内存中记录: {e}")
+    
+    def _remember(self, alert_id: str, location: str, alert: WeatherAlert):
+        """写入内存索引"""
+        self._seen.add(alert_id)
+        key = (location, alert.alert_type)
+        self._levels[key] = max(self._levels.get(key, 0), alert.level)
+    
+    def is_seen(self, alert_id: str) -> bool:
+        """预警是否已推送过"""
+        return alert_id in self._seen
+    
+    def is_upgrade(self, location: str, alert: WeatherAlert) -> bool:
+        """同一位置的同类预警此前以较低等级推送过"""
+        previous = self._levels.get((location, alert.alert_type), 0)
+        return 0 < previous < alert.level
+    
+    def mark(self, alerts: Iterable[Tuple[str, WeatherAlert]]):
+        """记录已推送的(位置, 预警)"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for location, alert in alerts:
+                self._remember(alert.alert_id, location, alert)
+                rows.append((alert.alert_id, location, alert.code, now))
+            if not self._conn or not rows:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO seen_alerts (alert_id, location, code, seen_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"写入预警索引失败: {e}")
+    
+    def __len__(self) -> int:
+        return len(self._seen)
@@ -0,0 +1,247 @@
+"""钉钉机器人异步消息推送模块"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+from loguru import logger
+from .dingtalk import (
+    DingTalkBot,
+    RobotPool,
+    RobotEndpoint,
+    NETWORK_ERRCODE,
+    LOCAL_THROTTLE_ERRCODE,
+)
+
+# 可选的aiohttp导入，未安装时只能使用同步客户端
+try:
+    import aiohttp
+    from yarl import URL
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+T = TypeVar("T")
+
+def create_session(timeout: float, max_in_flight: int) -> "aiohttp.ClientSession":
+    """创建aiohttp连接池，需在事件循环中调用"""
+    # 超时只限制连接和读取，排队等待并发名额的时间不计入
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    connector = aiohttp.TCPConnector(limit=max_in_flight, ttl_dns_cache=300)
+    return aiohttp.ClientSession(timeout=client_timeout, connector=connector)
+
+class AsyncDingTalkBot(RobotPool):
+    """基于asyncio的钉钉机器人客户端
+    
+    接口与DingTalkBot一致（发送方法为协程），大量并发发送不占用线程；
+    额度管理和机器人轮换与同步客户端相同。一个实例只在一个事件循环中使用。
+    """
+    
+    build_text_payload = staticmethod(DingTalkBot.build_text_payload)
+    build_markdown_payload = staticmethod(DingTalkBot.build_markdown_payload)
+    build_action_card_payload = staticmethod(DingTalkBot.build_action_card_payload)
+    encode_payload = staticmethod(DingTalkBot.encode_payload)
+    
+    def __init__(self, webhook_url: str, secret: Optional[str] = None, rate_limit: int = 20,
+                 robots: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 timeout: float = 10.0, max_in_flight: int = 1000,
+                 throttle_cooldown: float = 60.0, invalid_cooldown: float = 600.0,
+                 session_factory: Optional[Callable[[], "aiohttp.ClientSession"]] = None):
+        if not HAS_AIOHTTP:
+            raise RuntimeError("未安装aiohttp，无法使用异步钉钉客户端，请执行 pip install aiohttp")
+        super().__init__(webhook_url, secret, rate_limit, robots, throttle_cooldown, invalid_cooldown)
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.session_factory = session_factory  # 提供时共用外部连接池，关闭由提供方负责
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """在当前事件循环中创建连接池（首次使用时）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if self.session_factory:
+            return self.session_factory()
+        if self._session is None or self._session.closed:
+            self._session = create_session(self.timeout, self.max_in_flight)
+        return self._session
+    
+    async def close(self):
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def __aenter__(self) -> "AsyncDingTalkBot":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def warm_url(self, url: str) -> bool:
+        """请求主机根路径的HEAD，在连接池中留下可复用的连接"""
+        parts = urlsplit(url)
+        if not parts.scheme or not parts.netloc:
+            return False
+        try:
+            async with self._get_session().head(f"{parts.scheme}://{parts.netloc}/", allow_redirects=False):
+                pass
+        except Exception as e:
+            logger.debug(f"预热 {parts.netloc} 异步连接失败: {e}")
+            return False
+        return True
+    
+    async def send_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送消息体，返回钉钉响应（包含errcode和errmsg）"""
+        return await self.send_body(self.encode_payload(payload))
+    
+    async def send_body(self, body: bytes, timestamp: Optional[str] = None,
+                        wait: float = 0) -> Dict[str, Any]:
+        """发送已序列化的消息体，轮换规则与DingTalkBot.send_body相同"""
+        deadline = time.monotonic() + wait
+        tried: List[RobotEndpoint] = []
+        result = {"errcode": LOCAL_THROTTLE_ERRCODE, "errmsg": "本地发送额度已用尽"}
+        
+        while len(tried) < len(self.robots):
+            robot = self._acquire_robot(tried)
+            while robot is None and not tried and time.monotonic() < deadline:
+                await asyncio.sleep(min(max(self.time_until_token(), 0.01), max(deadline - time.monotonic(), 0.01)))
+                robot = self._acquire_robot(tried)
+            if robot is None:
+                break
+            
+            tried.append(robot)
+            result = await self._post(robot, body, timestamp)
+            if not self._should_rotate(robot, result):
+                return result
+        
+        return result
+    
+    async def _post(self, robot: RobotEndpoint, body: bytes, timestamp: Optional[str]) -> Dict[str, Any]:
+        """通过指定机器人发送请求"""
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                # 签名已经过URL编码，避免被再次编码
+                url = URL(robot.get_signed_url(timestamp), encoded=True)
+                async with session.post(
+                    url,
+                    data=body,
+                    headers={"Content-Type": "application/json; charset=utf-8"}
+                ) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except Exception as e:
+                return {"errcode": NETWORK_ERRCODE, "errmsg": str(e) or type(e).__name__}
+    
+    async def _send(self, payload: Dict[str, Any], label: str) -> bool:
+        """发送消息体并记录日志"""
+        result = await self.send_payload(payload)
+        if result.get("errcode") == 0:
+            logger.info(f"钉钉{label}消息发送成功")
+            return True
+        
+        logger.error(f"钉钉{label}消息发送失败: {result.get('errmsg')}")
+        return False
+    
+    async def send_text_message(self, content: str, at_all: bool = False) -> bool:
+        """发送文本消息"""
+        return await self._send(self.build_text_payload(content, at_all), "")
+    
+    async def send_markdown_message(self, title: str, text: str, at_all: bool = False) -> bool:
+        """发送Markdown消息"""
+        return await self._send(self.build_markdown_payload(title, text, at_all), "Markdown")
+    
+    async def send_action_card(self, title: str, text: str, single_title: str = "", single_url: str = "") -> bool:
+        """发送ActionCard消息"""
+        return await self._send(self.build_action_card_payload(title, text, single_title, single_url), "ActionCard")
+
+class EventLoopThread:
+    """在后台线程中运行的事件循环，供同步代码提交协程"""
+    
+    def __init__(self, name: str = "dingtalk-async"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._lock = threading.Lock()
+    
+    def get_session(self, timeout: float = 10.0, max_in_flight: int = 1000) -> "aiohttp.ClientSession":
+        """事件循环内共用的连接池，只能在该事件循环中调用"""
+        if self._session is None or self._session.closed:
+            self._session = create_session(timeout, max_in_flight)
+        return self._session
+    
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """首次使用时启动事件循环线程"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+    
+    def submit(self, coro: Awaitable[T]) -> Future:
+        """提交协程，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+    
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """提交协程并等待结果"""
+        return self.submit(coro).result(timeout)
+    
+    def stop(self):
+        """关闭共用连接池并停止事件循环"""
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._session is not None and self._thread.is_alive():
+                try:
+                    asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(5)
+                except Exception as e:
+                    logger.warning(f"关闭异步连接池失败: {e}")
+            self._session = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+# 全局事件循环线程，同步包装客户端共用
+event_loop_thread = EventLoopThread()
+
+class AsyncBackedDingTalkBot(DingTalkBot):
+    """同步接口的钉钉客户端，请求由后台事件循环中的AsyncDingTalkBot发出
+    
+    现有TaskBase子类、出站队列和发件箱无需修改即可使用；群发时所有目标的请求
+    在同一个事件循环中并发完成，不再为每个目标占用一个线程。
+    """
+    
+    def __init__(self, webhook_url: str, secret: Optional[str] = None, rate_limit: int = 20,
+                 robots: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 timeout: float = 10.0, max_in_flight: int = 1000, **kwargs):
+        super().__init__(webhook_url, secret, rate_limit=rate_limit, robots=robots, **kwargs)
+        self.async_bot = AsyncDingTalkBot(
+            webhook_url, secret, rate_limit=rate_limit, robots=robots,
+            timeout=timeout, max_in_flight=max_in_flight,
+            throttle_cooldown=self.throttle_cooldown, invalid_cooldown=self.invalid_cooldown,
+            session_factory=lambda: event_loop_thread.get_session(timeout, max_in_flight)
+        )
+        # 两端共用同一组机器人，额度和冷却状态保持一致
+        self.async_bot.robots = self.robots
+        self.async_bot._lock = self._lock
+    
+    def _warm_url(self, url: str) -> bool:
+        """在后台事件循环的aiohttp连接池中预热，发送时复用的是这个连接池而不是同步传输层"""
+        try:
+            return event_loop_thread.run(self.async_bot.warm_url(url), timeout=self.async_bot.timeout + 5)
+        except Exception as e:
+            logger.debug(f"预热异步连接失败: {e}")
+            return False
+    
+    def _post(self, robot: RobotEndpoint, body: bytes, timestamp: Optional[str]) -> Dict[str, Any]:
+        """在后台事件循环中发送请求并等待结果"""
+        try:
+            return event_loop_thread.run(
+                self.async_bot._post(robot, body, timestamp),
+                timeout=self.async_bot.timeout * 2 + 5
+            )
+        except Exception as e:
+            return {"errcode": NETWORK_ERRCODE, "errmsg": str(e) or type(e).__name__}
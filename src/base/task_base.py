@@ -1,18 +1,39 @@
 """任务基类"""
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
+from croniter import croniter
 from loguru import logger
 from ..dingtalk import DingTalkBot
+from ..outbound_queue import outbound_queue, MessagePriority, CompletionCallback
+from ..outbox import outbox
+from ..coalescer import coalescer
+from ..dedup import deduplicator
+from ..payload_planner import payload_planner
+from ..http_client import transport
+from ..config import config, SCHEDULER_TIMEZONE
 
 class TaskBase(ABC):
     """抽象任务基类"""
     
+    # 消息优先级，子类可覆盖
+    priority: MessagePriority = MessagePriority.NORMAL
+    
     def __init__(self, name: str, dingtalk_bot: DingTalkBot):
         self.name = name
         self.dingtalk_bot = dingtalk_bot
         self.enabled = True
         self.last_run_time = None
         self.last_error = None
+        self.cron: Optional[str] = None  # 任务的cron表达式，注册时由调度器设置
+        self.current_slot: Optional[datetime] = None  # 本次执行对应的cron触发时刻
+        self.last_delivery_latency: Optional[float] = None  # 上次从触发时刻到消息送达的秒数
+        
+        if outbox:
+            outbox.register_channel(dingtalk_bot)
     
     @abstractmethod
     def fetch_data(self) -> Optional[Dict[str, Any]]:
@@ -24,11 +45,153 @@ class TaskBase(ABC):
         """格式化消息，返回(title, content)，子类必须实现"""
         pass
     
-    def send_message(self, title: str, content: str) -> bool:
-        """发送消息到钉钉"""
+    def format_messages(self, data: Dict[str, Any]) -> List[tuple[str, str]]:
+        """格式化为一条或多条消息，默认只有format_message生成的一条"""
+        return [self.format_message(data)]
+    
+    def should_send(self, data: Dict[str, Any]) -> bool:
+        """判断本次数据是否需要推送，子类可覆盖（如只在状态变化时提醒）"""
+        return True
+    
+    def on_delivered(self, data: Dict[str, Any]):
+        """消息全部送达后的回调，子类可覆盖（如记录已推送的内容）"""
+        pass
+    
+    def get_next_poll_delay(self) -> Optional[float]:
+        """距下一次加密轮询的秒数，调度器在cron之外据此安排额外执行；None表示只按cron执行"""
+        return None
+    
+    def get_content_fingerprint(self, data: Dict[str, Any]) -> Optional[str]:
+        """返回数据语义内容的哈希，用于抑制未变化的消息；返回None表示不去重"""
+        return None
+    
+    def get_upstream_urls(self) -> List[str]:
+        """执行时会访问的上游地址，调度器在触发前据此预热连接；子类可追加数据源地址"""
+        if hasattr(self.dingtalk_bot, "get_warmup_urls"):
+            return self.dingtalk_bot.get_warmup_urls()
+        return [self.dingtalk_bot.webhook_url]
+    
+    def prewarm(self) -> int:
+        """预热上游连接，同一主机只预热一次，返回成功数
+        
+        钉钉连接由发送端通过自己的客户端预热（异步模式下为aiohttp连接池），
+        其余数据源通过共享传输层预热。
+        """
+        warmed = 0
+        hosts = set()
+        if hasattr(self.dingtalk_bot, "warm"):
+            warmed += self.dingtalk_bot.warm(hosts)
+        for url in self.get_upstream_urls():
+            host = urlsplit(url).netloc
+            if host in hosts:
+                continue
+            hosts.add(host)
+            if transport.warm(url):
+                warmed += 1
+        logger.debug(f"任务 {self.name} 预热连接 {warmed}/{len(hosts)}")
+        return warmed
+    
+    def _record_delivery_latency(self):
+        """记录从本次执行的计划触发时刻到消息送达的延迟"""
+        if not self.current_slot:
+            return
+        self.last_delivery_latency = (datetime.now(self.current_slot.tzinfo) - self.current_slot).total_seconds()
+        logger.info(f"任务 {self.name} 触发到送达耗时 {self.last_delivery_latency:.2f}秒")
+    
+    def _get_dedup_key(self) -> str:
+        """去重记录按任务和发送目标区分"""
+        return f"{self.name}->{self.dingtalk_bot.webhook_url}"
+    
+    def get_scheduled_slot(self) -> datetime:
+        """最近一次cron触发时刻，延迟启动、手动重跑都归入同一次触发；没有cron时取当前分钟"""
+        now = datetime.now(ZoneInfo(SCHEDULER_TIMEZONE))
+        if self.cron:
+            # 多算1秒，恰在触发时刻执行时取到本次而不是上一次触发
+            return croniter(self.cron, now + timedelta(seconds=1)).get_prev(datetime)
+        return now.replace(second=0, microsecond=0)
+    
+    def get_idempotency_key(self) -> str:
+        """由任务名和cron触发时刻生成幂等键，同一次触发的消息只投递一次"""
+        slot = self.current_slot or self.get_scheduled_slot()
+        return f"{self.name}@{slot.strftime('%Y%m%d%H%M')}"
+    
+    def _deliver(self, title: str, content: str, coalesce: bool = True, bot=None,
+                 on_complete: Optional[CompletionCallback] = None, sequence: int = 0) -> bool:
+        """投递消息：紧急消息直接进入出站队列，其余消息先经过合并窗口
+        
+        on_complete在发送最终结束时调用，等待超时后仍在发送的消息也会回调；
+        sequence为同一任务多条消息的顺序，合并时按此排列。
+        """
+        bot = bot or self.dingtalk_bot
+        if coalesce and coalescer and self.priority != MessagePriority.URGENT:
+            return coalescer.submit(
+                bot,
+                self.name,
+                title,
+                content,
+                priority=self.priority,
+                on_complete=on_complete,
+                sequence=sequence
+            )
+        return outbound_queue.send_markdown(
+            bot,
+            title,
+            content,
+            priority=self.priority,
+            timeout=config.outbound_send_timeout,
+            on_complete=on_complete
+        )
+    
+    def _send_part(self, idempotency_key: str, title: str, content: str, coalesce: bool,
+                   sequence: int = 0) -> bool:
+        """发送单条消息，启用发件箱时先落盘，发送结束后由回调确认或安排重放"""
+        if not outbox:
+            return self._deliver(title, content, coalesce=coalesce, sequence=sequence)
+        
+        entry = outbox.record(
+            idempotency_key, self.name, self.dingtalk_bot,
+            title, content, self.priority
+        )
+        if entry is None:
+            logger.info(f"任务 {self.name} 消息 {idempotency_key} 已投递或正在投递，跳过发送")
+            return True
+        
+        # 上次群发部分成功时只发给失败的群，这种情况不参与合并
+        bot = outbox.target_for(entry, self.dingtalk_bot)
+        if bot is None:
+            outbox.ack(entry.id)
+            return True
+        return self._deliver(
+            title, content,
+            coalesce=coalesce and not entry.delivered,
+            bot=bot,
+            on_complete=lambda success, delivered: outbox.settle(entry.id, success, delivered),
+            sequence=sequence
+        )
+    
+    def send_message(self, title: str, content: str, idempotency_key: Optional[str] = None,
+                     sequence: int = 0) -> bool:
+        """通过出站队列发送消息到钉钉
+        
+        消息体超出钉钉大小限制时先压缩，仍超限则拆分为多条依次发送。
+        启用发件箱时先落盘再发送，发送失败的消息由发件箱在后台重放。
+        """
         try:
-            success = self.dingtalk_bot.send_markdown_message(title, content)
+            parts = payload_planner.plan(title, content)
+            idempotency_key = idempotency_key or self.get_idempotency_key()
+            
+            if len(parts) == 1:
+                success = self._send_part(idempotency_key, *parts[0], coalesce=True, sequence=sequence)
+            else:
+                # 拆分后的每条都已接近大小上限，不再参与合并；各部分分别落盘和确认
+                results = [
+                    self._send_part(f"{idempotency_key}#{index}", part_title, part_content, coalesce=False)
+                    for index, (part_title, part_content) in enumerate(parts, 1)
+                ]
+                success = all(results)
+            
             if success:
+                self._record_delivery_latency()
                 logger.info(f"任务 {self.name} 消息发送成功")
             else:
                 logger.error(f"任务 {self.name} 消息发送失败")
@@ -37,6 +200,16 @@ class TaskBase(ABC):
             logger.error(f"任务 {self.name} 发送消息异常: {e}")
             return False
     
+    def _send_messages(self, messages: List[tuple[str, str]]) -> bool:
+        """并发发送多条消息，各条落入同一个合并窗口，而不是每条各等一个窗口"""
+        idempotency_key = self.get_idempotency_key()
+        with ThreadPoolExecutor(len(messages), thread_name_prefix="task-send") as executor:
+            futures = [
+                executor.submit(self.send_message, title, content, f"{idempotency_key}/{index}", index)
+                for index, (title, content) in enumerate(messages, 1)
+            ]
+            return all([future.result() for future in futures])
+    
     def execute(self) -> bool:
         """执行任务"""
         try:
@@ -48,15 +221,36 @@ class TaskBase(ABC):
                 logger.warning(f"任务 {self.name} 未获取到数据，跳过发送消息")
                 return False
             
+            if not self.should_send(data):
+                self.last_error = None
+                logger.info(f"任务 {self.name} 本次无需推送")
+                return True
+            
+            # 内容与上次送达的相同时跳过格式化和发送
+            fingerprint = self.get_content_fingerprint(data) if deduplicator else None
+            if fingerprint and deduplicator.is_duplicate(self._get_dedup_key(), fingerprint):
+                self.last_error = None
+                logger.info(f"任务 {self.name} 内容未变化，跳过发送")
+                return True
+            
             # 格式化消息
-            title, content = self.format_message(data)
+            messages = self.format_messages(data)
             
-            # 发送消息
-            success = self.send_message(title, content)
+            # 发送消息，多条消息各自使用独立的幂等键
+            if len(messages) == 1:
+                success = self.send_message(*messages[0])
+            else:
+                success = self._send_messages(messages)
             
             if success:
                 self.last_error = None
+                if fingerprint:
+                    deduplicator.remember(self._get_dedup_key(), fingerprint)
+                self.on_delivered(data)
                 logger.info(f"任务 {self.name} 执行成功")
+            elif outbox:
+                self.last_error = "消息发送失败，已存入发件箱等待重放"
+                logger.error(f"任务 {self.name} 执行失败: 消息发送失败，已存入发件箱等待重放")
             else:
                 self.last_error = "消息发送失败"
                 logger.error(f"任务 {self.name} 执行失败: 消息发送失败")
@@ -84,5 +278,6 @@ class TaskBase(ABC):
             "name": self.name,
             "enabled": self.enabled,
             "last_run_time": self.last_run_time,
-            "last_error": self.last_error
+            "last_error": self.last_error,
+            "last_delivery_latency": self.last_delivery_latency
         }
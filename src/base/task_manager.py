@@ -10,12 +10,14 @@ class TaskManager:
     def __init__(self):
         self.tasks: Dict[str, TaskBase] = {}
     
-    def register_task(self, task: TaskBase) -> bool:
-        """注册任务"""
+    def register_task(self, task: TaskBase, cron: Optional[str] = None) -> bool:
+        """注册任务，cron为任务的cron表达式，用于推算每次执行对应的触发时刻"""
         try:
             if task.name in self.tasks:
                 logger.warning(f"任务 {task.name} 已存在，将被覆盖")
             
+            if cron:
+                task.cron = cron
             self.tasks[task.name] = task
             logger.info(f"任务 {task.name} 注册成功")
             return True
@@ -47,8 +49,8 @@ class TaskManager:
         """列出所有任务名称"""
         return list(self.tasks.keys())
     
-    def execute_task(self, task_name: str) -> bool:
-        """执行指定任务"""
+    def execute_task(self, task_name: str, scheduled_time: Optional[datetime] = None) -> bool:
+        """执行指定任务，scheduled_time为本次执行的计划时刻，为空时按任务的cron取最近一次触发时刻"""
         task = self.get_task(task_name)
         if not task:
             logger.error(f"任务 {task_name} 不存在")
@@ -60,6 +62,7 @@ class TaskManager:
         
         try:
             task.last_run_time = datetime.now()
+            task.current_slot = scheduled_time or task.get_scheduled_slot()
             return task.execute()
         except Exception as e:
             logger.error(f"执行任务 {task_name} 异常: {e}")
@@ -0,0 +1,197 @@
+"""熔断器模块"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from loguru import logger
+from .config import config
+
+# 熔断器状态
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_NAMES = {CLOSED: "正常", OPEN: "熔断", HALF_OPEN: "探测"}
+
+class CircuitBreaker:
+    """单个数据源的熔断器
+    
+    滑动窗口记录最近若干次调用的成败和耗时，失败率达到阈值时熔断，熔断期间
+    直接拒绝请求；熔断时长过后放行一次探测请求，成功则恢复，失败则继续熔断。
+    请求超时取成功调用耗时的p99乘以余量，而不是固定值。
+    """
+    
+    def __init__(self, name: str, window: int = 20, min_calls: int = 3, failure_rate: float = 0.5,
+                 open_seconds: float = 600.0, default_timeout: float = 15.0, min_timeout: float = 2.0,
+                 timeout_margin: float = 1.5):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.default_timeout = default_timeout  # 样本不足时的超时，也是超时上限
+        self.min_timeout = min_timeout
+        self.timeout_margin = timeout_margin
+        
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls: Deque[Tuple[bool, float]] = deque(maxlen=window)  # (是否成功, 耗时)
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """是否放行本次请求，熔断时长已过时转为探测状态并只放行一个请求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+                logger.info(f"数据源 {self.name} 熔断时长已过，放行探测请求")
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+    
+    def record(self, success: bool, latency: float):
+        """记录一次调用结果并更新状态"""
+        with self._lock:
+            self._calls.append((success, latency))
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = CLOSED
+                    # 恢复后熔断前的失败不再计入，成功调用的耗时样本保留用于估计超时
+                    successes = [call for call in self._calls if call[0]]
+                    self._calls.clear()
+                    self._calls.extend(successes)
+                    logger.info(f"数据源 {self.name} 探测成功，熔断恢复")
+                else:
+                    self._trip("探测失败")
+                return
+            
+            failures = sum(1 for ok, _ in self._calls if not ok)
+            if (self.state == CLOSED and len(self._calls) >= self.min_calls
+                    and failures / len(self._calls) >= self.failure_rate):
+                self._trip(f"最近{len(self._calls)}次调用失败{failures}次")
+    
+    def _trip(self, reason: str):
+        """进入熔断状态，调用方需持有锁"""
+        self.state = OPEN
+        self.opened_at = time.time()
+        logger.warning(f"数据源 {self.name} 熔断{self.open_seconds:.0f}秒：{reason}")
+    
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """成功调用耗时的q分位数，样本不足时返回None"""
+        with self._lock:
+            latencies = sorted(latency for ok, latency in self._calls if ok)
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+    
+    def get_timeout(self) -> float:
+        """本次请求的超时：成功调用耗时的p99乘以余量，限制在[最小超时, 默认超时]之间"""
+        p99 = self.latency_quantile(0.99)
+        if p99 is None:
+            return self.default_timeout
+        return min(max(p99 * self.timeout_margin, self.min_timeout), self.default_timeout)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """状态、窗口内调用数、失败率、p99耗时和当前超时"""
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for ok, _ in self._calls if not ok)
+            state, opened_at = self.state, self.opened_at
+        return {
+            "name": self.name,
+            "state": state,
+            "calls": calls,
+            "failure_rate": failures / calls if calls else 0.0,
+            "p99": self.latency_quantile(0.99),
+            "timeout": self.get_timeout(),
+            "retry_in": max(opened_at + self.open_seconds - time.time(), 0.0) if state == OPEN else None,
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """导出需要持久化的状态"""
+        with self._lock:
+            return {"state": self.state, "opened_at": self.opened_at, "calls": list(self._calls)}
+    
+    def restore(self, data: Dict[str, Any]):
+        """从持久化的状态恢复，探测中的状态按熔断处理"""
+        with self._lock:
+            self.state = OPEN if data.get("state") in (OPEN, HALF_OPEN) else CLOSED
+            self.opened_at = float(data.get("opened_at", 0.0))
+            self._calls.clear()
+            self._calls.extend((bool(ok), float(latency)) for ok, latency in data.get("calls", []))
+
+class CircuitBreakerRegistry:
+    """按数据源管理熔断器，状态和耗时样本写入JSON文件
+    
+    重启后沿用之前的熔断状态和超时估计，task_manager.py status也据此展示熔断状态。
+    """
+    
+    def __init__(self, path: Optional[str] = None, **breaker_options):
+        self.path = path
+        self.breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._saved: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """读取上次保存的状态"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._saved = json.load(f).get("breakers", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取熔断器状态失败: {e}")
+    
+    def get(self, name: str) -> CircuitBreaker:
+        """获取（必要时创建）数据源的熔断器"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self.breaker_options)
+                if name in self._saved:
+                    breaker.restore(self._saved[name])
+                self._breakers[name] = breaker
+            return breaker
+    
+    def save(self):
+        """保存所有熔断器的状态"""
+        if not self.path:
+            return
+        # 并发采集的各数据源都会保存，持锁写入避免临时文件互相覆盖
+        with self._lock:
+            breakers = {**self._saved, **{name: breaker.to_dict() for name, breaker in self._breakers.items()}}
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump({"updated_at": time.time(), "breakers": breakers}, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.warning(f"保存熔断器状态失败: {e}")
+    
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """各数据源熔断器的状态，包括上次保存但本进程尚未使用的数据源"""
+        with self._lock:
+            names = sorted(set(self._breakers) | set(self._saved))
+        return [self.get(name).get_stats() for name in names]
+
+# 全局热搜熔断器
+circuit_breakers = CircuitBreakerRegistry(
+    config.hotsearch_breaker_state_path or None,
+    window=config.hotsearch_breaker_window,
+    failure_rate=config.hotsearch_breaker_failure_rate,
+    open_seconds=config.hotsearch_breaker_open_seconds,
+    default_timeout=config.hotsearch_timeout
+)
@@ -0,0 +1,152 @@
+"""消息合并发送模块"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from .config import config
+from .dingtalk import DingTalkBot, MARKDOWN_MAX_BYTES
+from .outbound_queue import outbound_queue, MessagePriority, CompletionCallback
+from .payload_planner import PayloadPlanner
+
+# 合并消息中各任务内容之间的分隔
+SECTION_SEPARATOR = "\n\n---\n\n"
+# 提交方在窗口和发送时限之外多等待的秒数，覆盖定时器和回调的调度延迟
+FLUSH_GRACE = 5.0
+
+class PendingMessage:
+    """等待合并的单条任务消息"""
+    
+    def __init__(self, task_name: str, title: str, content: str, priority: MessagePriority,
+                 on_complete: Optional[CompletionCallback] = None, sequence: int = 0):
+        self.task_name = task_name
+        self.title = title
+        self.content = content
+        self.priority = priority
+        self.on_complete = on_complete  # 所在合并消息发送结束时的回调
+        self.sequence = sequence  # 同一任务多条消息的顺序，并发提交时到达顺序不确定
+        self.future: Future = Future()
+
+class MessageCoalescer:
+    """在发送窗口内合并发往同一webhook的多条消息
+    
+    窗口内到达的消息合并为一条带分节的Markdown消息，合并后超出钉钉大小限制时
+    拆成多条发送；每个任务仍能拿到自己那条消息的发送结果。
+    """
+    
+    def __init__(self, window: float = 5.0, max_bytes: int = MARKDOWN_MAX_BYTES, send_timeout: float = 180.0):
+        self.window = window
+        self.max_bytes = max_bytes
+        self.send_timeout = send_timeout  # 窗口结束后各合并消息共用的发送时限
+        self._batches: Dict[str, Tuple[DingTalkBot, List[PendingMessage]]] = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, bot: DingTalkBot, task_name: str, title: str, content: str,
+               priority: MessagePriority = MessagePriority.NORMAL,
+               timeout: Optional[float] = None,
+               on_complete: Optional[CompletionCallback] = None, sequence: int = 0) -> bool:
+        """提交消息并等待所在合并消息的发送结果，on_complete在发送最终结束时调用
+        
+        默认等待时间覆盖整个窗口和发送时限，窗口内各合并消息同时进入出站队列、共用发送时限。
+        """
+        if timeout is None:
+            timeout = self.window + self.send_timeout + FLUSH_GRACE
+        message = PendingMessage(task_name, title, content, priority, on_complete, sequence)
+        with self._lock:
+            batch = self._batches.get(bot.webhook_url)
+            if batch is None:
+                batch = (bot, [])
+                self._batches[bot.webhook_url] = batch
+                timer = threading.Timer(self.window, self._flush, args=(bot.webhook_url,))
+                timer.daemon = True
+                timer.start()
+            batch[1].append(message)
+        
+        try:
+            return message.future.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"任务 {task_name} 等待合并发送结果失败: {e}")
+            return False
+    
+    @staticmethod
+    def _merge(messages: List[PendingMessage]) -> Tuple[str, str]:
+        """合并多条消息为一条"""
+        if len(messages) == 1:
+            return messages[0].title, messages[0].content
+        title = " | ".join(message.title for message in messages)
+        text = SECTION_SEPARATOR.join(message.content for message in messages)
+        return title, text
+    
+    def _pack(self, messages: List[PendingMessage]) -> List[List[PendingMessage]]:
+        """按大小限制把消息装入尽量少的合并组，保持原有顺序"""
+        groups: List[List[PendingMessage]] = []
+        current: List[PendingMessage] = []
+        for message in messages:
+            candidate = current + [message]
+            if current and PayloadPlanner.measure(*self._merge(candidate)) > self.max_bytes:
+                groups.append(current)
+                current = [message]
+            else:
+                current = candidate
+        if current:
+            groups.append(current)
+        return groups
+    
+    @staticmethod
+    def _complete(group: List[PendingMessage], success: bool, delivered: List[str]):
+        """合并消息发送结束，设置组内各消息的结果并通知回调"""
+        for message in group:
+            if not message.future.done():
+                message.future.set_result(success)
+            if message.on_complete:
+                try:
+                    message.on_complete(success, delivered)
+                except Exception as e:
+                    logger.error(f"任务 {message.task_name} 发送回调异常: {e}")
+    
+    def _flush(self, key: str):
+        """窗口结束，合并并发送该webhook下积累的消息"""
+        with self._lock:
+            bot, messages = self._batches.pop(key, (None, []))
+        if not messages:
+            return
+        
+        # 各任务按首条消息的到达顺序排列，同一任务的多条消息按sequence排列
+        first_arrival: Dict[str, int] = {}
+        for index, message in enumerate(messages):
+            first_arrival.setdefault(message.task_name, index)
+        messages.sort(key=lambda message: (first_arrival[message.task_name], message.sequence))
+        
+        groups = self._pack(messages)
+        if len(messages) > 1:
+            logger.info(f"合并 {len(messages)} 条消息为 {len(groups)} 条发送")
+        
+        # 各组同时提交，每组发送结束即通知组内的任务，不等待其他组
+        futures: List[Future] = []
+        for group in groups:
+            title, text = self._merge(group)
+            priority = min(message.priority for message in group)
+            try:
+                futures.append(outbound_queue.submit(
+                    bot, bot.build_markdown_payload(title, text), priority,
+                    on_complete=lambda ok, delivered, group=group: self._complete(group, ok, delivered)
+                ))
+            except Exception as e:
+                logger.error(f"合并消息发送异常: {e}")
+                self._complete(group, False, [])
+        
+        # 所有组共用发送时限，到时仍未发出的取消；已在发送中的由回调给出结果
+        deadline = time.monotonic() + self.send_timeout
+        for future in futures:
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                if future.cancel():
+                    logger.error(f"合并消息在{self.send_timeout}秒内未能发出，已取消")
+                else:
+                    logger.error(f"合并消息在{self.send_timeout}秒内未确认送达，仍在发送中，结果由回调处理")
+
+# 全局消息合并器，窗口为0时不启用
+coalescer = MessageCoalescer(
+    config.coalesce_window, send_timeout=config.outbound_send_timeout
+) if config.coalesce_window > 0 else None
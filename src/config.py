@@ -1,12 +1,67 @@
 """配置管理模块"""
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from loguru import logger
+from .hotsearch_sources import load_source_definitions
 
 # 加载环境变量
 load_dotenv()
 
+# 调度器和cron时间槽使用的时区
+SCHEDULER_TIMEZONE = "Asia/Shanghai"
+
+def _parse_webhooks(raw: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """解析形如 "url|secret,url" 的webhook列表"""
+    webhooks = []
+    if not raw:
+        return webhooks
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, secret = item.partition("|")
+        webhooks.append((url.strip(), secret.strip() or None))
+    return webhooks
+
+def _parse_float_mapping(raw: Optional[str]) -> Dict[str, float]:
+    """解析形如 "host=5,host2=8" 的配置为字典"""
+    mapping = {}
+    if not raw:
+        return mapping
+    for pair in raw.split(","):
+        if "=" not in pair:
+            continue
+        key, value = pair.split("=", 1)
+        try:
+            mapping[key.strip().lower()] = float(value)
+        except ValueError:
+            continue
+    return mapping
+
+class WeatherLocation(BaseModel):
+    """多城市天气中的一个位置"""
+    name: str = Field(..., description="城市名称")
+    longitude: float = Field(..., description="经度")
+    latitude: float = Field(..., description="纬度")
+
+def _parse_locations(raw: Optional[str]) -> List[WeatherLocation]:
+    """解析形如 "北京:116.40,39.90;上海:121.47,31.23" 的位置列表"""
+    locations = []
+    if not raw:
+        return locations
+    for item in raw.split(";"):
+        name, _, coordinates = item.strip().partition(":")
+        longitude, _, latitude = coordinates.partition(",")
+        try:
+            locations.append(WeatherLocation(
+                name=name.strip(), longitude=float(longitude), latitude=float(latitude)
+            ))
+        except ValueError:
+            continue
+    return locations
+
 class TaskConfig(BaseModel):
     """任务配置类"""
     cron: str = Field(..., description="cron表达式")
@@ -17,16 +72,120 @@ class Config(BaseModel):
     """应用配置类"""
     # 彩玉天气API配置
     caiyun_api_key: str = Field(..., description="彩玉天气API密钥")
+    caiyun_fetch_mode: str = Field(default="composite", description="天气获取方式：composite为综合接口单次请求，split为分别请求实时和小时数据")
+    
+    # 天气缓存配置
+    weather_cache_enabled: bool = Field(default=True, description="是否缓存天气接口响应")
+    weather_cache_path: str = Field(default="data/weather_cache.db", description="天气磁盘缓存路径，为空时只使用内存缓存")
+    weather_cache_max_entries: int = Field(default=256, description="内存缓存最大条目数")
+    weather_cache_grid: float = Field(default=0.01, description="缓存坐标网格大小（度）")
+    weather_cache_ttl_realtime: float = Field(default=300.0, description="实时天气缓存有效期（秒）")
+    weather_cache_ttl_hourly: float = Field(default=1800.0, description="小时预报缓存有效期（秒）")
+    weather_cache_ttl_minutely: float = Field(default=60.0, description="分钟级降水缓存有效期（秒）")
+    weather_cache_ttl_alert: float = Field(default=60.0, description="天气预警缓存有效期（秒）")
+    
+    # 备用天气数据源配置
+    weather_fallback_provider: str = Field(default="none", description="备用天气数据源：none或open-meteo")
+    open_meteo_base_url: str = Field(default="https://api.open-meteo.com/v1", description="Open-Meteo接口地址")
+    weather_hedge_quantile: float = Field(default=0.95, description="按彩云耗时的该分位数确定对冲延迟")
+    weather_hedge_delay: float = Field(default=2.0, description="耗时样本不足时的对冲延迟（秒）")
+    
+    # 天气历史配置
+    weather_history_enabled: bool = Field(default=True, description="是否记录天气历史并在消息中展示近期对比")
+    weather_history_path: str = Field(default="data/weather_history.db", description="天气历史数据库路径，为空时只在内存中统计")
+    weather_history_retention_days: float = Field(default=30.0, description="天气历史保留天数")
+    weather_history_compact_interval: float = Field(default=3600.0, description="天气历史后台压缩间隔（秒）")
     longitude: float = Field(..., description="经度")
     latitude: float = Field(..., description="纬度")
     
     # 钉钉机器人配置
     dingtalk_webhook: str = Field(..., description="钉钉机器人Webhook地址")
     dingtalk_secret: Optional[str] = Field(None, description="钉钉机器人密钥")
+    dingtalk_rate_limit: int = Field(default=20, description="每个机器人每分钟最多发送的消息数")
+    dingtalk_robots: List[Tuple[str, Optional[str]]] = Field(
+        default_factory=list, description="同一个群中额外的机器人(webhook, secret)列表"
+    )
+    dingtalk_fanout_webhooks: List[Tuple[str, Optional[str]]] = Field(
+        default_factory=list, description="额外群发的(webhook, secret)列表"
+    )
+    fanout_max_workers: int = Field(default=8, description="群发并发线程数")
+    dingtalk_async: bool = Field(default=False, description="是否通过asyncio客户端发送（需安装aiohttp）")
+    dingtalk_async_max_in_flight: int = Field(default=1000, description="异步客户端同时在途的最大请求数")
+    
+    # 出站队列配置
+    outbound_max_workers: int = Field(default=4, description="出站队列并发发送线程数")
+    outbound_digest_reserve: int = Field(default=5, description="为紧急消息预留的发送额度")
+    outbound_send_timeout: float = Field(default=180.0, description="等待消息发出的最长时间（秒）")
     
     # 其他配置
     city_name: str = Field(default="未知城市", description="城市名称")
     
+    # 天气变化推送配置
+    weather_push_mode: str = Field(default="full", description="天气播报推送方式：full为每次推送，diff为只在天气有实质变化或心跳到期时推送")
+    weather_heartbeat_hours: float = Field(default=6.0, description="diff模式下无变化时的心跳推送间隔（小时）")
+    weather_diff_temperature: float = Field(default=2.0, description="气温变化达到该值（°C）视为有变化")
+    weather_diff_precipitation: float = Field(default=0.1, description="降水强度达到该值（mm/h）视为有降水")
+    weather_diff_onset_shift_hours: float = Field(default=1.0, description="预计降水开始时间提前或推后达到该小时数视为有变化")
+    
+    # 多城市天气配置
+    weather_locations: List[WeatherLocation] = Field(default_factory=list, description="多城市天气的位置列表")
+    multi_weather_mode: str = Field(default="table", description="多城市天气消息形式：table为一张对比表，per_city为每城一条")
+    multi_weather_max_workers: int = Field(default=8, description="多城市天气并发获取线程数")
+    multi_weather_deadline: float = Field(default=30.0, description="多城市天气单次获取的总时限（秒）")
+    
+    # 短时降水提醒配置
+    nowcast_fast_interval: float = Field(default=120.0, description="可能降水时的轮询间隔（秒），其余时间按cron低频轮询")
+    nowcast_lead_minutes: int = Field(default=30, description="提前提醒的时间窗口（分钟）")
+    nowcast_probability: float = Field(default=0.3, description="降水概率达到该值时视为可能降水")
+    nowcast_hourly_lookahead: int = Field(default=3, description="小时预报在该小时数内有降水时视为可能降水")
+    
+    # 热搜采集配置
+    hotsearch_max_workers: int = Field(default=8, description="热搜数据源并发获取线程数")
+    hotsearch_limit: int = Field(default=15, description="每个数据源获取的热搜条目数")
+    hotsearch_snapshot_max_age: float = Field(default=60.0, description="热搜快照在该时长内直接复用（秒）")
+    hotsearch_timeout: float = Field(default=15.0, description="热搜请求超时上限（秒），有足够样本后按各数据源耗时p99自适应")
+    hotsearch_breaker_window: int = Field(default=20, description="熔断器统计的最近调用次数")
+    hotsearch_breaker_failure_rate: float = Field(default=0.5, description="最近调用失败率达到该值时熔断")
+    hotsearch_breaker_open_seconds: float = Field(default=600.0, description="熔断持续时长（秒），之后放行一次探测请求")
+    hotsearch_breaker_state_path: str = Field(default="data/circuit_breakers.json", description="熔断器状态文件路径，为空时不保存")
+    hotsearch_stale_max_age: float = Field(default=21600.0, description="数据源熔断时可使用的旧快照最长时间（秒）")
+    hotsearch_rank_tracking: bool = Field(default=True, description="是否在热搜消息中标注与上次推送相比的排名变化")
+    hotsearch_rank_path: str = Field(default="data/hotsearch_ranks.db", description="上次推送榜单的数据库路径，为空时只保存在内存")
+    hotsearch_sources_file: str = Field(default="", description="声明式热搜数据源文件（JSON），用于增加或覆盖内置数据源")
+    
+    # 全网热点配置
+    topic_digest_sources: List[str] = Field(default_factory=list, description="全网热点聚合的数据源，为空时使用全部数据源")
+    topic_digest_similarity: float = Field(default=0.4, description="标题2-gram的Jaccard相似度达到该值视为同一话题")
+    topic_digest_min_sources: int = Field(default=2, description="话题至少出现在该数量的数据源才列入全网热点")
+    topic_digest_limit: int = Field(default=15, description="全网热点最多列出的话题数")
+    
+    # 天气预警配置
+    alert_index_path: str = Field(default="data/alerts.db", description="已推送预警索引的数据库路径，为空时只保存在内存")
+    alert_retention_days: float = Field(default=7.0, description="已推送预警记录保留天数")
+    
+    # 上游用量配置
+    usage_enabled: bool = Field(default=True, description="是否统计上游调用用量")
+    usage_path: str = Field(default="data/usage.db", description="用量统计数据库路径，为空时只在内存中统计")
+    usage_budgets: Dict[str, float] = Field(default_factory=dict, description="各上游主机每日调用次数预算")
+    
+    # HTTP传输配置
+    http_pool_size: int = Field(default=10, description="每个主机的连接池大小")
+    http_max_per_host: int = Field(default=4, description="每个主机的最大并发请求数")
+    http_max_retries: int = Field(default=2, description="幂等请求的最大重试次数")
+    http_timeouts: Dict[str, float] = Field(default_factory=dict, description="各上游主机的超时时间（秒）")
+    
+    prewarm_lead_seconds: float = Field(default=10.0, description="cron触发前提前预热连接的秒数，0为不预热")
+    
+    coalesce_window: float = Field(default=5.0, description="合并发往同一群的消息的时间窗口（秒），0为不合并")
+    
+    dedup_ttl: float = Field(default=7200.0, description="内容未变化时跳过发送的有效期（秒），0为不去重")
+    
+    # 发件箱配置
+    outbox_enabled: bool = Field(default=True, description="是否启用持久化发件箱")
+    outbox_path: str = Field(default="data/outbox.db", description="发件箱数据库路径")
+    outbox_drain_interval: float = Field(default=30.0, description="发件箱重放间隔（秒）")
+    outbox_max_age_hours: float = Field(default=6.0, description="超过该时长未发出的消息不再重放（小时）")
+    
     # 任务配置
     task_configs: Dict[str, TaskConfig] = Field(default_factory=dict, description="任务配置字典")
     
@@ -36,13 +195,95 @@ class Config(BaseModel):
         # 基础配置
         config = cls(
             caiyun_api_key=os.getenv("CAIYUN_API_KEY", ""),
+            caiyun_fetch_mode=os.getenv("CAIYUN_FETCH_MODE", "composite").lower(),
+            weather_cache_enabled=os.getenv("WEATHER_CACHE_ENABLED", "true").lower() == "true",
+            weather_cache_path=os.getenv("WEATHER_CACHE_PATH", "data/weather_cache.db"),
+            weather_cache_max_entries=int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "256")),
+            weather_cache_grid=float(os.getenv("WEATHER_CACHE_GRID", "0.01")),
+            weather_cache_ttl_realtime=float(os.getenv("WEATHER_CACHE_TTL_REALTIME", "300")),
+            weather_cache_ttl_hourly=float(os.getenv("WEATHER_CACHE_TTL_HOURLY", "1800")),
+            weather_cache_ttl_minutely=float(os.getenv("WEATHER_CACHE_TTL_MINUTELY", "60")),
+            weather_cache_ttl_alert=float(os.getenv("WEATHER_CACHE_TTL_ALERT", "60")),
+            weather_fallback_provider=os.getenv("WEATHER_FALLBACK_PROVIDER", "none").lower(),
+            open_meteo_base_url=os.getenv("OPEN_METEO_BASE_URL", "https://api.open-meteo.com/v1"),
+            weather_hedge_quantile=float(os.getenv("WEATHER_HEDGE_QUANTILE", "0.95")),
+            weather_hedge_delay=float(os.getenv("WEATHER_HEDGE_DELAY", "2")),
+            weather_history_enabled=os.getenv("WEATHER_HISTORY_ENABLED", "true").lower() == "true",
+            weather_history_path=os.getenv("WEATHER_HISTORY_PATH", "data/weather_history.db"),
+            weather_history_retention_days=float(os.getenv("WEATHER_HISTORY_RETENTION_DAYS", "30")),
+            weather_history_compact_interval=float(os.getenv("WEATHER_HISTORY_COMPACT_INTERVAL", "3600")),
             longitude=float(os.getenv("LONGITUDE", "116.4074")),
             latitude=float(os.getenv("LATITUDE", "39.9042")),
             dingtalk_webhook=os.getenv("DINGTALK_WEBHOOK", ""),
             dingtalk_secret=os.getenv("DINGTALK_SECRET"),
-            city_name=os.getenv("CITY_NAME", "北京")
+            dingtalk_rate_limit=int(os.getenv("DINGTALK_RATE_LIMIT", "20")),
+            dingtalk_robots=_parse_webhooks(os.getenv("DINGTALK_ROBOTS")),
+            dingtalk_fanout_webhooks=_parse_webhooks(os.getenv("DINGTALK_FANOUT_WEBHOOKS")),
+            fanout_max_workers=int(os.getenv("FANOUT_MAX_WORKERS", "8")),
+            dingtalk_async=os.getenv("DINGTALK_ASYNC", "false").lower() == "true",
+            dingtalk_async_max_in_flight=int(os.getenv("DINGTALK_ASYNC_MAX_IN_FLIGHT", "1000")),
+            outbound_max_workers=int(os.getenv("OUTBOUND_MAX_WORKERS", "4")),
+            outbound_digest_reserve=int(os.getenv("OUTBOUND_DIGEST_RESERVE", "5")),
+            outbound_send_timeout=float(os.getenv("OUTBOUND_SEND_TIMEOUT", "180")),
+            city_name=os.getenv("CITY_NAME", "北京"),
+            weather_push_mode=os.getenv("WEATHER_PUSH_MODE", "full").lower(),
+            weather_heartbeat_hours=float(os.getenv("WEATHER_HEARTBEAT_HOURS", "6")),
+            weather_diff_temperature=float(os.getenv("WEATHER_DIFF_TEMPERATURE", "2")),
+            weather_diff_precipitation=float(os.getenv("WEATHER_DIFF_PRECIPITATION", "0.1")),
+            weather_diff_onset_shift_hours=float(os.getenv("WEATHER_DIFF_ONSET_SHIFT_HOURS", "1")),
+            weather_locations=_parse_locations(os.getenv("WEATHER_LOCATIONS")),
+            multi_weather_mode=os.getenv("MULTI_WEATHER_MODE", "table").lower(),
+            multi_weather_max_workers=int(os.getenv("MULTI_WEATHER_MAX_WORKERS", "8")),
+            multi_weather_deadline=float(os.getenv("MULTI_WEATHER_DEADLINE", "30")),
+            nowcast_fast_interval=float(os.getenv("NOWCAST_FAST_INTERVAL", "120")),
+            nowcast_lead_minutes=int(os.getenv("NOWCAST_LEAD_MINUTES", "30")),
+            nowcast_probability=float(os.getenv("NOWCAST_PROBABILITY", "0.3")),
+            nowcast_hourly_lookahead=int(os.getenv("NOWCAST_HOURLY_LOOKAHEAD", "3")),
+            topic_digest_sources=[
+                source.strip().lower() for source in os.getenv("TOPIC_DIGEST_SOURCES", "").split(",") if source.strip()
+            ],
+            topic_digest_similarity=float(os.getenv("TOPIC_DIGEST_SIMILARITY", "0.4")),
+            topic_digest_min_sources=int(os.getenv("TOPIC_DIGEST_MIN_SOURCES", "2")),
+            topic_digest_limit=int(os.getenv("TOPIC_DIGEST_LIMIT", "15")),
+            alert_index_path=os.getenv("ALERT_INDEX_PATH", "data/alerts.db"),
+            alert_retention_days=float(os.getenv("ALERT_RETENTION_DAYS", "7")),
+            prewarm_lead_seconds=float(os.getenv("PREWARM_LEAD_SECONDS", "10")),
+            coalesce_window=float(os.getenv("COALESCE_WINDOW", "5")),
+            dedup_ttl=float(os.getenv("DEDUP_TTL", "7200")),
+            outbox_enabled=os.getenv("OUTBOX_ENABLED", "true").lower() == "true",
+            outbox_path=os.getenv("OUTBOX_PATH", "data/outbox.db"),
+            outbox_drain_interval=float(os.getenv("OUTBOX_DRAIN_INTERVAL", "30")),
+            outbox_max_age_hours=float(os.getenv("OUTBOX_MAX_AGE_HOURS", "6")),
+            hotsearch_max_workers=int(os.getenv("HOTSEARCH_MAX_WORKERS", "8")),
+            hotsearch_limit=int(os.getenv("HOTSEARCH_LIMIT", "15")),
+            hotsearch_snapshot_max_age=float(os.getenv("HOTSEARCH_SNAPSHOT_MAX_AGE", "60")),
+            hotsearch_timeout=float(os.getenv("HOTSEARCH_TIMEOUT", "15")),
+            hotsearch_breaker_window=int(os.getenv("HOTSEARCH_BREAKER_WINDOW", "20")),
+            hotsearch_breaker_failure_rate=float(os.getenv("HOTSEARCH_BREAKER_FAILURE_RATE", "0.5")),
+            hotsearch_breaker_open_seconds=float(os.getenv("HOTSEARCH_BREAKER_OPEN_SECONDS", "600")),
+            hotsearch_breaker_state_path=os.getenv("HOTSEARCH_BREAKER_STATE_PATH", "data/circuit_breakers.json"),
+            hotsearch_stale_max_age=float(os.getenv("HOTSEARCH_STALE_MAX_AGE", "21600")),
+            hotsearch_rank_tracking=os.getenv("HOTSEARCH_RANK_TRACKING", "true").lower() == "true",
+            hotsearch_rank_path=os.getenv("HOTSEARCH_RANK_PATH", "data/hotsearch_ranks.db"),
+            hotsearch_sources_file=os.getenv("HOTSEARCH_SOURCES_FILE", ""),
+            usage_enabled=os.getenv("USAGE_ENABLED", "true").lower() == "true",
+            usage_path=os.getenv("USAGE_PATH", "data/usage.db"),
+            usage_budgets=_parse_float_mapping(os.getenv("USAGE_BUDGETS", "api.caiyunapp.com=10000")),
+            http_pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+            http_max_per_host=int(os.getenv("HTTP_MAX_PER_HOST", "4")),
+            http_max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+            http_timeouts=_parse_float_mapping(os.getenv("HTTP_TIMEOUTS"))
         )
         
+        # 预留额度不小于单个机器人的容量时，令牌桶永远攒不够，摘要消息会一直等待
+        if config.outbound_digest_reserve >= config.dingtalk_rate_limit:
+            reserve = max(config.dingtalk_rate_limit - 1, 0)
+            logger.warning(
+                f"OUTBOUND_DIGEST_RESERVE={config.outbound_digest_reserve} 不小于 DINGTALK_RATE_LIMIT={config.dingtalk_rate_limit}，"
+                f"已调整为{reserve}"
+            )
+            config.outbound_digest_reserve = reserve
+        
         # 加载任务配置
         config._load_task_configs()
         
@@ -58,6 +299,31 @@ class Config(BaseModel):
             enabled=weather_enabled
         )
         
+        # 多城市天气任务配置（配置了位置列表才加载）
+        if self.weather_locations:
+            self.task_configs["weather_multi"] = TaskConfig(
+                cron=os.getenv("MULTI_WEATHER_TASK_CRON", "0 8 * * *"),
+                enabled=os.getenv("MULTI_WEATHER_TASK_ENABLED", "true").lower() == "true"
+            )
+        
+        # 短时降水提醒任务配置（cron为无雨时的低频轮询，默认关闭）
+        self.task_configs["nowcast"] = TaskConfig(
+            cron=os.getenv("NOWCAST_TASK_CRON", "*/30 * * * *"),
+            enabled=os.getenv("NOWCAST_TASK_ENABLED", "false").lower() == "true"
+        )
+        
+        # 天气预警任务配置（比天气播报更频繁地轮询，默认关闭）
+        self.task_configs["alert"] = TaskConfig(
+            cron=os.getenv("ALERT_TASK_CRON", "*/5 * * * *"),
+            enabled=os.getenv("ALERT_TASK_ENABLED", "false").lower() == "true"
+        )
+        
+        # 全网热点任务配置（聚合多个热搜源中的同一话题，默认关闭）
+        self.task_configs["topic_digest"] = TaskConfig(
+            cron=os.getenv("TOPIC_DIGEST_TASK_CRON", "0 9,18 * * *"),
+            enabled=os.getenv("TOPIC_DIGEST_TASK_ENABLED", "false").lower() == "true"
+        )
+        
         # 热搜任务配置
         hotsearch_cron = os.getenv("HOTSEARCH_TASK_CRON", "0 */2 * * *")
         hotsearch_enabled = os.getenv("HOTSEARCH_TASK_ENABLED", "true").lower() == "true"
@@ -72,15 +338,22 @@ class Config(BaseModel):
         self._load_additional_hotsearch_configs()
     
     def _load_additional_hotsearch_configs(self):
-        """加载额外的热搜源配置"""
-        hotsearch_sources = ["zhihu", "douyin", "toutiao", "bilibili", "baidu"]
+        """加载额外的热搜源配置，配置了HOTSEARCH_<数据源>_CRON的数据源各注册一个任务
         
-        for source in hotsearch_sources:
-            env_prefix = f"HOTSEARCH_{source.upper()}"
-            cron_key = f"{env_prefix}_CRON"
-            enabled_key = f"{env_prefix}_ENABLED"
+        数据源不限于内置列表，数据源文件中新增的数据源同样可以这样配置；
+        不在内置列表和数据源文件中的数据源（如拼写错误）跳过并给出警告。
+        """
+        sources = load_source_definitions(self.hotsearch_sources_file or None)
+        for cron_key in sorted(os.environ):
+            if not (cron_key.startswith("HOTSEARCH_") and cron_key.endswith("_CRON")) or cron_key == "HOTSEARCH_TASK_CRON":
+                continue
+            source = cron_key[len("HOTSEARCH_"):-len("_CRON")].lower()
+            enabled_key = f"HOTSEARCH_{source.upper()}_ENABLED"
             
-            if os.getenv(cron_key):  # 只有配置了cron才加载
+            if source and os.getenv(cron_key):  # 只有配置了cron才加载
+                if source not in sources:
+                    logger.warning(f"{cron_key} 对应的热搜数据源 {source} 不存在，已跳过；可用数据源: {', '.join(sources)}")
+                    continue
                 cron = os.getenv(cron_key)
                 enabled = os.getenv(enabled_key, "true").lower() == "true"
                 task_key = f"hotsearch_{source}"
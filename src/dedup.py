@@ -0,0 +1,49 @@
+"""重复内容抑制模块"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from .config import config
+
+def content_fingerprint(payload: Any) -> str:
+    """计算语义内容的哈希，payload需可JSON序列化"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class ContentDeduplicator:
+    """按(任务, 目标)记录最近一次送达内容的哈希
+    
+    新内容与TTL内最后一次送达的内容相同时跳过发送。
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._delivered: Dict[str, Tuple[str, float]] = {}  # key -> (fingerprint, 送达时间)
+        self._lock = threading.Lock()
+    
+    def is_duplicate(self, key: str, fingerprint: Optional[str]) -> bool:
+        """内容是否与TTL内最后一次送达的相同"""
+        if not fingerprint:
+            return False
+        with self._lock:
+            last = self._delivered.get(key)
+        if not last:
+            return False
+        last_fingerprint, delivered_at = last
+        return last_fingerprint == fingerprint and time.monotonic() - delivered_at < self.ttl
+    
+    def remember(self, key: str, fingerprint: Optional[str]):
+        """记录送达的内容"""
+        if not fingerprint:
+            return
+        with self._lock:
+            self._delivered[key] = (fingerprint, time.monotonic())
+    
+    def forget(self, key: str):
+        """清除记录，下次无论内容是否变化都会发送"""
+        with self._lock:
+            self._delivered.pop(key, None)
+
+# 全局去重器，TTL为0时不启用
+deduplicator = ContentDeduplicator(config.dedup_ttl) if config.dedup_ttl > 0 else None
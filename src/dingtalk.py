@@ -1,21 +1,51 @@
 """钉钉机器人消息推送模块"""
+import json
+import threading
 import time
 import hmac
 import hashlib
 import base64
 import urllib.parse
-import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Set, Tuple
 from loguru import logger
+from .http_client import HttpTransport, transport as shared_transport
+from .rate_limit import TokenBucket, get_bucket
 
-class DingTalkBot:
-    """钉钉机器人客户端"""
+# 钉钉返回的限流错误码（发送过快）
+THROTTLE_ERRCODES = frozenset({130101, 130102, 410100})
+
+# 机器人不可用的错误码（token不存在、签名不匹配、机器人已停用等）
+INVALID_ROBOT_ERRCODES = frozenset({300001, 310000, 400101, 400102})
+
+# 钉钉Markdown消息体的大小上限（字节）
+MARKDOWN_MAX_BYTES = 20000
+
+# 网络异常时返回的错误码
+NETWORK_ERRCODE = -1
+
+# 本地令牌桶耗尽时返回的错误码（未发出请求）
+LOCAL_THROTTLE_ERRCODE = -2
+
+class RobotEndpoint:
+    """同一个群中的单个自定义机器人"""
     
-    def __init__(self, webhook_url: str, secret: Optional[str] = None):
+    def __init__(self, webhook_url: str, secret: Optional[str] = None, rate_limit: int = 20):
         self.webhook_url = webhook_url
         self.secret = secret
+        # 钉钉自定义机器人每分钟最多发送20条消息
+        self.bucket: TokenBucket = get_bucket(webhook_url, capacity=rate_limit, period=60)
+        self.cooldown_until = 0.0  # 暂停轮换直到该时间（monotonic）
+        self._sign_cache: tuple[str, str] = ("", "")  # (timestamp, sign)
     
-    def _generate_sign(self, timestamp: str) -> str:
+    def in_rotation(self, now: Optional[float] = None) -> bool:
+        """是否参与轮换"""
+        return (now or time.monotonic()) >= self.cooldown_until
+    
+    def suspend(self, seconds: float):
+        """暂时移出轮换"""
+        self.cooldown_until = time.monotonic() + seconds
+    
+    def generate_sign(self, timestamp: str) -> str:
         """生成签名"""
         if not self.secret:
             return ""
@@ -29,121 +59,242 @@ class DingTalkBot:
         sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
         return sign
     
-    def _get_signed_url(self) -> str:
-        """获取带签名的URL"""
+    def get_signed_url(self, timestamp: Optional[str] = None) -> str:
+        """获取带签名的URL，同一时间戳的签名只计算一次"""
         if not self.secret:
             return self.webhook_url
         
-        timestamp = str(round(time.time() * 1000))
-        sign = self._generate_sign(timestamp)
+        if timestamp is None:
+            timestamp = str(round(time.time() * 1000))
+        cached_timestamp, sign = self._sign_cache
+        if cached_timestamp != timestamp:
+            sign = self.generate_sign(timestamp)
+            self._sign_cache = (timestamp, sign)
         return f"{self.webhook_url}&timestamp={timestamp}&sign={sign}"
+
+class RobotPool:
+    """同一个群中的一组机器人，负责额度管理和轮换选择
     
-    def send_text_message(self, content: str, at_all: bool = False) -> bool:
-        """发送文本消息"""
-        try:
-            url = self._get_signed_url()
-            
-            data = {
-                "msgtype": "text",
-                "text": {
-                    "content": content
-                },
-                "at": {
-                    "isAtAll": at_all
-                }
+    同步和异步客户端共用这部分逻辑。
+    """
+    
+    def __init__(self, webhook_url: str, secret: Optional[str] = None, rate_limit: int = 20,
+                 robots: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 throttle_cooldown: float = 60.0, invalid_cooldown: float = 600.0):
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self.throttle_cooldown = throttle_cooldown
+        self.invalid_cooldown = invalid_cooldown
+        self.robots: List[RobotEndpoint] = [RobotEndpoint(webhook_url, secret, rate_limit)]
+        for robot_webhook, robot_secret in robots or []:
+            if robot_webhook != webhook_url:
+                self.robots.append(RobotEndpoint(robot_webhook, robot_secret, rate_limit))
+        self._lock = threading.Lock()
+    
+    def _generate_sign(self, timestamp: str) -> str:
+        """生成主机器人的签名"""
+        return self.robots[0].generate_sign(timestamp)
+    
+    def _get_signed_url(self, timestamp: Optional[str] = None) -> str:
+        """获取主机器人带签名的URL"""
+        return self.robots[0].get_signed_url(timestamp)
+    
+    def get_warmup_urls(self) -> List[str]:
+        """发送时会访问的地址，用于提前预热连接"""
+        return [robot.webhook_url for robot in self.robots]
+    
+    def _active_robots(self) -> List[RobotEndpoint]:
+        """参与轮换的机器人"""
+        now = time.monotonic()
+        return [robot for robot in self.robots if robot.in_rotation(now)]
+    
+    def available_tokens(self) -> float:
+        """当前剩余的发送额度（所有轮换中机器人之和）"""
+        return sum(robot.bucket.available() for robot in self._active_robots())
+    
+    def time_until_token(self, tokens: float = 1.0) -> float:
+        """距离有足够发送额度还需等待的秒数"""
+        active = self._active_robots()
+        if active:
+            # 额度分散在多个机器人上，按合计补充速度估算
+            missing = tokens - sum(robot.bucket.available() for robot in active)
+            if missing <= 0:
+                return 0.0
+            return missing / sum(robot.bucket.refill_rate for robot in active)
+        return max(min(robot.cooldown_until for robot in self.robots) - time.monotonic(), 0.0)
+    
+    def _acquire_robot(self, exclude: List[RobotEndpoint]) -> Optional[RobotEndpoint]:
+        """选择剩余额度最多的机器人并取走一个令牌"""
+        with self._lock:
+            candidates = [robot for robot in self._active_robots() if robot not in exclude]
+            candidates.sort(key=lambda robot: robot.bucket.available(), reverse=True)
+            for robot in candidates:
+                if robot.bucket.try_acquire():
+                    return robot
+        return None
+    
+    def _should_rotate(self, robot: RobotEndpoint, result: Dict[str, Any]) -> bool:
+        """根据响应判断是否换用其他机器人重发，被限流或失效的机器人暂时移出轮换"""
+        errcode = result.get("errcode")
+        if errcode in THROTTLE_ERRCODES:
+            # 上游已限流，清空本地额度并暂时移出轮换
+            robot.bucket.drain()
+            robot.suspend(self.throttle_cooldown)
+            logger.warning(f"钉钉机器人被限流({errcode})，暂停{self.throttle_cooldown:.0f}秒")
+            return True
+        if errcode in INVALID_ROBOT_ERRCODES:
+            robot.suspend(self.invalid_cooldown)
+            logger.error(f"钉钉机器人不可用({errcode}: {result.get('errmsg')})，暂停{self.invalid_cooldown:.0f}秒")
+            return True
+        return False
+
+class DingTalkBot(RobotPool):
+    """钉钉机器人客户端
+    
+    一个群可以添加多个自定义机器人，robots传入额外的(webhook, secret)后，
+    发送时按剩余额度在机器人之间轮换；被限流或失效的机器人会暂时移出轮换。
+    """
+    
+    def __init__(self, webhook_url: str, secret: Optional[str] = None,
+                 transport: Optional[HttpTransport] = None, rate_limit: int = 20,
+                 robots: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 throttle_cooldown: float = 60.0, invalid_cooldown: float = 600.0):
+        super().__init__(webhook_url, secret, rate_limit, robots, throttle_cooldown, invalid_cooldown)
+        self.transport = transport or shared_transport
+    
+    def warm(self, hosts: Optional[Set[str]] = None) -> int:
+        """通过发送时使用的客户端预热连接，hosts为已预热的主机（会被更新），返回成功数"""
+        hosts = set() if hosts is None else hosts
+        warmed = 0
+        for url in self.get_warmup_urls():
+            host = urllib.parse.urlsplit(url).netloc
+            if host in hosts:
+                continue
+            hosts.add(host)
+            if self._warm_url(url):
+                warmed += 1
+        return warmed
+    
+    def _warm_url(self, url: str) -> bool:
+        """预热单个地址所在主机的连接"""
+        return self.transport.warm(url)
+    
+    @staticmethod
+    def build_text_payload(content: str, at_all: bool = False) -> Dict[str, Any]:
+        """构造文本消息体"""
+        return {
+            "msgtype": "text",
+            "text": {
+                "content": content
+            },
+            "at": {
+                "isAtAll": at_all
+            }
+        }
+    
+    @staticmethod
+    def build_markdown_payload(title: str, text: str, at_all: bool = False) -> Dict[str, Any]:
+        """构造Markdown消息体"""
+        return {
+            "msgtype": "markdown",
+            "markdown": {
+                "title": title,
+                "text": text
+            },
+            "at": {
+                "isAtAll": at_all
+            }
+        }
+    
+    @staticmethod
+    def build_action_card_payload(title: str, text: str, single_title: str = "",
+                                  single_url: str = "") -> Dict[str, Any]:
+        """构造ActionCard消息体"""
+        data = {
+            "msgtype": "actionCard",
+            "actionCard": {
+                "title": title,
+                "text": text,
+                "hideAvatar": "0",
+                "btnOrientation": "0"
             }
+        }
+        
+        if single_title and single_url:
+            data["actionCard"]["singleTitle"] = single_title
+            data["actionCard"]["singleURL"] = single_url
+        
+        return data
+    
+    @staticmethod
+    def encode_payload(payload: Dict[str, Any]) -> bytes:
+        """将消息体序列化为JSON字节串"""
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    
+    def send_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送消息体，返回钉钉响应（包含errcode和errmsg）
+        
+        本地额度耗尽时不发出请求，直接返回LOCAL_THROTTLE_ERRCODE。
+        """
+        return self.send_body(self.encode_payload(payload))
+    
+    def send_body(self, body: bytes, timestamp: Optional[str] = None,
+                  wait: float = 0) -> Dict[str, Any]:
+        """发送已序列化的消息体
+        
+        wait大于0时最多等待wait秒以获得发送额度。某个机器人被限流或失效时，
+        换用其他有额度的机器人重发。
+        """
+        deadline = time.monotonic() + wait
+        tried: List[RobotEndpoint] = []
+        result = {"errcode": LOCAL_THROTTLE_ERRCODE, "errmsg": "本地发送额度已用尽"}
+        
+        while len(tried) < len(self.robots):
+            robot = self._acquire_robot(tried)
+            while robot is None and not tried and time.monotonic() < deadline:
+                time.sleep(min(max(self.time_until_token(), 0.01), max(deadline - time.monotonic(), 0.01)))
+                robot = self._acquire_robot(tried)
+            if robot is None:
+                break
             
-            response = requests.post(
-                url,
-                json=data,
-                headers={"Content-Type": "application/json"},
-                timeout=10
+            tried.append(robot)
+            result = self._post(robot, body, timestamp)
+            if not self._should_rotate(robot, result):
+                return result
+        
+        return result
+    
+    def _post(self, robot: RobotEndpoint, body: bytes, timestamp: Optional[str]) -> Dict[str, Any]:
+        """通过指定机器人发送请求"""
+        try:
+            response = self.transport.post(
+                robot.get_signed_url(timestamp),
+                data=body,
+                headers={"Content-Type": "application/json; charset=utf-8"}
             )
             response.raise_for_status()
-            
-            result = response.json()
-            if result.get("errcode") == 0:
-                logger.info("钉钉消息发送成功")
-                return True
-            else:
-                logger.error(f"钉钉消息发送失败: {result.get('errmsg')}")
-                return False
-                
+            return response.json()
         except Exception as e:
-            logger.error(f"发送钉钉消息异常: {e}")
-            return False
+            return {"errcode": NETWORK_ERRCODE, "errmsg": str(e)}
+    
+    def _send(self, payload: Dict[str, Any], label: str) -> bool:
+        """发送消息体并记录日志"""
+        result = self.send_payload(payload)
+        if result.get("errcode") == 0:
+            logger.info(f"钉钉{label}消息发送成功")
+            return True
+        
+        logger.error(f"钉钉{label}消息发送失败: {result.get('errmsg')}")
+        return False
+    
+    def send_text_message(self, content: str, at_all: bool = False) -> bool:
+        """发送文本消息"""
+        return self._send(self.build_text_payload(content, at_all), "")
     
     def send_markdown_message(self, title: str, text: str, at_all: bool = False) -> bool:
         """发送Markdown消息"""
-        try:
-            url = self._get_signed_url()
-            
-            data = {
-                "msgtype": "markdown",
-                "markdown": {
-                    "title": title,
-                    "text": text
-                },
-                "at": {
-                    "isAtAll": at_all
-                }
-            }
-            
-            response = requests.post(
-                url,
-                json=data,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if result.get("errcode") == 0:
-                logger.info("钉钉Markdown消息发送成功")
-                return True
-            else:
-                logger.error(f"钉钉Markdown消息发送失败: {result.get('errmsg')}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"发送钉钉Markdown消息异常: {e}")
-            return False
+        return self._send(self.build_markdown_payload(title, text, at_all), "Markdown")
     
     def send_action_card(self, title: str, text: str, single_title: str = "", single_url: str = "") -> bool:
         """发送ActionCard消息"""
-        try:
-            url = self._get_signed_url()
-            
-            data = {
-                "msgtype": "actionCard",
-                "actionCard": {
-                    "title": title,
-                    "text": text,
-                    "hideAvatar": "0",
-                    "btnOrientation": "0"
-                }
-            }
-            
-            if single_title and single_url:
-                data["actionCard"]["singleTitle"] = single_title
-                data["actionCard"]["singleURL"] = single_url
-            
-            response = requests.post(
-                url,
-                json=data,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if result.get("errcode") == 0:
-                logger.info("钉钉ActionCard消息发送成功")
-                return True
-            else:
-                logger.error(f"钉钉ActionCard消息发送失败: {result.get('errmsg')}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"发送钉钉ActionCard消息异常: {e}")
-            return False
+        return self._send(self.build_action_card_payload(title, text, single_title, single_url), "ActionCard")
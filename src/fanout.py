@@ -0,0 +1,186 @@
+"""多群并发推送模块"""
+import asyncio
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+from pydantic import BaseModel
+from loguru import logger
+from .dingtalk import DingTalkBot
+from .async_dingtalk import AsyncBackedDingTalkBot, event_loop_thread
+
+# 部分目标发送失败时send_payload返回的错误码
+PARTIAL_FAILURE_ERRCODE = -3
+
+class FanoutTargetResult(BaseModel):
+    """单个目标的发送结果"""
+    webhook: str  # 脱敏后的webhook
+    success: bool
+    errcode: Optional[int] = None
+    errmsg: str = ""
+    elapsed: float = 0.0  # 耗时（秒）
+
+class FanoutResult(BaseModel):
+    """一次群发的汇总结果"""
+    targets: List[FanoutTargetResult] = []
+    
+    @property
+    def success_count(self) -> int:
+        """成功的目标数"""
+        return sum(1 for target in self.targets if target.success)
+    
+    @property
+    def all_succeeded(self) -> bool:
+        """是否全部发送成功"""
+        return bool(self.targets) and self.success_count == len(self.targets)
+    
+    @property
+    def failed(self) -> List[FanoutTargetResult]:
+        """发送失败的目标"""
+        return [target for target in self.targets if not target.success]
+
+def mask_webhook(webhook_url: str) -> str:
+    """隐藏access_token，便于日志输出"""
+    if "access_token=" not in webhook_url:
+        return webhook_url
+    prefix, token = webhook_url.split("access_token=", 1)
+    return f"{prefix}access_token={token[:6]}***"
+
+class FanoutSender:
+    """将同一条消息并发推送到多个钉钉群
+    
+    消息体只序列化一次，同一批次共用一个时间戳，每个机器人的签名只计算一次；
+    每个目标遵守各自的令牌桶额度。
+    """
+    
+    def __init__(self, bots: List[DingTalkBot], max_workers: int = 8, token_wait: float = 60.0):
+        if not bots:
+            raise ValueError("群发目标不能为空")
+        self.bots = bots
+        self.max_workers = max_workers
+        self.token_wait = token_wait
+        self.webhook_url = f"fanout:{len(bots)}"
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="fanout")
+    
+    build_text_payload = staticmethod(DingTalkBot.build_text_payload)
+    build_markdown_payload = staticmethod(DingTalkBot.build_markdown_payload)
+    build_action_card_payload = staticmethod(DingTalkBot.build_action_card_payload)
+    
+    def without(self, webhook_urls: Iterable[str]) -> Optional["FanoutSender"]:
+        """去掉已送达的目标，共用线程池；所有目标都已送达时返回None"""
+        delivered = set(webhook_urls)
+        remaining = [bot for bot in self.bots if bot.webhook_url not in delivered]
+        if not remaining:
+            return None
+        sender = copy.copy(self)
+        sender.bots = remaining
+        return sender
+    
+    def get_warmup_urls(self) -> List[str]:
+        """所有目标会访问的地址"""
+        return [url for bot in self.bots for url in bot.get_warmup_urls()]
+    
+    def warm(self, hosts: Optional[Set[str]] = None) -> int:
+        """通过各目标自己的客户端预热连接，同一主机只预热一次"""
+        hosts = set() if hosts is None else hosts
+        return sum(bot.warm(hosts) for bot in self.bots)
+    
+    def available_tokens(self) -> float:
+        """所有目标中最少的剩余额度"""
+        return min(bot.available_tokens() for bot in self.bots)
+    
+    def time_until_token(self, tokens: float = 1.0) -> float:
+        """所有目标都有额度还需等待的秒数"""
+        return max(bot.time_until_token(tokens) for bot in self.bots)
+    
+    def _send_one(self, bot: DingTalkBot, body: bytes, timestamp: str) -> FanoutTargetResult:
+        """向单个目标发送"""
+        start = time.monotonic()
+        result = bot.send_body(body, timestamp=timestamp, wait=self.token_wait)
+        errcode = result.get("errcode")
+        return FanoutTargetResult(
+            webhook=mask_webhook(bot.webhook_url),
+            success=errcode == 0,
+            errcode=errcode,
+            errmsg=str(result.get("errmsg", "")),
+            elapsed=time.monotonic() - start
+        )
+    
+    async def _send_one_async(self, bot: AsyncBackedDingTalkBot, body: bytes, timestamp: str) -> FanoutTargetResult:
+        """在事件循环中向单个目标发送"""
+        start = time.monotonic()
+        result = await bot.async_bot.send_body(body, timestamp=timestamp, wait=self.token_wait)
+        errcode = result.get("errcode")
+        return FanoutTargetResult(
+            webhook=mask_webhook(bot.webhook_url),
+            success=errcode == 0,
+            errcode=errcode,
+            errmsg=str(result.get("errmsg", "")),
+            elapsed=time.monotonic() - start
+        )
+    
+    async def _gather_async(self, body: bytes, timestamp: str) -> List[Any]:
+        """所有目标的请求在同一个事件循环中并发发出"""
+        return await asyncio.gather(
+            *(self._send_one_async(bot, body, timestamp) for bot in self.bots),
+            return_exceptions=True
+        )
+    
+    def fanout(self, payload: Dict[str, Any]) -> FanoutResult:
+        """并发发送消息体到所有目标"""
+        body = DingTalkBot.encode_payload(payload)
+        timestamp = str(round(time.time() * 1000))
+        
+        if all(isinstance(bot, AsyncBackedDingTalkBot) for bot in self.bots):
+            outcomes = event_loop_thread.run(self._gather_async(body, timestamp))
+        else:
+            futures = [self._executor.submit(self._send_one, bot, body, timestamp) for bot in self.bots]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+        
+        targets = []
+        for bot, outcome in zip(self.bots, outcomes):
+            if isinstance(outcome, BaseException):
+                targets.append(FanoutTargetResult(
+                    webhook=mask_webhook(bot.webhook_url),
+                    success=False,
+                    errmsg=str(outcome)
+                ))
+            else:
+                targets.append(outcome)
+        
+        result = FanoutResult(targets=targets)
+        logger.info(f"群发完成: {result.success_count}/{len(targets)} 成功")
+        for target in result.failed:
+            logger.error(f"群发到 {target.webhook} 失败: {target.errmsg}")
+        return result
+    
+    def send_markdown(self, title: str, text: str, at_all: bool = False) -> FanoutResult:
+        """群发Markdown消息"""
+        return self.fanout(self.build_markdown_payload(title, text, at_all))
+    
+    def send_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """与DingTalkBot.send_payload兼容的群发接口，供出站队列调用"""
+        result = self.fanout(payload)
+        # 成功的目标，发件箱重放时跳过这些群
+        delivered = [bot.webhook_url for bot, target in zip(self.bots, result.targets) if target.success]
+        if result.all_succeeded:
+            return {"errcode": 0, "errmsg": "ok", "fanout": result, "delivered": delivered}
+        return {
+            "errcode": PARTIAL_FAILURE_ERRCODE,
+            "errmsg": f"群发部分失败: {len(result.failed)}/{len(result.targets)}",
+            "fanout": result,
+            "delivered": delivered
+        }
+    
+    def send_markdown_message(self, title: str, text: str, at_all: bool = False) -> bool:
+        """群发Markdown消息，全部成功时返回True"""
+        return self.send_markdown(title, text, at_all).all_succeeded
+    
+    def send_text_message(self, content: str, at_all: bool = False) -> bool:
+        """群发文本消息，全部成功时返回True"""
+        return self.fanout(self.build_text_payload(content, at_all)).all_succeeded
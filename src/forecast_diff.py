@@ -0,0 +1,111 @@
+"""天气变化检测模块"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+from .weather import WeatherData
+from .forecast_series import scan_thresholds
+from .formatter import WeatherFormatter
+
+# AQI等级分界，与WeatherFormatter.get_aqi_level一致
+AQI_BAND_BOUNDS = (50, 100, 150, 200, 300)
+# 天气描述关键字到天气类别，按顺序匹配
+SKY_CATEGORIES = (
+    ("雨", "雨"), ("雪", "雪"), ("雾", "雾"), ("尘", "沙尘"),
+    ("风", "大风"), ("阴", "阴"), ("云", "多云"), ("晴", "晴"),
+)
+
+def sky_category(weather_desc: str) -> str:
+    """天气描述归类，同类天气间的变化（如小雨转中雨）不视为天气转变"""
+    for keyword, category in SKY_CATEGORIES:
+        if keyword in weather_desc:
+            return category
+    return weather_desc
+
+class ForecastSnapshot(NamedTuple):
+    """参与比较的天气字段"""
+    temperature: float
+    raining: bool  # 当前是否在下雨
+    rain_onset: Optional[float]  # 小时预报中首个降水时刻的时间戳，无降水为None
+    aqi: Optional[int]
+    aqi_band: int  # AQI等级序号，未知为-1
+    weather_desc: str
+    sky: str
+
+class ForecastDiffer:
+    """比较两次天气快照，只报告达到阈值的变化
+    
+    逐字段比较：气温变化达到阈值、降水开始/结束或预计开始时间明显提前推后、
+    AQI跨等级、天气类别转变，并把变化渲染为可读的描述。
+    """
+    
+    def __init__(self, temperature_delta: float = 2.0, precipitation_threshold: float = 0.1,
+                 onset_shift_hours: float = 1.0):
+        self.temperature_delta = temperature_delta
+        self.precipitation_threshold = precipitation_threshold
+        self.onset_shift = onset_shift_hours * 3600
+    
+    def snapshot(self, weather_data: WeatherData) -> ForecastSnapshot:
+        """提取比较所需的字段"""
+        forecast = weather_data.hourly_forecast
+        onset_index = scan_thresholds(forecast.precipitation, (self.precipitation_threshold,)).crossings[0]
+        aqi = weather_data.aqi
+        return ForecastSnapshot(
+            temperature=weather_data.temperature,
+            raining=weather_data.precipitation >= self.precipitation_threshold,
+            rain_onset=forecast.timestamps[onset_index] if onset_index is not None else None,
+            aqi=aqi,
+            aqi_band=bisect_left(AQI_BAND_BOUNDS, aqi) if aqi is not None else -1,
+            weather_desc=weather_data.weather_desc,
+            sky=sky_category(weather_data.weather_desc)
+        )
+    
+    def diff(self, previous: ForecastSnapshot, current: ForecastSnapshot) -> List[str]:
+        """返回有实质意义的变化描述，无变化时为空列表"""
+        changes = []
+        
+        delta = current.temperature - previous.temperature
+        if abs(delta) >= self.temperature_delta:
+            changes.append(
+                f"🌡️ 气温{'升高' if delta > 0 else '降低'}{abs(delta):.1f}°C"
+                f"（{previous.temperature:.1f}°C → {current.temperature:.1f}°C）"
+            )
+        
+        if current.raining and not previous.raining:
+            changes.append("🌧️ 已开始下雨")
+        elif previous.raining and not current.raining:
+            changes.append("🌤️ 降雨已停止")
+        
+        if not current.raining:
+            if current.rain_onset and not previous.rain_onset:
+                changes.append(f"☔ 预计{self._format_time(current.rain_onset)}起有降水")
+            elif previous.rain_onset and not current.rain_onset and not previous.raining:
+                changes.append("🌂 此前预报的降水已取消")
+            elif (current.rain_onset and previous.rain_onset
+                  and abs(current.rain_onset - previous.rain_onset) >= self.onset_shift):
+                changes.append(
+                    f"⏱️ 降水开始时间由{self._format_time(previous.rain_onset)}"
+                    f"调整为{self._format_time(current.rain_onset)}"
+                )
+        
+        if current.aqi_band != previous.aqi_band and current.aqi_band >= 0 and previous.aqi_band >= 0:
+            previous_level, _ = WeatherFormatter.get_aqi_level(previous.aqi)
+            current_level, emoji = WeatherFormatter.get_aqi_level(current.aqi)
+            changes.append(f"{emoji} 空气质量由{previous_level}变为{current_level}（AQI {current.aqi}）")
+        
+        if current.sky != previous.sky:
+            changes.append(f"🔄 天气由{previous.weather_desc}转为{current.weather_desc}")
+        
+        return changes
+    
+    @staticmethod
+    def _format_time(timestamp: float) -> str:
+        """时间戳格式化为时刻，非今天时带上日期"""
+        moment = datetime.fromtimestamp(timestamp)
+        if moment.date() == datetime.now().date():
+            return moment.strftime("%H:%M")
+        return moment.strftime("%m-%d %H:%M")
+    
+    @staticmethod
+    def format_changes(changes: List[str]) -> str:
+        """变化列表渲染为Markdown段落"""
+        return "### 🔔 天气变化\n" + "\n".join(f"- {change}" for change in changes) + "\n\n"
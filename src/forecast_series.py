@@ -0,0 +1,216 @@
+"""小时级预报的列式存储模块"""
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# 降水等级分界（mm/h）与名称，与格式化器的降水等级描述一致
+PRECIPITATION_LEVEL_BOUNDS = (0.5, 2.0, 8.0, 20.0)
+PRECIPITATION_LEVEL_NAMES = ("微雨", "小雨", "中雨", "大雨", "暴雨")
+NO_PRECIPITATION = "无降水"
+
+def precipitation_level(precipitation: float) -> str:
+    """降水量对应的等级名称"""
+    if precipitation <= 0:
+        return NO_PRECIPITATION
+    return PRECIPITATION_LEVEL_NAMES[bisect_right(PRECIPITATION_LEVEL_BOUNDS, precipitation)]
+
+class ThresholdScan(NamedTuple):
+    """阈值扫描结果"""
+    crossings: Tuple[Optional[int], ...]  # 各阈值首次达到的下标，未达到为None
+    peak_level: int  # 峰值等级（达到的阈值个数）
+    peak_index: Optional[int]  # 首次达到峰值等级的下标
+    end_index: Optional[int]  # 降水开始后首次回落到最低阈值以下的下标
+
+def scan_thresholds(values: Sequence[float], bounds: Sequence[float]) -> ThresholdScan:
+    """单遍扫描序列，同时找出各阈值的首次越过时刻、峰值等级和降水结束时刻"""
+    crossings: List[Optional[int]] = [None] * len(bounds)
+    peak_level = 0
+    peak_index = None
+    end_index = None
+    for index, value in enumerate(values):
+        level = bisect_right(bounds, value)
+        if level > peak_level:
+            for crossed in range(peak_level, level):
+                crossings[crossed] = index
+            peak_level, peak_index = level, index
+        elif level == 0 and peak_level and end_index is None:
+            end_index = index
+    return ThresholdScan(tuple(crossings), peak_level, peak_index, end_index)
+
+class HourlyPoint(NamedTuple):
+    """序列中单个小时的只读视图，字段与HourlyWeatherData相同"""
+    datetime: datetime
+    temperature: float
+    humidity: float
+    weather_desc: str
+    wind_speed: float
+    wind_direction: float
+    precipitation: float
+
+class ForecastSeries:
+    """小时级预报序列
+    
+    各字段按列存放在array中，由接口响应一次构建；降水最大值、总量、首个降水
+    时刻和等级分布等聚合量在第一次使用时单遍计算并缓存，追加数据后失效。
+    """
+    
+    def __init__(self):
+        self.timestamps = array("d")
+        self.temperature = array("d")
+        self.humidity = array("d")
+        self.wind_speed = array("d")
+        self.wind_direction = array("d")
+        self.precipitation = array("d")
+        self.weather_descs: List[str] = []
+        self._stats: Optional[Dict] = None
+    
+    @classmethod
+    def from_points(cls, points) -> "ForecastSeries":
+        """由HourlyWeatherData等带同名属性的对象构建"""
+        series = cls()
+        for point in points:
+            series.append(point.datetime, point.temperature, point.humidity, point.weather_desc,
+                          point.wind_speed, point.wind_direction, point.precipitation)
+        return series
+    
+    def append(self, time: datetime, temperature: float, humidity: float, weather_desc: str,
+               wind_speed: float, wind_direction: float, precipitation: float = 0.0):
+        """追加一个小时的数据"""
+        self.timestamps.append(time.timestamp())
+        self.temperature.append(temperature)
+        self.humidity.append(humidity)
+        self.weather_descs.append(weather_desc)
+        self.wind_speed.append(wind_speed)
+        self.wind_direction.append(wind_direction)
+        self.precipitation.append(precipitation)
+        self._stats = None
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+    
+    def __bool__(self) -> bool:
+        return len(self.timestamps) > 0
+    
+    def __getitem__(self, index: int) -> HourlyPoint:
+        return HourlyPoint(
+            datetime.fromtimestamp(self.timestamps[index]),
+            self.temperature[index],
+            self.humidity[index],
+            self.weather_descs[index],
+            self.wind_speed[index],
+            self.wind_direction[index],
+            self.precipitation[index]
+        )
+    
+    def __iter__(self) -> Iterator[HourlyPoint]:
+        for index in range(len(self)):
+            yield self[index]
+    
+    def __repr__(self) -> str:
+        return f"ForecastSeries({len(self)}小时)"
+    
+    def head(self, hours: int) -> "ForecastSeries":
+        """前hours小时组成的新序列"""
+        series = ForecastSeries()
+        series.timestamps = self.timestamps[:hours]
+        series.temperature = self.temperature[:hours]
+        series.humidity = self.humidity[:hours]
+        series.weather_descs = self.weather_descs[:hours]
+        series.wind_speed = self.wind_speed[:hours]
+        series.wind_direction = self.wind_direction[:hours]
+        series.precipitation = self.precipitation[:hours]
+        return series
+    
+    def prepend(self, time: datetime, temperature: float, humidity: float, weather_desc: str,
+                wind_speed: float, wind_direction: float, precipitation: float = 0.0) -> "ForecastSeries":
+        """在序列前加上一个时刻（如当前实况）组成的新序列"""
+        series = ForecastSeries()
+        series.append(time, temperature, humidity, weather_desc, wind_speed, wind_direction, precipitation)
+        series.timestamps.extend(self.timestamps)
+        series.temperature.extend(self.temperature)
+        series.humidity.extend(self.humidity)
+        series.weather_descs.extend(self.weather_descs)
+        series.wind_speed.extend(self.wind_speed)
+        series.wind_direction.extend(self.wind_direction)
+        series.precipitation.extend(self.precipitation)
+        series._stats = None
+        return series
+    
+    def datetimes(self) -> List[datetime]:
+        """时间列转换为datetime"""
+        return [datetime.fromtimestamp(timestamp) for timestamp in self.timestamps]
+    
+    def columns(self) -> Dict[str, list]:
+        """除时间外的各列，用于计算内容指纹"""
+        return {
+            "temperature": self.temperature.tolist(),
+            "humidity": self.humidity.tolist(),
+            "weather_desc": list(self.weather_descs),
+            "wind_speed": self.wind_speed.tolist(),
+            "wind_direction": self.wind_direction.tolist(),
+            "precipitation": self.precipitation.tolist(),
+        }
+    
+    def _compute_stats(self) -> Dict:
+        """单遍扫描降水和温度列"""
+        max_precipitation = 0.0
+        total_precipitation = 0.0
+        first_rain_index = None
+        rain_hours = 0
+        level_histogram = dict.fromkeys((NO_PRECIPITATION,) + PRECIPITATION_LEVEL_NAMES, 0)
+        for index, precipitation in enumerate(self.precipitation):
+            if precipitation > 0:
+                rain_hours += 1
+                total_precipitation += precipitation
+                if precipitation > max_precipitation:
+                    max_precipitation = precipitation
+                if first_rain_index is None:
+                    first_rain_index = index
+            level_histogram[precipitation_level(precipitation)] += 1
+        return {
+            "max_precipitation": max_precipitation,
+            "total_precipitation": total_precipitation,
+            "first_rain_index": first_rain_index,
+            "rain_hours": rain_hours,
+            "level_histogram": level_histogram,
+            "temperature_min": min(self.temperature) if self.temperature else None,
+            "temperature_max": max(self.temperature) if self.temperature else None,
+        }
+    
+    @property
+    def stats(self) -> Dict:
+        """缓存的聚合结果"""
+        if self._stats is None:
+            self._stats = self._compute_stats()
+        return self._stats
+    
+    @property
+    def has_rain(self) -> bool:
+        """是否有降水时段"""
+        return self.stats["rain_hours"] > 0
+    
+    @property
+    def max_precipitation(self) -> float:
+        """最大降水强度"""
+        return self.stats["max_precipitation"]
+    
+    @property
+    def total_precipitation(self) -> float:
+        """降水总量"""
+        return self.stats["total_precipitation"]
+    
+    @property
+    def mean_precipitation(self) -> float:
+        """平均降水强度"""
+        return self.total_precipitation / len(self) if self else 0.0
+    
+    @property
+    def first_rain_index(self) -> Optional[int]:
+        """首个降水时段的下标，无降水时为None"""
+        return self.stats["first_rain_index"]
+    
+    @property
+    def level_histogram(self) -> Dict[str, int]:
+        """各降水等级的小时数"""
+        return self.stats["level_histogram"]
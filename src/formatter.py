@@ -1,10 +1,21 @@
 """天气数据美化格式化模块"""
+import re
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any
 from loguru import logger
-from .weather import WeatherData, HourlyWeatherData
+from .weather import WeatherData
+from .forecast_series import ForecastSeries, precipitation_level
 from .rain_visualizer import RainVisualizer
 
+# format_hourly_forecast 生成的单小时预报块
+HOURLY_BLOCK_PATTERN = re.compile(
+    r"\n\n\*\*📅 (?P<index>\d+)小时后 \((?P<time>\d{2}:\d{2})\)\*\*\n"
+    r"- \*\*温度：\*\* (?P<temp>[^\n]+)\n"
+    r"- \*\*天气：\*\* (?P<weather>[^\n]+)\n"
+    r"- \*\*湿度：\*\* [^\n]+\n"
+    r"- \*\*风向风速：\*\* [^\n]+"
+)
+
 class WeatherFormatter:
     """天气数据格式化器"""
     
@@ -77,7 +88,7 @@ class WeatherFormatter:
             return "🔥 炎热"
     
     @staticmethod
-    def format_hourly_forecast(hourly_data: List[HourlyWeatherData]) -> str:
+    def format_hourly_forecast(hourly_data: ForecastSeries) -> str:
         """格式化小时级预报数据（分行显示）"""
         if not hourly_data:
             return ""
@@ -108,6 +119,16 @@ class WeatherFormatter:
         
         return forecast_text
     
+    @staticmethod
+    def compact_hourly_forecast(content: str, keep: int = 6) -> str:
+        """将消息中的小时预报精简为每小时一行，只保留前keep小时"""
+        def shrink(match: re.Match) -> str:
+            if int(match.group("index")) > keep:
+                return ""
+            return f"\n- {match.group('time')} {match.group('temp')} {match.group('weather')}"
+        
+        return HOURLY_BLOCK_PATTERN.sub(shrink, content)
+    
     @staticmethod
     def format_text_message(weather_data: WeatherData, city_name: str) -> str:
         """格式化为文本消息"""
@@ -182,15 +203,52 @@ class WeatherFormatter:
         
         # 检查未来2小时是否有降雨
         if weather_data.hourly_forecast:
-            has_rain = any(h.precipitation > 0 for h in weather_data.hourly_forecast)
+            has_rain = weather_data.hourly_forecast.has_rain
             if has_rain and "雨" not in weather_data.weather_desc:
                 message += "\n☂️ 未来2小时可能有降雨，记得带伞！"
         
         return message
     
     @staticmethod
-    def format_markdown_message(weather_data: WeatherData, city_name: str) -> tuple[str, str]:
-        """格式化为Markdown消息，返回(title, content)"""
+    def format_history_section(weather_data: WeatherData, history: Optional[Dict[str, Any]]) -> str:
+        """根据天气历史的滚动统计生成近期对比段落，历史不足时返回空字符串"""
+        if not history or history["24h"]["count"] < 2:
+            return ""
+        
+        lines = []
+        yesterday = history.get("temperature_yesterday")
+        if yesterday is not None:
+            diff = weather_data.temperature - yesterday
+            if abs(diff) < 0.5:
+                lines.append("- **较昨日此时：** 气温持平")
+            else:
+                lines.append(f"- **较昨日此时：** {'🔺 升高' if diff > 0 else '🔻 降低'}{abs(diff):.1f}°C")
+        
+        for window, label in (("24h", "24小时"), ("7d", "7天")):
+            stats = history[window]
+            if stats["count"] >= 2:
+                lines.append(
+                    f"- **{label}气温：** {stats['temperature_min']:.1f} ~ {stats['temperature_max']:.1f}°C，"
+                    f"平均{stats['temperature_mean']:.1f}°C"
+                )
+        
+        rain_line = f"- **24小时累计降水：** {history['24h']['rainfall']:.1f}mm"
+        if history["rainy_streak"] >= 2:
+            rain_line += f"，已连续{history['rainy_streak']}天降雨"
+        lines.append(rain_line)
+        
+        day_aqi, week_aqi = history["24h"]["aqi_mean"], history["7d"]["aqi_mean"]
+        if day_aqi is not None and week_aqi is not None:
+            diff = day_aqi - week_aqi
+            trend = "持平" if abs(diff) < 5 else (f"📈 较7天均值上升{diff:.0f}" if diff > 0 else f"📉 较7天均值下降{-diff:.0f}")
+            lines.append(f"- **AQI趋势：** 24小时均值{day_aqi:.0f}，{trend}")
+        
+        return "### 📈 近期对比\n" + "\n".join(lines) + "\n\n"
+    
+    @staticmethod
+    def format_markdown_message(weather_data: WeatherData, city_name: str,
+                                history: Optional[Dict[str, Any]] = None) -> tuple[str, str]:
+        """格式化为Markdown消息，返回(title, content)；传入天气历史统计时附带近期对比"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
         weather_emoji = WeatherFormatter.get_weather_emoji(weather_data.weather_desc)
         wind_desc = WeatherFormatter.get_wind_direction_desc(weather_data.wind_direction)
@@ -232,6 +290,9 @@ class WeatherFormatter:
             hourly_forecast = WeatherFormatter.format_hourly_forecast(weather_data.hourly_forecast)
             content += hourly_forecast + "\n\n"
         
+        # 添加近期对比
+        content += WeatherFormatter.format_history_section(weather_data, history)
+        
         # 添加贴心提醒
         content += "### 💡 温馨提示\n"
         tips = []
@@ -252,7 +313,7 @@ class WeatherFormatter:
         
         # 检查未来2小时是否有降雨
         if weather_data.hourly_forecast:
-            has_rain = any(h.precipitation > 0 for h in weather_data.hourly_forecast)
+            has_rain = weather_data.hourly_forecast.has_rain
             if has_rain and "雨" not in weather_data.weather_desc:
                 tips.append("☂️ 未来2小时可能有降雨，记得带伞！")
         
@@ -265,9 +326,10 @@ class WeatherFormatter:
         return title, content
     
     def format_message_with_rain_chart(self, weather_data: WeatherData, city_name: str, 
-                                     include_image: bool = True) -> tuple[str, str]:
+                                     include_image: bool = True,
+                                     history: Optional[Dict[str, Any]] = None) -> tuple[str, str]:
         """格式化天气消息并包含雨图，返回(title, content)"""
-        title, content = self.format_markdown_message(weather_data, city_name)
+        title, content = self.format_markdown_message(weather_data, city_name, history)
         
         # 添加雨图相关信息
         rain_info = self._get_rain_summary(weather_data)
@@ -287,6 +349,48 @@ class WeatherFormatter:
         
         return title, content
     
+    @staticmethod
+    def format_comparison_table(results: List[Tuple[str, Optional[WeatherData]]]) -> tuple[str, str]:
+        """多城市天气对比表，返回(title, content)；获取失败的城市单独标注"""
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+        title = f"🌤️ {len(results)}城天气播报"
+        
+        content = f"## 🌤️ 多城市天气\n\n> 📅 **更新时间：** {current_time}\n\n"
+        content += "| 城市 | 天气 | 温度 | 湿度 | 风向风速 | AQI |\n"
+        content += "|------|------|------|------|----------|-----|\n"
+        
+        failed = []
+        for city_name, weather_data in results:
+            if weather_data is None:
+                failed.append(city_name)
+                content += f"| {city_name} | 获取失败 | - | - | - | - |\n"
+                continue
+            emoji = WeatherFormatter.get_weather_emoji(weather_data.weather_desc)
+            wind_desc = WeatherFormatter.get_wind_direction_desc(weather_data.wind_direction)
+            aqi = "-"
+            if weather_data.aqi is not None:
+                aqi_level, _ = WeatherFormatter.get_aqi_level(weather_data.aqi)
+                aqi = f"{weather_data.aqi} {aqi_level}"
+            content += (
+                f"| {city_name} | {emoji} {weather_data.weather_desc} | {weather_data.temperature:.1f}°C "
+                f"| {weather_data.humidity:.0f}% | {wind_desc} {weather_data.wind_speed:.1f}m/s | {aqi} |\n"
+            )
+        
+        if failed:
+            content += f"\n> ⚠️ {len(failed)}个城市本次获取失败：{'、'.join(failed)}\n"
+        
+        return title, content
+    
+    @staticmethod
+    def format_fetch_failures(city_names: List[str]) -> tuple[str, str]:
+        """每城一条播报时，获取失败的城市汇总为一条消息，返回(title, content)"""
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+        title = f"⚠️ {len(city_names)}城天气获取失败"
+        content = f"## ⚠️ 天气获取失败\n\n> 📅 **更新时间：** {current_time}\n\n"
+        content += "".join(f"- **{city_name}**：获取失败\n" for city_name in city_names)
+        content += "\n> 本次未能获取以上城市的天气，下次播报时重试\n"
+        return title, content
+    
     def _get_rain_summary(self, weather_data: WeatherData) -> str:
         """获取降水摘要信息"""
         summary_lines = []
@@ -298,33 +402,22 @@ class WeatherFormatter:
         else:
             summary_lines.append("- **当前降水：** 无降水")
         
-        # 未来降水预报
-        if weather_data.hourly_forecast:
-            has_rain = False
-            max_precip = 0
-            total_precip = 0
-            
-            for hour_data in weather_data.hourly_forecast:
-                if hour_data.precipitation > 0:
-                    has_rain = True
-                    max_precip = max(max_precip, hour_data.precipitation)
-                    total_precip += hour_data.precipitation
-            
-            if has_rain:
-                avg_precip = total_precip / len(weather_data.hourly_forecast)
-                max_level = self._get_precipitation_level(max_precip)
-                summary_lines.append(f"- **未来{len(weather_data.hourly_forecast)}小时：** 有降水，最大{max_precip:.1f}mm/h ({max_level})")
-                summary_lines.append(f"- **平均降水强度：** {avg_precip:.1f}mm/h")
+        # 未来降水预报（聚合量由序列单遍计算并缓存）
+        forecast = weather_data.hourly_forecast
+        if forecast:
+            if forecast.has_rain:
+                max_level = self._get_precipitation_level(forecast.max_precipitation)
+                summary_lines.append(f"- **未来{len(forecast)}小时：** 有降水，最大{forecast.max_precipitation:.1f}mm/h ({max_level})")
+                summary_lines.append(f"- **平均降水强度：** {forecast.mean_precipitation:.1f}mm/h")
             else:
-                summary_lines.append(f"- **未来{len(weather_data.hourly_forecast)}小时：** 无明显降水")
+                summary_lines.append(f"- **未来{len(forecast)}小时：** 无明显降水")
         
         # 降水建议
-        if weather_data.precipitation > 0 or any(h.precipitation > 0 for h in weather_data.hourly_forecast):
-            if max(weather_data.precipitation, 
-                   max((h.precipitation for h in weather_data.hourly_forecast), default=0)) > 8:
+        if weather_data.precipitation > 0 or forecast.has_rain:
+            peak_precip = max(weather_data.precipitation, forecast.max_precipitation)
+            if peak_precip > 8:
                 summary_lines.append("- **出行建议：** ⚠️ 降水较强，建议减少外出，注意安全")
-            elif max(weather_data.precipitation,
-                    max((h.precipitation for h in weather_data.hourly_forecast), default=0)) > 2:
+            elif peak_precip > 2:
                 summary_lines.append("- **出行建议：** ☂️ 建议携带雨具，注意路面湿滑")
             else:
                 summary_lines.append("- **出行建议：** 🌂 可能有小雨，建议备好雨具")
@@ -333,15 +426,4 @@ class WeatherFormatter:
     
     def _get_precipitation_level(self, precipitation: float) -> str:
         """获取降水等级描述"""
-        if precipitation == 0:
-            return "无降水"
-        elif precipitation < 0.5:
-            return "微雨"
-        elif precipitation < 2.0:
-            return "小雨"
-        elif precipitation < 8.0:
-            return "中雨" 
-        elif precipitation < 20.0:
-            return "大雨"
-        else:
-            return "暴雨"
+        return precipitation_level(precipitation)
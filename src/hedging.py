@@ -0,0 +1,111 @@
+"""对冲请求模块"""
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, TypeVar
+from loguru import logger
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    """记录最近若干次请求的耗时，用于估算对冲延迟"""
+    
+    def __init__(self, window: int = 100, min_samples: int = 20, default: float = 2.0,
+                 floor: float = 0.2, ceiling: float = 8.0):
+        self.min_samples = min_samples
+        self.default = default  # 样本不足时使用的延迟
+        self.floor = floor
+        self.ceiling = ceiling
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        """记录一次成功请求的耗时"""
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """最近耗时的q分位数，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+    
+    def hedge_delay(self, q: float = 0.95) -> float:
+        """主请求超过该时长仍未返回时发出备用请求"""
+        value = self.quantile(q)
+        if value is None:
+            return self.default
+        return min(max(value, self.floor), self.ceiling)
+
+class Hedger:
+    """对冲请求执行器
+    
+    先发出主请求，超过主请求耗时的分位数仍未返回时再发出备用请求，
+    先返回有效结果的一方胜出；主请求很快失败时直接改用备用请求。
+    落败的请求在后台自然结束，结果被丢弃。
+    主请求的耗时由调用方在真实的网络请求处记录到tracker，缓存命中等
+    不经过网络的返回不计入，否则分位数会被压低而几乎每次都对冲。
+    """
+    
+    def __init__(self, tracker: Optional[LatencyTracker] = None, quantile: float = 0.95,
+                 max_workers: int = 8):
+        self.tracker = tracker or LatencyTracker()
+        self.quantile = quantile
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "secondary_wins": 0, "failures": 0}
+    
+    def _count(self, name: str):
+        """累加统计"""
+        with self._lock:
+            self._stats[name] += 1
+    
+    def call(self, primary: Callable[[], Optional[T]],
+             secondary: Callable[[], Optional[T]]) -> Tuple[Optional[T], Optional[str]]:
+        """执行对冲请求，返回(结果, 胜出方)，胜出方为"primary"或"secondary"，均失败时为None"""
+        self._count("calls")
+        delay = self.tracker.hedge_delay(self.quantile)
+        pending = {self._executor.submit(primary): "primary"}
+        done, _ = wait(pending, timeout=delay)
+        if done:
+            result = self._result(done.pop())
+            if result is not None:
+                return result, "primary"
+            logger.warning("主数据源请求失败，改用备用数据源")
+            pending.clear()
+        else:
+            logger.info(f"主数据源{delay:.2f}秒内未返回，同时请求备用数据源")
+            self._count("hedged")
+        pending[self._executor.submit(secondary)] = "secondary"
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                label = pending.pop(future)
+                result = self._result(future)
+                if result is not None:
+                    if label == "secondary":
+                        self._count("secondary_wins")
+                    return result, label
+        
+        self._count("failures")
+        return None, None
+    
+    @staticmethod
+    def _result(future) -> Optional[Any]:
+        """取出结果，请求抛出异常时视为失败"""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"对冲请求失败: {e}")
+            return None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """对冲次数、备用胜出次数和当前对冲延迟"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedge_delay"] = self.tracker.hedge_delay(self.quantile)
+        stats["p95"] = self.tracker.quantile(0.95)
+        return stats
@@ -0,0 +1,140 @@
+"""热搜采集模块"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from loguru import logger
+from .hotsearch import HotSearchAPI, HotSearchData
+from .config import config
+
+class HotSearchCollector:
+    """热搜采集器
+    
+    一次并发获取所有已登记的数据源，结果连同获取时间发布到进程内共享的快照中，
+    各热搜任务从快照读取。同一cron上的多个热搜任务同时触发时只有第一个发起采集，
+    其余等待同一次采集的结果，一次运行的耗时取决于最慢的数据源而不是各源之和。
+    """
+    
+    def __init__(self, api: Optional[HotSearchAPI] = None, max_workers: int = 8, max_age: float = 60.0,
+                 stale_max_age: float = 21600.0):
+        self.api = api or HotSearchAPI()
+        self.max_age = max_age  # 快照在该时长内视为新鲜，直接返回
+        self.stale_max_age = stale_max_age  # 数据源熔断时，该时长内的旧快照仍可使用
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="hotsearch-fetch")
+        self._sources: Set[str] = set()
+        self._snapshots: Dict[str, Tuple[float, HotSearchData]] = {}  # 数据源 -> (获取时间, 数据)
+        # 数据源 -> (失败时间, 当时返回的结果)，max_age内不再为失败的数据源重新采集
+        self._failures: Dict[str, Tuple[float, Optional[HotSearchData]]] = {}
+        self._inflight: Optional[Future] = None
+        self._lock = threading.Lock()
+    
+    def register(self, source: str):
+        """登记需要采集的数据源"""
+        with self._lock:
+            self._sources.add(source.lower())
+    
+    @property
+    def sources(self) -> List[str]:
+        """已登记的数据源，未登记任何数据源时为全部可用数据源"""
+        with self._lock:
+            return sorted(self._sources) or self.api.get_available_sources()
+    
+    def get_snapshot(self, source: str) -> Optional[Tuple[float, HotSearchData]]:
+        """数据源最近一次成功获取的(获取时间, 数据)，不触发采集"""
+        with self._lock:
+            return self._snapshots.get(source.lower())
+    
+    def _get_fresh(self, source: str, now: float) -> Tuple[bool, Optional[HotSearchData]]:
+        """max_age内的结果：快照新鲜时为快照数据，最近一次采集失败时为当时返回的结果"""
+        with self._lock:
+            snapshot = self._snapshots.get(source)
+            if snapshot and now - snapshot[0] < self.max_age:
+                return True, snapshot[1]
+            failure = self._failures.get(source)
+            if failure and now - failure[0] < self.max_age:
+                return True, failure[1]
+        return False, None
+    
+    def get(self, source: str) -> Optional[HotSearchData]:
+        """获取数据源的热搜，快照过期时发起（或加入进行中的）一次采集
+        
+        数据源刚采集失败时在max_age内直接返回失败，不为它重新采集所有数据源。
+        """
+        source = source.lower()
+        fresh, data = self._get_fresh(source, time.time())
+        if fresh:
+            return data
+        self.register(source)
+        return self.collect().get(source)
+    
+    def get_many(self, sources: List[str]) -> Dict[str, HotSearchData]:
+        """获取多个数据源的热搜，任一结果过期时只发起（或加入）一次采集，获取失败的数据源不在结果中"""
+        sources = [source.lower() for source in sources]
+        now = time.time()
+        cached = {source: self._get_fresh(source, now) for source in sources}
+        if all(fresh for fresh, _ in cached.values()):
+            return {source: data for source, (_, data) in cached.items() if data}
+        for source in sources:
+            self.register(source)
+        results = self.collect()
+        return {source: results[source] for source in sources if results.get(source)}
+    
+    def collect(self) -> Dict[str, Optional[HotSearchData]]:
+        """并发获取所有已登记的数据源，已有采集进行中时等待其结果"""
+        with self._lock:
+            future = self._inflight
+            owner = future is None
+            if owner:
+                future = self._inflight = Future()
+        if not owner:
+            return future.result()
+        
+        try:
+            results = self._collect_all()
+        except Exception as e:
+            logger.error(f"热搜采集异常: {e}")
+            results = {}
+        finally:
+            with self._lock:
+                self._inflight = None
+        future.set_result(results)
+        return results
+    
+    def _fetch(self, source: str) -> Optional[HotSearchData]:
+        """获取单个数据源，异常视为失败"""
+        try:
+            return self.api.get_hot_by_source(source)
+        except Exception as e:
+            logger.error(f"获取{source}热搜失败: {e}")
+            return None
+    
+    def _collect_all(self) -> Dict[str, Optional[HotSearchData]]:
+        """并发获取并发布快照"""
+        sources = self.sources
+        start = time.monotonic()
+        results = dict(zip(sources, self._executor.map(self._fetch, sources)))
+        
+        fetched_at = time.time()
+        with self._lock:
+            for source, data in results.items():
+                if data is not None:
+                    self._snapshots[source] = (fetched_at, data)
+                    self._failures.pop(source, None)
+                    continue
+                # 熔断中的数据源改用最近一次成功的快照
+                snapshot = self._snapshots.get(source)
+                if snapshot and fetched_at - snapshot[0] < self.stale_max_age and self.api.is_circuit_open(source):
+                    logger.info(f"{source}热搜源熔断中，使用{(fetched_at - snapshot[0]) / 60:.0f}分钟前的快照")
+                    results[source] = snapshot[1]
+                self._failures[source] = (fetched_at, results[source])
+        
+        succeeded = sum(1 for source in sources if self._snapshots.get(source, (0,))[0] == fetched_at)
+        logger.info(f"热搜采集完成：{succeeded}/{len(sources)} 个数据源，耗时 {time.monotonic() - start:.2f}秒")
+        return results
+
+# 全局热搜采集器，各热搜任务共用
+hotsearch_collector = HotSearchCollector(
+    max_workers=config.hotsearch_max_workers,
+    max_age=config.hotsearch_snapshot_max_age,
+    stale_max_age=config.hotsearch_stale_max_age
+)
@@ -1,7 +1,12 @@
 """热搜榜单格式化模块"""
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from .hotsearch import HotSearchData, HotSearchItem
+from .rank_tracker import RankDiff
+from .topic_cluster import HotTopic
+
+# Markdown消息展示的条目数
+DISPLAY_LIMIT = 10
 
 class HotSearchFormatter:
     """热搜榜单格式化器"""
@@ -22,6 +27,33 @@ class HotSearchFormatter:
         else:
             return "📊"
     
+    @staticmethod
+    def get_movement_badge(movement: Optional[int]) -> str:
+        """排名变化标记：新上榜、上升或下降名次，不变时为空"""
+        if movement is None:
+            return "🆕"
+        if movement > 0:
+            return f"🔺{movement}"
+        if movement < 0:
+            return f"🔻{-movement}"
+        return ""
+    
+    @staticmethod
+    def format_dropped_section(hotsearch_data: HotSearchData, diff: RankDiff) -> str:
+        """上次展示过、本次跌出展示范围的条目"""
+        fallen = [(rank, title, None) for rank, title in diff.dropped if rank <= DISPLAY_LIMIT]
+        for item, movement in zip(hotsearch_data.items[DISPLAY_LIMIT:], diff.movements[DISPLAY_LIMIT:]):
+            if movement is not None and item.rank + movement <= DISPLAY_LIMIT:
+                fallen.append((item.rank + movement, item.title, item.rank))
+        if not fallen:
+            return ""
+        
+        section = "### 📉 跌出榜单\n\n"
+        for previous_rank, title, rank in sorted(fallen):
+            where = f"现第{rank}名" if rank else "已不在榜"
+            section += f"- {title}（原第{previous_rank}名，{where}）\n"
+        return section + "\n"
+    
     @staticmethod
     def get_category_emoji(category: Optional[str]) -> str:
         """根据分类获取对应的emoji"""
@@ -87,8 +119,8 @@ class HotSearchFormatter:
         return message
     
     @staticmethod
-    def format_markdown_message(hotsearch_data: HotSearchData) -> tuple[str, str]:
-        """格式化为Markdown消息，返回(title, content)"""
+    def format_markdown_message(hotsearch_data: HotSearchData, diff: Optional[RankDiff] = None) -> tuple[str, str]:
+        """格式化为Markdown消息，返回(title, content)；传入diff时标注与上次推送相比的排名变化"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
         
         title = f"🔥 {hotsearch_data.source}热搜榜"
@@ -98,9 +130,10 @@ class HotSearchFormatter:
         content += "---\n\n"
         
         # 直接显示前10条热搜，不分组
-        display_items = hotsearch_data.items[:10]  # 只取前10条
+        display_items = hotsearch_data.items[:DISPLAY_LIMIT]  # 只取前10条
+        show_movement = diff is not None and diff.has_previous
         
-        for item in display_items:
+        for index, item in enumerate(display_items):
             rank_emoji = HotSearchFormatter.get_rank_emoji(item.rank)
             
             # 如果有URL，创建可点击的链接
@@ -112,14 +145,47 @@ class HotSearchFormatter:
             if item.hot_value:
                 content += f" `{item.hot_value}`"
             
+            if show_movement:
+                badge = HotSearchFormatter.get_movement_badge(diff.movements[index])
+                if badge:
+                    content += f" {badge}"
+            
             content += "\n\n"
         
+        if show_movement:
+            content += HotSearchFormatter.format_dropped_section(hotsearch_data, diff)
+        
         # 统计信息
         content += "---\n\n"
         content += f"📊 **数据源：** {hotsearch_data.source} | **更新时间：** {hotsearch_data.update_time}\n"
         
         return title, content
     
+    @staticmethod
+    def format_topic_digest(topics: List[HotTopic], sources: List[str]) -> tuple[str, str]:
+        """格式化全网热点消息，每个话题列出出现的数据源及排名，返回(title, content)"""
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+        
+        title = "🌐 全网热点"
+        
+        content = "## 🌐 全网热点\n\n"
+        content += f"> 📅 **更新时间：** {current_time}\n\n"
+        content += "---\n\n"
+        
+        for index, topic in enumerate(topics, 1):
+            rank_emoji = HotSearchFormatter.get_rank_emoji(index)
+            if topic.url:
+                content += f"**{rank_emoji} {index}.** [{topic.title}]({topic.url})\n"
+            else:
+                content += f"**{rank_emoji} {index}.** {topic.title}\n"
+            appearances = " · ".join(f"{source}#{topic.ranks[source]}" for source in topic.sources)
+            content += f"> {len(topic.ranks)}个平台：{appearances}\n\n"
+        
+        content += "---\n\n"
+        content += f"📊 **数据源：** {'、'.join(sources)}\n"
+        
+        return title, content
+    
     @staticmethod
     def format_simple_list(hotsearch_data: HotSearchData, limit: int = 10) -> str:
         """格式化为简单列表"""
@@ -0,0 +1,173 @@
+"""热搜数据源定义与编译模块"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from loguru import logger
+
+# 参考JavaScript代码的API配置，确保包含正确的URL链接
+BUILTIN_SOURCES: Dict[str, Dict[str, Any]] = {
+    "weibo": {
+        "name": "微博",
+        "url": "https://weibo.com/ajax/statuses/hot_band",
+        "path": "data.band_list",
+        "title_key": "word",
+        "hot_key": "num",
+        "url_key": "url",
+        "url_template": "https://s.weibo.com/weibo?q={}&rsv_pq=&rsv_t=&oq=&rsv_spt=1"
+    },
+    "zhihu": {
+        "name": "知乎", 
+        "url": "https://www.zhihu.com/api/v3/feed/topstory/hot-lists/total?limit=15&desktop=true",
+        "path": "data",
+        "title_key": "target.title",
+        "hot_key": "detail_text",
+        "url_key": "target.url",
+        "url_template": "https://www.zhihu.com/hot"
+    },
+    "douyin": {
+        "name": "抖音",
+        "url": "https://aweme.snssdk.com/aweme/v1/hot/search/list/",
+        "path": "data.word_list",
+        "title_key": "word",
+        "hot_key": "hot_value",
+        "url_key": "",
+        "url_template": "https://www.douyin.com/search/{}"
+    },
+    "toutiao": {
+        "name": "今日头条",
+        "url": "https://www.toutiao.com/hot-event/hot-board/?origin=toutiao_pc",
+        "path": "data",
+        "title_key": "Title",
+        "hot_key": "HotValue",
+        "url_key": "Url",
+        "url_template": "https://www.toutiao.com/"
+    },
+    "bilibili": {
+        "name": "哔哩哔哩",
+        "url": "https://api.bilibili.com/x/web-interface/ranking/v2",
+        "path": "data.list",
+        "title_key": "title",
+        "hot_key": "play",
+        "url_key": "short_link_v2",
+        "url_template": "https://www.bilibili.com/"
+    },
+    "baidu": {
+        "name": "百度",
+        "url": "https://tenapi.cn/v2/baiduhot",
+        "path": "data",
+        "title_key": "title",
+        "hot_key": "index",
+        "url_key": "url",
+        "url_template": "https://www.baidu.com/s?wd={}"
+    },
+    "tieba": {
+        "name": "百度贴吧",
+        "url": "https://tieba.baidu.com/hottopic/browse/topicList",
+        "path": "data.bang_topic.topic_list",
+        "title_key": "topic_name",
+        "hot_key": "discuss_num",
+        "url_key": "topic_url",
+        "url_template": "https://tieba.baidu.com/"
+    }
+}
+
+# 数据源定义必须包含的字段
+REQUIRED_FIELDS = ("name", "url", "path", "title_key")
+
+def compile_path(path: str) -> Callable[[Any], Any]:
+    """点分路径（如target.title）编译为取值函数，路径只在编译时拆分一次
+    
+    纯数字的路径段按列表下标取值；路径为空时返回数据本身，
+    中途缺失或类型不符时返回None。
+    """
+    steps = tuple(int(key) if key.isdigit() else key for key in path.split(".")) if path else ()
+    if not steps:
+        return lambda data: data
+    if len(steps) == 1:
+        key = steps[0]
+        
+        def get_one(data):
+            try:
+                return data[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return get_one
+    
+    def get_chain(data):
+        try:
+            for key in steps:
+                data = data[key]
+            return data
+        except (KeyError, IndexError, TypeError):
+            return None
+    return get_chain
+
+class SourceExtractor:
+    """编译后的数据源定义
+    
+    列表路径和各字段路径预先编译为取值函数，URL模板预先拆分为前后缀，
+    逐条解析时不再拆分路径或判断模板形式。
+    """
+    
+    def __init__(self, key: str, definition: Dict[str, Any]):
+        self.key = key
+        self.name = definition["name"]
+        self.url = definition["url"]
+        self.params = definition.get("params", {})
+        self.get_list = compile_path(definition["path"])
+        self.get_title = compile_path(definition["title_key"])
+        hot_key = definition.get("hot_key")
+        url_key = definition.get("url_key")
+        self.get_hot = compile_path(hot_key) if hot_key else None
+        self.get_url = compile_path(url_key) if url_key else None
+        
+        template = definition.get("url_template") or ""
+        self.url_prefix, placeholder, self.url_suffix = template.partition("{}")
+        self.quote_title = bool(placeholder)  # 模板含{}时填入编码后的标题，否则为固定链接
+    
+    def extract(self, items_data: List[Any], limit: int) -> List[Tuple[int, str, str, str]]:
+        """从条目列表中提取(排名, 标题, 链接, 热度)，标题为空的条目跳过但保留其排名位置"""
+        rows = []
+        get_title, get_hot, get_url = self.get_title, self.get_hot, self.get_url
+        for rank, item_data in enumerate(items_data[:limit], 1):
+            title = get_title(item_data)
+            if not title:
+                continue
+            title = str(title)
+            url = get_url(item_data) if get_url else None
+            if not url:
+                if self.quote_title:
+                    url = f"{self.url_prefix}{quote(title)}{self.url_suffix}"
+                else:
+                    url = self.url_prefix
+            hot_value = get_hot(item_data) if get_hot else None
+            rows.append((rank, title, str(url) if url else "", str(hot_value) if hot_value else ""))
+        return rows
+
+def load_source_definitions(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """内置数据源加上声明式数据源文件中的定义，文件中的同名数据源覆盖内置定义
+    
+    文件为JSON对象，键为数据源代码，值的字段与内置定义相同。
+    """
+    definitions = {key: dict(definition) for key, definition in BUILTIN_SOURCES.items()}
+    if not path:
+        return definitions
+    
+    try:
+        with open(path, encoding="utf-8") as f:
+            loaded = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"读取热搜数据源文件 {path} 失败: {e}")
+        return definitions
+    
+    if not isinstance(loaded, dict):
+        logger.error(f"热搜数据源文件 {path} 应为以数据源代码为键的JSON对象")
+        return definitions
+    for key, definition in loaded.items():
+        missing = [field for field in REQUIRED_FIELDS if not isinstance(definition, dict) or field not in definition]
+        if missing:
+            logger.warning(f"热搜数据源 {key} 缺少字段 {', '.join(missing)}，已忽略")
+            continue
+        definitions[key.lower()] = definition
+    logger.info(f"已从 {path} 加载 {len(loaded)} 个热搜数据源定义")
+    return definitions
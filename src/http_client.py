@@ -0,0 +1,192 @@
+"""HTTP连接池传输模块"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from .usage import UsageTracker, usage_tracker
+from .config import config
+
+# 可安全重试的幂等方法
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# 需要重试的HTTP状态码
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# 各上游的默认超时时间（秒）
+DEFAULT_TIMEOUTS = {
+    "api.caiyunapp.com": 10.0,
+    "oapi.dingtalk.com": 10.0,
+}
+
+# 各上游的默认并发上限（群发时钉钉需要更高的并发）
+DEFAULT_HOST_LIMITS = {
+    "oapi.dingtalk.com": 16,
+}
+
+class HttpTransport:
+    """按主机复用连接的HTTP传输层
+    
+    每个主机维护一个带keep-alive连接池的Session，限制单主机并发数，
+    幂等请求失败时按带抖动的指数退避重试。
+    """
+    
+    def __init__(self, pool_size: int = 10, max_per_host: int = 4, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 default_timeout: float = 15.0, timeouts: Optional[Dict[str, float]] = None,
+                 host_limits: Optional[Dict[str, int]] = None, usage: Optional[UsageTracker] = None):
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_timeout = default_timeout
+        self.timeouts: Dict[str, float] = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.host_limits: Dict[str, int] = {**DEFAULT_HOST_LIMITS, **(host_limits or {})}
+        self.usage = usage
+        
+        self._sessions: Dict[str, requests.Session] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _get_host(url: str) -> str:
+        """提取URL中的主机名"""
+        return (urlsplit(url).hostname or "").lower()
+    
+    def _get_session(self, host: str) -> requests.Session:
+        """获取（必要时创建）主机对应的Session"""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                limit = self.host_limits.get(host, self.max_per_host)
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=max(self.pool_size, limit),
+                    max_retries=0  # 重试由本模块统一处理
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+                self._semaphores[host] = threading.BoundedSemaphore(limit)
+            return session
+    
+    def get_timeout(self, url_or_host: str) -> float:
+        """获取上游对应的超时时间"""
+        host = self._get_host(url_or_host) if "://" in url_or_host else url_or_host.lower()
+        return self.timeouts.get(host, self.default_timeout)
+    
+    def set_timeout(self, host: str, timeout: float):
+        """设置上游的超时时间"""
+        self.timeouts[host.lower()] = timeout
+    
+    def _get_backoff(self, attempt: int) -> float:
+        """计算第attempt次重试前的等待时间（完全抖动）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _record_usage(self, method: str, host: str, api_key: Optional[str],
+                      response: Optional[requests.Response], started: float):
+        """记录一次实际发出的请求，预热连接的HEAD请求不计入用量"""
+        if not self.usage or method == "HEAD":
+            return
+        latency = time.monotonic() - started
+        if response is None:
+            self.usage.record(host, api_key, False, 0, latency)
+        else:
+            self.usage.record(host, api_key, response.ok, len(response.content), latency)
+    
+    def request(self, method: str, url: str, timeout: Optional[float] = None,
+                retries: Optional[int] = None, api_key: Optional[str] = None,
+                **kwargs) -> requests.Response:
+        """发送HTTP请求
+        
+        非幂等请求（如POST）默认不重试，可通过retries显式开启。
+        重试耗尽后返回最后一次响应，或抛出最后一次网络异常。
+        每次尝试都按主机和api_key计入用量统计。
+        """
+        method = method.upper()
+        host = self._get_host(url)
+        session = self._get_session(host)
+        semaphore = self._semaphores[host]
+        
+        if timeout is None:
+            timeout = self.timeouts.get(host, self.default_timeout)
+        if retries is None:
+            retries = self.max_retries if method in IDEMPOTENT_METHODS else 0
+        
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with semaphore:
+                    response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record_usage(method, host, api_key, None, started)
+                if attempt >= retries:
+                    raise
+                delay = self._get_backoff(attempt)
+                logger.warning(f"请求 {host} 失败，{delay:.2f}秒后第{attempt + 1}次重试: {e}")
+            else:
+                self._record_usage(method, host, api_key, response, started)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                delay = self._get_backoff(attempt)
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, min(float(retry_after), self.backoff_max))
+                logger.warning(f"请求 {host} 返回 {response.status_code}，{delay:.2f}秒后第{attempt + 1}次重试")
+                response.close()
+            
+            time.sleep(delay)
+            attempt += 1
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求"""
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """发送POST请求"""
+        return self.request("POST", url, **kwargs)
+    
+    def warm(self, url: str) -> bool:
+        """提前建立到URL所在主机的连接（DNS、TCP、TLS），放回连接池供后续请求复用
+        
+        只请求主机根路径的HEAD，不关心响应状态码。
+        """
+        parts = urlsplit(url)
+        if not parts.scheme or not parts.netloc:
+            return False
+        host = self._get_host(url)
+        start = time.monotonic()
+        try:
+            response = self.request(
+                "HEAD", f"{parts.scheme}://{parts.netloc}/",
+                timeout=min(self.get_timeout(host), 5.0), retries=0, allow_redirects=False
+            )
+            response.close()
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"预热 {host} 连接失败: {e}")
+            return False
+        logger.debug(f"预热 {host} 连接完成，耗时 {(time.monotonic() - start) * 1000:.0f}ms")
+        return True
+    
+    def close(self):
+        """关闭所有连接池"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._semaphores.clear()
+
+# 全局共享的传输实例
+transport = HttpTransport(
+    pool_size=config.http_pool_size,
+    max_per_host=config.http_max_per_host,
+    max_retries=config.http_max_retries,
+    timeouts=config.http_timeouts,
+    usage=usage_tracker
+)
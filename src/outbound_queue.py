@@ -0,0 +1,226 @@
+"""钉钉消息出站队列模块"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+from .config import config
+from .dingtalk import DingTalkBot, THROTTLE_ERRCODES, LOCAL_THROTTLE_ERRCODE
+
+class MessagePriority(IntEnum):
+    """消息优先级，数值越小越优先"""
+    URGENT = 0  # 预警等紧急消息
+    NORMAL = 1  # 常规播报
+    DIGEST = 2  # 榜单、汇总等摘要类消息
+
+# 发送结束的回调：(是否全部送达, 已送达的webhook列表)
+CompletionCallback = Callable[[bool, List[str]], None]
+
+class OutboundMessage:
+    """待发送的消息"""
+    
+    def __init__(self, bot: DingTalkBot, payload: Dict[str, Any], priority: MessagePriority):
+        self.bot = bot
+        self.payload = payload
+        self.priority = priority
+        self.attempts = 0
+        self.submitted_at = time.monotonic()
+        self.started = False  # 是否已开始发送，开始后不能再取消
+        self.delivered: List[str] = []  # 已送达的webhook，群发时为成功的目标
+        self.future: Future = Future()
+
+class OutboundQueue:
+    """带令牌桶限流和优先级的出站队列
+    
+    每个webhook共用一个令牌桶；额度偏低时为紧急消息预留额度，
+    摘要类消息等待补充；钉钉返回限流错误码时延迟重试而不是直接失败。
+    重试按指数退避，下次重试会晚于send_timeout（等待方放弃等待的时刻）时不再重试。
+    """
+    
+    def __init__(self, max_workers: int = 4, digest_reserve: int = 5,
+                 max_attempts: int = 5, retry_delay: float = 20.0, send_timeout: Optional[float] = None):
+        self.max_workers = max_workers
+        self.digest_reserve = digest_reserve
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.send_timeout = send_timeout
+        
+        self._ready: List[Tuple[int, int, OutboundMessage]] = []  # (优先级, 序号, 消息)
+        self._delayed: List[Tuple[float, int, OutboundMessage]] = []  # (可发送时间, 序号, 消息)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+    
+    def start(self):
+        """启动出站队列工作线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="outbound")
+            self._thread = threading.Thread(target=self._run, name="outbound-queue", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """停止出站队列，未发送的消息将被取消"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            pending = [item[-1] for item in self._ready + self._delayed]
+            self._ready.clear()
+            self._delayed.clear()
+            self._cond.notify_all()
+        
+        for message in pending:
+            # 限流重试中的消息已开始发送，无法取消，按失败结束
+            if not message.future.cancel():
+                self._resolve(message, False)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        logger.info("出站队列已停止")
+    
+    def pending_count(self) -> int:
+        """排队中的消息数量"""
+        with self._cond:
+            return len(self._ready) + len(self._delayed)
+    
+    def submit(self, bot: DingTalkBot, payload: Dict[str, Any],
+               priority: MessagePriority = MessagePriority.NORMAL,
+               on_complete: Optional[CompletionCallback] = None) -> Future:
+        """提交消息，返回发送结果的Future
+        
+        on_complete在发送最终结束（送达、失败或发送前被取消）时调用一次，
+        即使等待方已经超时返回。
+        """
+        self.start()
+        message = OutboundMessage(bot, payload, priority)
+        if on_complete:
+            message.future.add_done_callback(
+                lambda future: on_complete(not future.cancelled() and future.result(), list(message.delivered))
+            )
+        with self._cond:
+            heapq.heappush(self._ready, (int(priority), next(self._seq), message))
+            self._cond.notify()
+        return message.future
+    
+    def send(self, bot: DingTalkBot, payload: Dict[str, Any],
+             priority: MessagePriority = MessagePriority.NORMAL,
+             timeout: Optional[float] = None,
+             on_complete: Optional[CompletionCallback] = None) -> bool:
+        """提交消息并等待发送结果"""
+        future = self.submit(bot, payload, priority, on_complete)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                logger.error(f"消息在{timeout}秒内未能发出，已取消")
+            else:
+                logger.error(f"消息在{timeout}秒内未确认送达，仍在发送中，结果由回调处理")
+            return False
+    
+    def send_markdown(self, bot: DingTalkBot, title: str, text: str,
+                      priority: MessagePriority = MessagePriority.NORMAL,
+                      at_all: bool = False, timeout: Optional[float] = None,
+                      on_complete: Optional[CompletionCallback] = None) -> bool:
+        """通过队列发送Markdown消息"""
+        payload = bot.build_markdown_payload(title, text, at_all)
+        return self.send(bot, payload, priority, timeout, on_complete)
+    
+    def _defer(self, message: OutboundMessage, delay: float):
+        """延迟delay秒后重新排队"""
+        with self._cond:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), message))
+            self._cond.notify()
+    
+    def _next_message(self) -> Optional[OutboundMessage]:
+        """取出下一条可发送的消息，队列为空时阻塞等待"""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, message = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (int(message.priority), seq, message))
+                
+                if self._ready:
+                    return heapq.heappop(self._ready)[-1]
+                
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._cond.wait(timeout)
+        return None
+    
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            
+            if message.future.cancelled():
+                continue
+            
+            # 额度偏低时摘要类消息让出额度给紧急消息
+            reserve = self.digest_reserve if message.priority >= MessagePriority.DIGEST else 0
+            if message.bot.available_tokens() < 1 + reserve:
+                self._defer(message, max(message.bot.time_until_token(1 + reserve), 0.1))
+                continue
+            
+            self._executor.submit(self._dispatch, message)
+    
+    def _dispatch(self, message: OutboundMessage):
+        """发送单条消息并处理结果"""
+        # 首次发送前转为运行状态，此后等待方无法取消，结果一定通过Future回传
+        if not message.started:
+            if not message.future.set_running_or_notify_cancel():
+                return
+            message.started = True
+        
+        try:
+            result = message.bot.send_payload(message.payload)
+        except Exception as e:
+            result = {"errcode": None, "errmsg": str(e)}
+        
+        errcode = result.get("errcode")
+        message.delivered = result.get("delivered", [message.bot.webhook_url] if errcode == 0 else [])
+        if errcode == 0:
+            self._resolve(message, True)
+            return
+        
+        if errcode == LOCAL_THROTTLE_ERRCODE:
+            # 并发发送时额度被其他消息抢先用掉，等待补充后重试
+            self._defer(message, max(message.bot.time_until_token(), 0.1))
+            return
+        
+        if errcode in THROTTLE_ERRCODES:
+            message.attempts += 1
+            delay = self.retry_delay * (2 ** (message.attempts - 1))
+            elapsed = time.monotonic() - message.submitted_at
+            if self.send_timeout is not None and elapsed + delay >= self.send_timeout:
+                logger.error(f"钉钉限流({errcode})，{delay:.0f}秒后重试将超过发送时限{self.send_timeout:.0f}秒，不再重试")
+                self._resolve(message, False)
+                return
+            if message.attempts < self.max_attempts:
+                logger.warning(f"钉钉限流({errcode})，{delay:.0f}秒后第{message.attempts}次重试")
+                self._defer(message, delay)
+                return
+        
+        logger.error(f"钉钉消息发送失败: {result.get('errmsg')}")
+        self._resolve(message, False)
+    
+    @staticmethod
+    def _resolve(message: OutboundMessage, success: bool):
+        """设置发送结果（调用方可能已超时取消）"""
+        if not message.future.done():
+            message.future.set_result(success)
+
+# 全局出站队列
+outbound_queue = OutboundQueue(
+    max_workers=config.outbound_max_workers,
+    digest_reserve=config.outbound_digest_reserve,
+    send_timeout=config.outbound_send_timeout
+)
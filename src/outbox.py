@@ -0,0 +1,273 @@
+"""持久化发件箱模块"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from pydantic import BaseModel
+from loguru import logger
+from .config import config
+from .outbound_queue import outbound_queue, MessagePriority
+
+class OutboxEntry(BaseModel):
+    """发件箱中的一条消息"""
+    id: int
+    idempotency_key: str  # 任务名+cron时间槽，重放时用于去重
+    task_name: str
+    channel: str  # 发送端的webhook标识
+    title: str
+    content: str
+    priority: int
+    attempts: int = 0
+    created_at: float
+    delivered: List[str] = []  # 群发时已送达的webhook，重放时不再发送
+
+class Outbox:
+    """基于SQLite（WAL模式）的持久化发件箱
+    
+    消息在发送前先落盘，发送结束后按结果确认或安排重放；失败的消息由后台线程
+    按退避重试，进程重启后继续重放积压。同一幂等键只会投递一次，群发部分失败
+    时只向失败的群重放。
+    """
+    
+    def __init__(self, path: str, drain_interval: float = 30.0, lease: float = 300.0,
+                 max_age: float = 6 * 3600, retention: float = 7 * 86400):
+        self.path = path
+        self.drain_interval = drain_interval
+        self.lease = lease  # 消息被认领后其他发送方需等待的秒数
+        self.max_age = max_age  # 超过该时长仍未发出的消息不再重放
+        self.retention = retention  # 已发送记录保留时长
+        
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._channels: Dict[str, Any] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接（首次使用时建表），调用方需持有锁"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    task_name TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    sent_at REAL,
+                    delivered TEXT NOT NULL DEFAULT '[]'
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "delivered" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN delivered TEXT NOT NULL DEFAULT '[]'")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at)"
+            )
+            self._conn = conn
+        return self._conn
+    
+    def register_channel(self, bot):
+        """登记发送端，重放时按webhook找回对应的发送端"""
+        self._channels[bot.webhook_url] = bot
+    
+    def record(self, idempotency_key: str, task_name: str, bot, title: str, content: str,
+               priority: MessagePriority = MessagePriority.NORMAL) -> Optional[OutboxEntry]:
+        """记录待发送消息并认领发送权
+        
+        返回None表示该幂等键已经投递过或正由其他发送方处理。
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO outbox
+                   (idempotency_key, task_name, channel, title, content, priority, created_at, next_attempt_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (idempotency_key, task_name, bot.webhook_url, title, content, int(priority), now, now + self.lease)
+            )
+            if cursor.rowcount == 0:
+                # 已存在：只有待发送且未被认领时才由本次调用接手
+                cursor = conn.execute(
+                    """UPDATE outbox SET next_attempt_at = ?, title = ?, content = ?
+                       WHERE idempotency_key = ? AND status = 'pending' AND next_attempt_at <= ?""",
+                    (now + self.lease, title, content, idempotency_key, now)
+                )
+                if cursor.rowcount == 0:
+                    return None
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        self.register_channel(bot)
+        return self._to_entry(row)
+    
+    def ack(self, entry_id: int):
+        """确认消息已送达"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                (time.time(), entry_id)
+            )
+    
+    def release(self, entry_id: int, error: str = ""):
+        """发送失败，按指数退避安排下次重试"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+            attempts = (row["attempts"] if row else 0) + 1
+            delay = min(self.drain_interval * (2 ** (attempts - 1)), 1800)
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts, error, time.time() + delay, entry_id)
+            )
+    
+    def settle(self, entry_id: int, success: bool, delivered: Iterable[str] = (), error: str = "消息发送失败"):
+        """按最终发送结果确认或安排重放，并记下已送达的目标"""
+        if success:
+            self.ack(entry_id)
+            return
+        delivered = set(delivered)
+        if delivered:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT delivered FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+                if row:
+                    delivered |= set(json.loads(row["delivered"]))
+                conn.execute(
+                    "UPDATE outbox SET delivered = ? WHERE id = ?",
+                    (json.dumps(sorted(delivered)), entry_id)
+                )
+        self.release(entry_id, error)
+    
+    def target_for(self, entry: OutboxEntry, bot=None):
+        """消息的发送端，去掉已送达的群发目标；所有目标都已送达时返回None"""
+        bot = bot or self._channels[entry.channel]
+        if entry.delivered and hasattr(bot, "without"):
+            return bot.without(entry.delivered)
+        return bot
+    
+    def _claim_due(self, limit: int = 20) -> List[OutboxEntry]:
+        """认领到期的待发送消息，并将过期消息标记为expired"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE outbox SET status = 'expired' WHERE status = 'pending' AND created_at < ?",
+                (now - self.max_age,)
+            )
+            rows = conn.execute(
+                """SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?
+                   ORDER BY priority, created_at LIMIT ?""",
+                (now, limit)
+            ).fetchall()
+            entries = []
+            for row in rows:
+                if row["channel"] not in self._channels:
+                    continue
+                cursor = conn.execute(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND next_attempt_at <= ?",
+                    (now + self.lease, row["id"], now)
+                )
+                if cursor.rowcount:
+                    entries.append(self._to_entry(row))
+            return entries
+    
+    def drain_once(self) -> int:
+        """发送一轮积压消息，返回成功数"""
+        delivered = 0
+        for entry in self._claim_due():
+            bot = self.target_for(entry)
+            if bot is None:
+                self.ack(entry.id)
+                continue
+            logger.info(f"重放发件箱消息: {entry.idempotency_key}")
+            # 超时仍在发送中的消息保持认领，由发送结束的回调确认或安排重放
+            if outbound_queue.send_markdown(
+                bot,
+                entry.title,
+                entry.content,
+                priority=MessagePriority(entry.priority),
+                timeout=config.outbound_send_timeout,
+                on_complete=lambda success, targets, entry_id=entry.id: self.settle(
+                    entry_id, success, targets, "重放发送失败"
+                )
+            ):
+                delivered += 1
+        self._purge()
+        return delivered
+    
+    def _purge(self):
+        """清理超过保留期的已发送和过期记录"""
+        with self._lock:
+            self._connect().execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'expired') AND created_at < ?",
+                (time.time() - self.retention,)
+            )
+    
+    def get_stats(self) -> Dict[str, int]:
+        """各状态的消息数量"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) AS count FROM outbox GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+    
+    def start_drainer(self):
+        """启动后台重放线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._drain_loop, name="outbox-drainer", daemon=True)
+        self._thread.start()
+        logger.info("发件箱重放线程已启动")
+    
+    def stop_drainer(self):
+        """停止后台重放线程"""
+        self._stop_event.set()
+    
+    def _drain_loop(self):
+        """后台重放主循环"""
+        while not self._stop_event.is_set():
+            try:
+                self.drain_once()
+            except Exception as e:
+                logger.error(f"发件箱重放异常: {e}")
+            self._stop_event.wait(self.drain_interval)
+    
+    @staticmethod
+    def _to_entry(row: sqlite3.Row) -> OutboxEntry:
+        """数据库行转换为OutboxEntry"""
+        return OutboxEntry(
+            id=row["id"],
+            idempotency_key=row["idempotency_key"],
+            task_name=row["task_name"],
+            channel=row["channel"],
+            title=row["title"],
+            content=row["content"],
+            priority=row["priority"],
+            attempts=row["attempts"],
+            created_at=row["created_at"],
+            delivered=json.loads(row["delivered"])
+        )
+
+# 全局发件箱，未启用时为None
+outbox = Outbox(
+    config.outbox_path,
+    drain_interval=config.outbox_drain_interval,
+    max_age=config.outbox_max_age_hours * 3600
+) if config.outbox_enabled else None
@@ -0,0 +1,145 @@
+"""钉钉消息体大小规划模块"""
+import re
+from typing import Callable, List, Optional, Tuple
+from loguru import logger
+from .dingtalk import DingTalkBot, MARKDOWN_MAX_BYTES
+from .formatter import WeatherFormatter
+
+# 装饰性emoji（含变体选择符和零宽连接符）
+EMOJI_PATTERN = re.compile(
+    "["
+    "\U0001F1E6-\U0001F1FF"  # 旗帜
+    "\U0001F300-\U0001FAFF"  # 符号和象形文字
+    "\u2600-\u27BF"  # 杂项符号、装饰符号
+    "\u2B00-\u2BFF"  # 箭头、星形等
+    "\uFE0F\u200D"  # 变体选择符、零宽连接符
+    "]+"
+)
+
+# 章节边界：Markdown标题或分隔线
+SECTION_PATTERN = re.compile(r"^(#{2,3} |---\s*$)")
+
+class PayloadPlanner:
+    """发送前检查消息体大小，超限时先压缩再按章节拆分
+    
+    压缩顺序：精简小时预报明细、去掉装饰性emoji、合并多余空行；
+    仍然超限时在章节边界拆成带编号的多条消息。
+    """
+    
+    def __init__(self, max_bytes: int = MARKDOWN_MAX_BYTES, hourly_keep: int = 6,
+                 compactors: Optional[List[Callable[[str], str]]] = None):
+        self.max_bytes = max_bytes
+        self.hourly_keep = hourly_keep
+        self.compactors = compactors if compactors is not None else [
+            lambda text: WeatherFormatter.compact_hourly_forecast(text, self.hourly_keep),
+            self.strip_emoji,
+            self.collapse_blank_lines,
+        ]
+    
+    @staticmethod
+    def measure(title: str, text: str) -> int:
+        """计算Markdown消息体序列化后的字节数"""
+        return len(DingTalkBot.encode_payload(DingTalkBot.build_markdown_payload(title, text)))
+    
+    @staticmethod
+    def strip_emoji(text: str) -> str:
+        """去掉装饰性emoji"""
+        text = EMOJI_PATTERN.sub("", text)
+        # emoji去掉后行内可能留下多余空格
+        return re.sub(r"(?m)(?<=\S)  +", " ", text)
+    
+    @staticmethod
+    def collapse_blank_lines(text: str) -> str:
+        """连续空行合并为一行"""
+        return re.sub(r"\n{3,}", "\n\n", text)
+    
+    def compact(self, title: str, text: str) -> str:
+        """逐步压缩，直到不超限或无法继续压缩"""
+        for compactor in self.compactors:
+            if self.measure(title, text) <= self.max_bytes:
+                break
+            text = compactor(text)
+        return text
+    
+    @staticmethod
+    def _split_sections(text: str) -> List[str]:
+        """按章节边界切分，代码块内部不切分"""
+        sections: List[str] = []
+        current: List[str] = []
+        in_code = False
+        for line in text.split("\n"):
+            if line.startswith("```"):
+                in_code = not in_code
+            if not in_code and SECTION_PATTERN.match(line) and current:
+                sections.append("\n".join(current))
+                current = []
+            current.append(line)
+        if current:
+            sections.append("\n".join(current))
+        return sections
+    
+    def _split_oversized(self, title: str, section: str, budget: int) -> List[str]:
+        """单个章节仍超过budget字节时按行切分"""
+        chunks: List[str] = []
+        current = ""
+        for line in section.split("\n"):
+            candidate = f"{current}\n{line}" if current else line
+            if current and self.measure(title, candidate) > budget:
+                chunks.append(current)
+                current = line
+            else:
+                current = candidate
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def split(self, title: str, text: str) -> List[Tuple[str, str]]:
+        """在章节边界拆分为带编号的多条消息"""
+        # 预留编号标题和分段提示的空间
+        budget_title = f"{title} (99/99)"
+        budget = self.max_bytes - len("> 第99/99部分\n\n".encode("utf-8"))
+        sections: List[str] = []
+        for section in self._split_sections(text):
+            if self.measure(budget_title, section) > budget:
+                sections.extend(self._split_oversized(budget_title, section, budget))
+            else:
+                sections.append(section)
+        
+        parts: List[str] = []
+        current = ""
+        for section in sections:
+            candidate = f"{current}\n{section}" if current else section
+            if current and self.measure(budget_title, candidate) > budget:
+                parts.append(current)
+                current = section
+            else:
+                current = candidate
+        if current:
+            parts.append(current)
+        
+        total = len(parts)
+        if total == 1:
+            return [(title, parts[0])]
+        return [
+            (f"{title} ({index}/{total})", f"> 第{index}/{total}部分\n\n{part}")
+            for index, part in enumerate(parts, 1)
+        ]
+    
+    def plan(self, title: str, text: str) -> List[Tuple[str, str]]:
+        """返回可直接发送的(title, text)列表"""
+        size = self.measure(title, text)
+        if size <= self.max_bytes:
+            return [(title, text)]
+        
+        compacted = self.compact(title, text)
+        compacted_size = self.measure(title, compacted)
+        if compacted_size <= self.max_bytes:
+            logger.info(f"消息体 {size} 字节超限，压缩至 {compacted_size} 字节")
+            return [(title, compacted)]
+        
+        parts = self.split(title, compacted)
+        logger.info(f"消息体 {size} 字节超限，压缩后仍有 {compacted_size} 字节，拆分为 {len(parts)} 条")
+        return parts
+
+# 全局消息体规划器
+payload_planner = PayloadPlanner()
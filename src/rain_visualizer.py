@@ -3,7 +3,8 @@ import io
 import base64
 from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
-from .weather import WeatherData, HourlyWeatherData
+from .weather import WeatherData
+from .forecast_series import ForecastSeries
 from loguru import logger
 
 # 可选的matplotlib导入，处理服务器环境兼容性
@@ -59,11 +60,9 @@ class RainVisualizer:
             
         try:
             # 准备数据
-            times, precipitations, weather_descs = self._prepare_rain_data(
-                weather_data, extended_hours
-            )
+            series = self._prepare_rain_data(weather_data, extended_hours)
             
-            if not times or len(times) < 2:
+            if len(series) < 2:
                 logger.warning("降水数据不足，无法生成雨图")
                 return None
             
@@ -74,6 +73,9 @@ class RainVisualizer:
             fig.patch.set_facecolor('#f0f8ff')
             ax.set_facecolor('#ffffff')
             
+            times = series.datetimes()
+            precipitations = series.precipitation
+            
             # 绘制降水柱状图
             bars = ax.bar(times, precipitations, width=0.8/24, 
                          color=self._get_precipitation_colors(precipitations),
@@ -94,8 +96,7 @@ class RainVisualizer:
             plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
             
             # 设置Y轴范围
-            max_precip = max(precipitations) if precipitations else 1
-            ax.set_ylim(0, max(max_precip * 1.2, 0.5))
+            ax.set_ylim(0, max(series.max_precipitation * 1.2, 0.5))
             
             # 添加网格
             ax.grid(True, alpha=0.3, linestyle='--')
@@ -104,13 +105,13 @@ class RainVisualizer:
             self._add_precipitation_labels(ax, bars, precipitations)
             
             # 添加天气状态标记
-            self._add_weather_icons(ax, times, weather_descs, precipitations)
+            self._add_weather_icons(ax, times, series.weather_descs, precipitations)
             
             # 添加图例
             self._add_legend(ax)
             
             # 添加统计信息
-            self._add_statistics(ax, precipitations, times)
+            self._add_statistics(ax, series)
             
             # 调整布局
             plt.tight_layout()
@@ -135,35 +136,19 @@ class RainVisualizer:
             logger.error(f"生成雨图失败: {e}")
             return None
     
-    def _prepare_rain_data(self, weather_data: WeatherData, 
-                          extended_hours: int) -> Tuple[List[datetime], List[float], List[str]]:
-        """准备雨图数据"""
-        times = []
-        precipitations = []
-        weather_descs = []
-        
-        current_time = datetime.now()
-        
-        # 添加当前时间的数据（使用实时降水数据）
-        times.append(current_time)
-        current_precip = weather_data.precipitation  # 使用真实的实时降水量
-        precipitations.append(current_precip)
-        weather_descs.append(weather_data.weather_desc)
-        
-        # 添加小时级预报数据
-        for hour_data in weather_data.hourly_forecast:
-            times.append(hour_data.datetime)
-            precipitations.append(hour_data.precipitation)
-            weather_descs.append(hour_data.weather_desc)
-        
-        # 限制使用真实预报数据，如果不足就截取现有数据
-        # 优先使用真实的API数据，而不是模拟数据
-        max_real_hours = min(extended_hours, len(times))
-        times = times[:max_real_hours]
-        precipitations = precipitations[:max_real_hours]
-        weather_descs = weather_descs[:max_real_hours]
-        
-        return times, precipitations, weather_descs
+    def _prepare_rain_data(self, weather_data: WeatherData, extended_hours: int) -> ForecastSeries:
+        """准备雨图数据：当前实况加小时级预报，不复制为多个列表"""
+        # 当前时刻使用真实的实时降水量，之后接小时级预报
+        # 优先使用真实的API数据，不足extended_hours时只截取现有数据
+        return weather_data.hourly_forecast.prepend(
+            datetime.now(),
+            temperature=weather_data.temperature,
+            humidity=weather_data.humidity,
+            weather_desc=weather_data.weather_desc,
+            wind_speed=weather_data.wind_speed,
+            wind_direction=weather_data.wind_direction,
+            precipitation=weather_data.precipitation
+        ).head(extended_hours)
     
     def _simulate_precipitation(self, weather_desc: str, base_precip: float) -> float:
         """模拟降水量"""
@@ -202,7 +187,7 @@ class RainVisualizer:
         
         return random.choices(options, weights=weights)[0]
     
-    def _get_precipitation_colors(self, precipitations: List[float]) -> List[str]:
+    def _get_precipitation_colors(self, precipitations) -> List[str]:
         """根据降水量获取颜色"""
         colors = []
         for precip in precipitations:
@@ -220,7 +205,7 @@ class RainVisualizer:
                 colors.append('#004080')  # 暴雨 - 深深蓝
         return colors
     
-    def _add_precipitation_labels(self, ax, bars, precipitations: List[float]):
+    def _add_precipitation_labels(self, ax, bars, precipitations):
         """添加降水量标签"""
         for bar, precip in zip(bars, precipitations):
             if precip > 0.1:  # 只为有意义的降水量添加标签
@@ -230,7 +215,7 @@ class RainVisualizer:
                        fontsize=8, fontweight='bold')
     
     def _add_weather_icons(self, ax, times: List[datetime], 
-                          weather_descs: List[str], precipitations: List[float]):
+                          weather_descs: List[str], precipitations):
         """添加天气状态图标"""
         y_pos = ax.get_ylim()[1] * 0.9
         
@@ -272,18 +257,18 @@ class RainVisualizer:
         ax.legend(handles=legend_elements, loc='upper right', 
                  bbox_to_anchor=(1, 1), fontsize=10)
     
-    def _add_statistics(self, ax, precipitations: List[float], times: List[datetime]):
+    def _add_statistics(self, ax, series: ForecastSeries):
         """添加统计信息"""
-        if not precipitations:
+        if not series:
             return
             
-        total_precip = sum(precipitations)
-        max_precip = max(precipitations)
-        avg_precip = total_precip / len(precipitations)
+        total_precip = series.total_precipitation
+        max_precip = series.max_precipitation
+        avg_precip = series.mean_precipitation
         
         # 计算预报时长
-        if len(times) >= 2:
-            duration = (times[-1] - times[0]).total_seconds() / 3600
+        if len(series) >= 2:
+            duration = (series.timestamps[-1] - series.timestamps[0]) / 3600
         else:
             duration = 1
         
@@ -301,31 +286,29 @@ class RainVisualizer:
         """生成简化版雨图（只用ASCII字符）"""
         try:
             # 使用真实的彩云天气数据
-            times, precipitations, weather_descs = self._prepare_rain_data(weather_data, 24)
+            series = self._prepare_rain_data(weather_data, 24)
             
-            if not times or len(times) < 2:
+            if len(series) < 2:
                 return None
             
-            # 格式化时间为字符串
-            time_strings = [t.strftime("%H:%M") for t in times]
-            
             # 生成ASCII雨图
-            chart = self._create_ascii_rain_chart(precipitations, time_strings, city_name)
+            chart = self._create_ascii_rain_chart(series, city_name, weather_data.source)
             return chart
             
         except Exception as e:
             logger.error(f"生成简化雨图失败: {e}")
             return None
     
-    def _create_ascii_rain_chart(self, precipitations: List[float], 
-                                times: List[str], city_name: str) -> str:
+    def _create_ascii_rain_chart(self, series: ForecastSeries, city_name: str, source: str = "彩云天气") -> str:
         """创建ASCII雨图（参考彩云天气风格）"""
+        precipitations = series.precipitation
+        times = [t.strftime("%H:%M") for t in series.datetimes()]
         hours_count = len(precipitations)
         chart = f"🌧️ {city_name} {hours_count}小时降水预报\n"
         chart += "=" * min(40, 20 + hours_count) + "\n"
         
         # 找到最大降水量用于缩放
-        max_precip = max(precipitations) if any(p > 0 for p in precipitations) else 1
+        max_precip = series.max_precipitation if series.has_rain else 1
         
         # 彩云天气风格的降水强度分级
         def get_rain_char(precip: float) -> str:
@@ -372,9 +355,9 @@ class RainVisualizer:
         chart += "\n图例: █暴雨 ▓大雨 ▒中雨 ░小雨 ·无雨\n"
         
         # 添加统计信息
-        total = sum(precipitations)
-        max_val = max(precipitations) if precipitations else 0
-        has_rain = any(p > 0 for p in precipitations)
+        total = series.total_precipitation
+        max_val = series.max_precipitation
+        has_rain = series.has_rain
         
         chart += f"📊 {hours_count}h总量: {total:.1f}mm"
         if has_rain:
@@ -394,6 +377,6 @@ class RainVisualizer:
             chart += " | 无降水 ☀️"
         
         # 添加实时数据来源标注
-        chart += "\n💫 数据来源: 彩云天气API"
+        chart += f"\n💫 数据来源: {source}API"
         
         return chart
@@ -0,0 +1,105 @@
+"""热搜排名变化追踪模块"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from loguru import logger
+from .hotsearch import HotSearchItem
+from .config import config
+
+# 标题归一化时去掉的字符：空白、标点和符号（中日韩文字、字母和数字保留）
+_STRIP_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_title(title: str) -> str:
+    """标题归一化：全半角统一、忽略大小写、去掉空白和标点，用作排名索引的键"""
+    return _STRIP_PATTERN.sub("", unicodedata.normalize("NFKC", title).lower())
+
+class RankDiff(NamedTuple):
+    """本次榜单与上次推送榜单的比较结果"""
+    movements: List[Optional[int]]  # 与榜单条目一一对应：None为新上榜，正数为上升名次，负数为下降名次，0为不变
+    dropped: List[Tuple[int, str]]  # 跌出榜单的(上次排名, 标题)，按上次排名排序
+    has_previous: bool  # 是否有上次的榜单可供比较
+
+class RankTracker:
+    """按数据源保存上次推送的榜单，比较排名变化
+    
+    上次的榜单以归一化标题为键存为哈希索引，比较时每个条目一次查找，
+    整体O(n)；榜单写入SQLite，重启后仍能与重启前推送的榜单比较。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._previous: Dict[str, Dict[str, Tuple[int, str]]] = {}  # 数据源 -> 归一化标题 -> (排名, 标题)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """打开数据库并载入各数据源上次的榜单"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hotsearch_ranks (
+                    source TEXT PRIMARY KEY,
+                    items TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            for source, items in conn.execute("SELECT source, items FROM hotsearch_ranks"):
+                self._previous[source] = self._build_index(json.loads(items))
+            self._conn = conn
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"打开热搜排名记录失败，只在内存中记录: {e}")
+    
+    @staticmethod
+    def _build_index(items: List[Tuple[int, str]]) -> Dict[str, Tuple[int, str]]:
+        """(排名, 标题)列表建为以归一化标题为键的索引，重复标题保留排名靠前的"""
+        index: Dict[str, Tuple[int, str]] = {}
+        for rank, title in items:
+            index.setdefault(normalize_title(title), (rank, title))
+        return index
+    
+    def diff(self, source: str, items: List[HotSearchItem]) -> RankDiff:
+        """比较本次榜单与上次推送的榜单"""
+        with self._lock:
+            previous = self._previous.get(source)
+        if previous is None:
+            return RankDiff([0] * len(items), [], False)
+        
+        movements: List[Optional[int]] = []
+        seen = set()
+        for item in items:
+            key = normalize_title(item.title)
+            seen.add(key)
+            entry = previous.get(key)
+            movements.append(None if entry is None else entry[0] - item.rank)
+        
+        dropped = sorted(entry for key, entry in previous.items() if key not in seen)
+        return RankDiff(movements, dropped, True)
+    
+    def update(self, source: str, items: List[HotSearchItem]):
+        """记录本次推送的榜单"""
+        ranked = [(item.rank, item.title) for item in items]
+        with self._lock:
+            self._previous[source] = self._build_index(ranked)
+            if not self._conn:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO hotsearch_ranks (source, items, updated_at) VALUES (?, ?, ?)",
+                    (source, json.dumps(ranked, ensure_ascii=False), time.time())
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"保存热搜排名记录失败: {e}")
+
+# 全局热搜排名记录，未启用时为None
+rank_tracker = RankTracker(config.hotsearch_rank_path or None) if config.hotsearch_rank_tracking else None
@@ -0,0 +1,76 @@
+"""令牌桶限流模块"""
+import threading
+import time
+from typing import Dict, Optional
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+    
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # 每秒补充的令牌数
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """按流逝时间补充令牌，调用方需持有锁"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+    
+    def available(self) -> float:
+        """当前可用令牌数"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+    
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """尝试取走令牌，不足时立即返回False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+    
+    def time_until(self, tokens: float = 1.0) -> float:
+        """距离可取走指定数量令牌还需等待的秒数"""
+        with self._lock:
+            self._refill()
+            missing = min(tokens, self.capacity) - self._tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.refill_rate
+    
+    def wait(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """阻塞等待直到取走令牌，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.try_acquire(tokens):
+                return True
+            delay = self.time_until(tokens)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(max(delay, 0.01))
+    
+    def drain(self):
+        """清空令牌（上游返回限流时使用）"""
+        with self._lock:
+            self._refill()
+            self._tokens = 0.0
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(key: str, capacity: float, period: float = 60.0) -> TokenBucket:
+    """获取共享令牌桶，同一key的调用方共用同一份额度"""
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, capacity / period)
+            _buckets[key] = bucket
+        return bucket
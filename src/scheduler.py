@@ -1,22 +1,36 @@
 """定时任务调度模块"""
+import math
 import time
 from datetime import datetime, timedelta
-from typing import Callable, Optional, List
+from typing import Callable, Dict, Optional, List
+from urllib.parse import urlsplit
 from loguru import logger
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
 from croniter import croniter
 from .base import TaskManager
 from .dingtalk import DingTalkBot
-from .config import config
+from .async_dingtalk import AsyncBackedDingTalkBot, HAS_AIOHTTP, event_loop_thread
+from .fanout import FanoutSender
+from .outbox import outbox
+from .weather_history import weather_history
+from .usage import usage_tracker
+from .outbound_queue import MessagePriority
+from .config import config, SCHEDULER_TIMEZONE
+
+# 连接预热任务的ID后缀
+PREWARM_JOB_SUFFIX = "#prewarm"
+# cron之外加密轮询任务的ID后缀
+FOLLOWUP_JOB_SUFFIX = "#followup"
 
 class CronTaskScheduler:
     """基于Cron表达式的任务调度器"""
     
     def __init__(self):
         self.task_manager = TaskManager()
-        self.dingtalk_bot = DingTalkBot(config.dingtalk_webhook, config.dingtalk_secret)
+        self.dingtalk_bot = self._create_dingtalk_sender()
         
         # 配置APScheduler
         executors = {
@@ -32,10 +46,41 @@ class CronTaskScheduler:
         self.scheduler = BlockingScheduler(
             executors=executors,
             job_defaults=job_defaults,
-            timezone='Asia/Shanghai'  # 设置时区
+            timezone=SCHEDULER_TIMEZONE  # 设置时区
         )
         
         self.is_running = False
+        self._deferred: Dict[str, int] = {}  # 因超出用量预算已连续跳过的次数
+    
+    @staticmethod
+    def _create_dingtalk_sender():
+        """创建消息发送端，配置了多个群时返回群发器"""
+        bot_class = DingTalkBot
+        bot_options = {}
+        if config.dingtalk_async:
+            if HAS_AIOHTTP:
+                bot_class = AsyncBackedDingTalkBot
+                bot_options = {"max_in_flight": config.dingtalk_async_max_in_flight}
+                logger.info("钉钉消息将通过asyncio客户端发送")
+            else:
+                logger.warning("未安装aiohttp，DINGTALK_ASYNC配置无效，使用同步客户端")
+        
+        bot = bot_class(
+            config.dingtalk_webhook,
+            config.dingtalk_secret,
+            rate_limit=config.dingtalk_rate_limit,
+            robots=config.dingtalk_robots,
+            **bot_options
+        )
+        if not config.dingtalk_fanout_webhooks:
+            return bot
+        
+        bots = [bot] + [
+            bot_class(webhook, secret, rate_limit=config.dingtalk_rate_limit, **bot_options)
+            for webhook, secret in config.dingtalk_fanout_webhooks
+        ]
+        logger.info(f"已启用群发，共 {len(bots)} 个目标群")
+        return FanoutSender(bots, max_workers=config.fanout_max_workers)
     
     def validate_cron_expression(self, cron_expr: str) -> bool:
         """验证cron表达式是否有效"""
@@ -75,7 +120,7 @@ class CronTaskScheduler:
                 day=day,
                 month=month,
                 day_of_week=day_of_week,
-                timezone='Asia/Shanghai'
+                timezone=SCHEDULER_TIMEZONE
             )
             
             self.scheduler.add_job(
@@ -87,6 +132,9 @@ class CronTaskScheduler:
                 **kwargs
             )
             
+            if config.prewarm_lead_seconds > 0:
+                self._schedule_prewarm(task_name)
+            
             next_run = self.get_next_run_time(cron_expr)
             logger.info(f"任务 {task_name} 已添加，cron: {cron_expr}, 下次执行: {next_run}")
             return True
@@ -95,26 +143,100 @@ class CronTaskScheduler:
             logger.error(f"添加cron任务失败: {e}")
             return False
     
-    def execute_task_by_name(self, task_name: str) -> bool:
-        """执行指定名称的任务"""
+    def _schedule_prewarm(self, task_name: str, after: Optional[datetime] = None):
+        """在任务下次触发前提前预热其上游连接"""
+        job = self.scheduler.get_job(task_name)
+        if job is None:
+            return
+        
+        timezone = job.trigger.timezone
+        now = datetime.now(timezone)
+        fire_time = job.trigger.get_next_fire_time(None, max(after, now) if after else now)
+        if fire_time is None:
+            return
+        
+        run_date = max(fire_time - timedelta(seconds=config.prewarm_lead_seconds), now)
+        self.scheduler.add_job(
+            func=self._prewarm_task,
+            trigger=DateTrigger(run_date=run_date, timezone=timezone),
+            args=[task_name, fire_time],
+            id=f"{task_name}{PREWARM_JOB_SUFFIX}",
+            name=f"{task_name}{PREWARM_JOB_SUFFIX}",
+            replace_existing=True
+        )
+    
+    def _prewarm_task(self, task_name: str, fire_time: datetime):
+        """预热任务连接，并安排下一次触发前的预热"""
         try:
+            task = self.task_manager.get_task(task_name)
+            if task and task.enabled:
+                task.prewarm()
+        except Exception as e:
+            logger.warning(f"任务 {task_name} 预热连接失败: {e}")
+        finally:
+            self._schedule_prewarm(task_name, after=fire_time + timedelta(seconds=1))
+    
+    def _should_defer(self, task_name: str) -> bool:
+        """上游预计超出当日预算时按拉伸倍数跳过非紧急任务的部分触发，紧急任务不受影响"""
+        task = self.task_manager.get_task(task_name)
+        if not usage_tracker or task is None or task.priority == MessagePriority.URGENT:
+            return False
+        hosts = [urlsplit(url).hostname or "" for url in task.get_upstream_urls()]
+        factor = usage_tracker.get_stretch_factor(hosts)
+        deferred = self._deferred.get(task_name, 0)
+        if factor <= 1 or deferred + 1 >= math.ceil(factor):
+            self._deferred[task_name] = 0
+            return False
+        self._deferred[task_name] = deferred + 1
+        logger.info(f"上游用量预计超出当日预算（{factor:.1f}倍），任务 {task_name} 本次跳过")
+        return True
+    
+    def execute_task_by_name(self, task_name: str, scheduled_time: Optional[datetime] = None) -> bool:
+        """执行指定名称的任务，scheduled_time为本次执行的计划时刻，cron触发时为空，由任务按cron推算"""
+        try:
+            if self._should_defer(task_name):
+                return True
             logger.info(f"执行任务: {task_name}")
-            result = self.task_manager.execute_task(task_name)
+            result = self.task_manager.execute_task(task_name, scheduled_time)
             
             if result:
                 logger.info(f"任务 {task_name} 执行成功")
             else:
                 logger.error(f"任务 {task_name} 执行失败")
             
+            self._schedule_followup(task_name)
             return result
             
         except Exception as e:
             logger.error(f"执行任务 {task_name} 异常: {e}")
             return False
     
-    def register_task(self, task):
+    def _schedule_followup(self, task_name: str):
+        """任务要求加密轮询时，在下次cron触发前安排一次额外执行"""
+        task = self.task_manager.get_task(task_name)
+        delay = task.get_next_poll_delay() if task and task.enabled else None
+        job = self.scheduler.get_job(task_name)
+        if not delay or job is None or not self.scheduler.running:
+            return
+        
+        timezone = job.trigger.timezone
+        run_date = datetime.now(timezone) + timedelta(seconds=delay)
+        if job.next_run_time and run_date >= job.next_run_time:
+            return
+        
+        self.scheduler.add_job(
+            func=self.execute_task_by_name,
+            trigger=DateTrigger(run_date=run_date, timezone=timezone),
+            args=[task_name, run_date],
+            id=f"{task_name}{FOLLOWUP_JOB_SUFFIX}",
+            name=f"{task_name}{FOLLOWUP_JOB_SUFFIX}",
+            replace_existing=True
+        )
+        logger.debug(f"任务 {task_name} 将在 {delay:.0f} 秒后加密轮询")
+    
+    def register_task(self, task, cron: Optional[str] = None):
         """注册任务"""
-        return self.task_manager.register_task(task)
+        return self.task_manager.register_task(task, cron)
     
     def unregister_task(self, task_name: str):
         """注销任务"""
@@ -144,6 +266,34 @@ class CronTaskScheduler:
                         cron_expr=task_config.cron,
                         func=lambda: self.execute_task_by_name("天气播报")
                     )
+                elif task_key == "weather_multi":
+                    # 多城市天气任务
+                    self.add_cron_job(
+                        task_name="多城市天气",
+                        cron_expr=task_config.cron,
+                        func=lambda: self.execute_task_by_name("多城市天气")
+                    )
+                elif task_key == "nowcast":
+                    # 短时降水提醒任务，cron为无雨时的低频轮询
+                    self.add_cron_job(
+                        task_name="短时降水",
+                        cron_expr=task_config.cron,
+                        func=lambda: self.execute_task_by_name("短时降水")
+                    )
+                elif task_key == "alert":
+                    # 天气预警任务
+                    self.add_cron_job(
+                        task_name="天气预警",
+                        cron_expr=task_config.cron,
+                        func=lambda: self.execute_task_by_name("天气预警")
+                    )
+                elif task_key == "topic_digest":
+                    # 全网热点任务
+                    self.add_cron_job(
+                        task_name="全网热点",
+                        cron_expr=task_config.cron,
+                        func=lambda: self.execute_task_by_name("全网热点")
+                    )
                 elif task_key.startswith("hotsearch"):
                     # 热搜任务
                     if task_key == "hotsearch":
@@ -183,6 +333,14 @@ class CronTaskScheduler:
             
             self.is_running = True
             
+            # 启动发件箱重放，补发上次运行遗留的积压消息
+            if outbox:
+                outbox.start_drainer()
+            
+            # 启动天气历史的后台压缩
+            if weather_history:
+                weather_history.start_compactor()
+            
             # 启动调度器（阻塞运行）
             logger.info("调度器开始运行...")
             self.scheduler.start()
@@ -211,13 +369,21 @@ class CronTaskScheduler:
     def stop_scheduler(self):
         """停止调度器"""
         self.is_running = False
+        if outbox:
+            outbox.stop_drainer()
+        if weather_history:
+            weather_history.stop_compactor()
+        event_loop_thread.stop()
         if self.scheduler.running:
             self.scheduler.shutdown(wait=False)
         logger.info("调度器已停止")
     
     def get_scheduled_jobs(self) -> list:
         """获取所有已调度的任务"""
-        return self.scheduler.get_jobs()
+        return [
+            job for job in self.scheduler.get_jobs()
+            if not job.id.endswith((PREWARM_JOB_SUFFIX, FOLLOWUP_JOB_SUFFIX))
+        ]
     
     def print_jobs(self):
         """打印所有任务信息"""
@@ -242,7 +408,11 @@ class MultiTaskBot:
     
     def _setup_default_tasks(self):
         """根据配置设置任务"""
-        from .tasks import WeatherTask, HotSearchTask
+        from .tasks import (
+            WeatherTask, HotSearchTask, MultiCityWeatherTask, NowcastTask, WeatherAlertTask, TopicDigestTask
+        )
+        from .config import WeatherLocation
+        from .forecast_diff import ForecastDiffer
         
         # 获取启用的任务配置
         enabled_configs = config.get_enabled_task_configs()
@@ -250,14 +420,63 @@ class MultiTaskBot:
         for task_key, task_config in enabled_configs.items():
             if task_key == "weather":
                 # 注册天气任务
-                weather_task = WeatherTask(self.scheduler.dingtalk_bot)
-                self.scheduler.register_task(weather_task)
+                weather_task = WeatherTask(
+                    self.scheduler.dingtalk_bot,
+                    push_mode=config.weather_push_mode,
+                    heartbeat_hours=config.weather_heartbeat_hours,
+                    differ=ForecastDiffer(
+                        temperature_delta=config.weather_diff_temperature,
+                        precipitation_threshold=config.weather_diff_precipitation,
+                        onset_shift_hours=config.weather_diff_onset_shift_hours
+                    )
+                )
+                self.scheduler.register_task(weather_task, task_config.cron)
+                
+            elif task_key == "weather_multi":
+                # 注册多城市天气任务
+                multi_weather_task = MultiCityWeatherTask(
+                    self.scheduler.dingtalk_bot,
+                    config.weather_locations,
+                    mode=config.multi_weather_mode,
+                    max_workers=config.multi_weather_max_workers,
+                    deadline=config.multi_weather_deadline
+                )
+                self.scheduler.register_task(multi_weather_task, task_config.cron)
+                
+            elif task_key == "nowcast":
+                # 注册短时降水提醒任务
+                nowcast_task = NowcastTask(
+                    self.scheduler.dingtalk_bot,
+                    fast_interval=config.nowcast_fast_interval,
+                    lead_minutes=config.nowcast_lead_minutes,
+                    probability_threshold=config.nowcast_probability,
+                    hourly_lookahead=config.nowcast_hourly_lookahead
+                )
+                self.scheduler.register_task(nowcast_task, task_config.cron)
+                
+            elif task_key == "alert":
+                # 注册天气预警任务，未配置多城市位置时只关注默认位置
+                locations = config.weather_locations or [
+                    WeatherLocation(name=config.city_name, longitude=config.longitude, latitude=config.latitude)
+                ]
+                alert_task = WeatherAlertTask(self.scheduler.dingtalk_bot, locations)
+                self.scheduler.register_task(alert_task, task_config.cron)
+                
+            elif task_key == "topic_digest":
+                # 注册全网热点任务
+                topic_digest_task = TopicDigestTask(
+                    self.scheduler.dingtalk_bot,
+                    sources=config.topic_digest_sources,
+                    min_sources=config.topic_digest_min_sources,
+                    limit=config.topic_digest_limit
+                )
+                self.scheduler.register_task(topic_digest_task, task_config.cron)
                 
             elif task_key.startswith("hotsearch"):
                 # 注册热搜任务
                 source = task_config.source
                 hotsearch_task = HotSearchTask(self.scheduler.dingtalk_bot, source_type=source)
-                self.scheduler.register_task(hotsearch_task)
+                self.scheduler.register_task(hotsearch_task, task_config.cron)
     
     def add_hotsearch_task(self, source_type: str):
         """添加热搜任务"""
@@ -265,9 +484,9 @@ class MultiTaskBot:
         hotsearch_task = HotSearchTask(self.scheduler.dingtalk_bot, source_type=source_type)
         return self.scheduler.register_task(hotsearch_task)
     
-    def register_task(self, task):
+    def register_task(self, task, cron: Optional[str] = None):
         """注册新任务"""
-        return self.scheduler.register_task(task)
+        return self.scheduler.register_task(task, cron)
     
     def unregister_task(self, task_name: str):
         """注销任务"""
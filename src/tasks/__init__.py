@@ -2,8 +2,16 @@
 
 from .weather_task import WeatherTask
 from .hotsearch_task import HotSearchTask
+from .multi_weather_task import MultiCityWeatherTask
+from .nowcast_task import NowcastTask
+from .alert_task import WeatherAlertTask
+from .topic_digest_task import TopicDigestTask
 
 __all__ = [
     "WeatherTask",
-    "HotSearchTask"
+    "HotSearchTask",
+    "MultiCityWeatherTask",
+    "NowcastTask",
+    "WeatherAlertTask",
+    "TopicDigestTask"
 ]
@@ -0,0 +1,108 @@
+"""天气预警任务"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+from ..base import TaskBase
+from ..weather import WeatherAPI, WeatherAlert
+from ..alert_index import AlertIndex
+from ..outbound_queue import MessagePriority
+from ..dedup import content_fingerprint
+from ..config import config, WeatherLocation
+
+# 预警等级对应的颜色标识
+ALERT_LEVEL_BADGES = {1: "🔵 蓝色", 2: "🟡 黄色", 3: "🟠 橙色", 4: "🔴 红色"}
+
+class WeatherAlertTask(TaskBase):
+    """天气预警任务
+    
+    按较短间隔轮询各位置生效中的预警，只请求实时接口附带的预警数据；
+    已推送过的预警通过索引过滤，只推送新发布或升级的预警，并以紧急优先级
+    绕过合并窗口直接发送。
+    """
+    
+    priority = MessagePriority.URGENT
+    
+    def __init__(self, dingtalk_bot, locations: List[WeatherLocation], max_workers: int = 4,
+                 alert_index: Optional[AlertIndex] = None):
+        super().__init__("天气预警", dingtalk_bot)
+        self.weather_api = WeatherAPI(config.caiyun_api_key)
+        self.locations = locations
+        if alert_index is None:
+            alert_index = AlertIndex(config.alert_index_path or None, retention_days=config.alert_retention_days)
+        self.alert_index = alert_index
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="alert-fetch")
+        self._pending_ids: List[str] = []  # 本次待推送的预警ID
+    
+    def _fetch_location(self, location: WeatherLocation) -> Optional[List[WeatherAlert]]:
+        """获取单个位置的预警，失败返回None"""
+        try:
+            return self.weather_api.get_alerts(location.longitude, location.latitude)
+        except Exception as e:
+            logger.error(f"获取 {location.name} 天气预警失败: {e}")
+            return None
+    
+    def fetch_data(self) -> Optional[Dict[str, Any]]:
+        """并发获取所有位置的预警"""
+        results = list(self._executor.map(self._fetch_location, self.locations))
+        if all(alerts is None for alerts in results):
+            return None
+        return {
+            "alerts": [
+                (location.name, alerts)
+                for location, alerts in zip(self.locations, results)
+                if alerts
+            ]
+        }
+    
+    def should_send(self, data: Dict[str, Any]) -> bool:
+        """筛出未推送过的预警，没有新预警时不格式化也不发送"""
+        new_alerts: List[Tuple[str, WeatherAlert, bool]] = []
+        for location_name, alerts in data["alerts"]:
+            for alert in alerts:
+                if not self.alert_index.is_seen(alert.alert_id):
+                    new_alerts.append((location_name, alert, self.alert_index.is_upgrade(location_name, alert)))
+        
+        data["new_alerts"] = new_alerts
+        self._pending_ids = sorted(alert.alert_id for _, alert, _ in new_alerts)
+        if new_alerts:
+            logger.info(f"发现 {len(new_alerts)} 条新预警")
+        return bool(new_alerts)
+    
+    def on_delivered(self, data: Dict[str, Any]):
+        """送达后记入已推送索引"""
+        self.alert_index.mark((location_name, alert) for location_name, alert, _ in data["new_alerts"])
+    
+    def get_idempotency_key(self) -> str:
+        """按预警ID生成幂等键，发送失败后再次轮询到同样的预警时不会重复投递"""
+        if self._pending_ids:
+            return f"{self.name}@{content_fingerprint(self._pending_ids)[:16]}"
+        return super().get_idempotency_key()
+    
+    def get_upstream_urls(self) -> List[str]:
+        """彩云天气API和钉钉"""
+        return [self.weather_api.base_url] + super().get_upstream_urls()
+    
+    def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
+        """格式化预警消息"""
+        new_alerts = data["new_alerts"]
+        if len(new_alerts) == 1:
+            title = f"⚠️ {new_alerts[0][1].title}"
+        else:
+            title = f"⚠️ 天气预警（{len(new_alerts)}条）"
+        
+        sections = []
+        for location_name, alert, upgraded in new_alerts:
+            badge = ALERT_LEVEL_BADGES.get(alert.level, "⚠️")
+            section = f"### {badge} {location_name}{'【升级】' if upgraded else ''}\n**{alert.title}**\n\n"
+            meta = [item for item in (
+                alert.source,
+                alert.publish_time.strftime("%m-%d %H:%M") if alert.publish_time else "",
+                alert.status
+            ) if item]
+            if meta:
+                section += f"> {' · '.join(meta)}\n\n"
+            if alert.description:
+                section += f"{alert.description}\n"
+            sections.append(section)
+        
+        return title, "\n---\n\n".join(sections)
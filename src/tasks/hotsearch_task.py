@@ -1,16 +1,29 @@
 """热搜榜单任务"""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from loguru import logger
 from ..base import TaskBase
-from ..hotsearch import HotSearchAPI
+from ..outbound_queue import MessagePriority
+from ..hotsearch_collector import HotSearchCollector, hotsearch_collector
 from ..hotsearch_formatter import HotSearchFormatter
+from ..dedup import content_fingerprint
+from ..rank_tracker import RankTracker, rank_tracker as shared_rank_tracker
 
 class HotSearchTask(TaskBase):
-    """热搜榜单任务"""
+    """热搜榜单任务
     
-    def __init__(self, dingtalk_bot, source_type: str = "weibo"):
+    数据从共享的热搜采集器读取，同时触发的热搜任务共用一次并发采集。
+    消息中标注与上次推送相比的排名变化，送达后记录本次榜单。
+    """
+    
+    priority = MessagePriority.DIGEST
+    
+    def __init__(self, dingtalk_bot, source_type: str = "weibo",
+                 collector: Optional[HotSearchCollector] = None,
+                 rank_tracker: Optional[RankTracker] = None):
         super().__init__(f"热搜榜单-{source_type}", dingtalk_bot)
-        self.hotsearch_api = HotSearchAPI()
+        self.collector = collector or hotsearch_collector
+        self.hotsearch_api = self.collector.api
+        self.rank_tracker = rank_tracker if rank_tracker is not None else shared_rank_tracker
         self.source_type = source_type.lower()
         
         # 验证数据源是否支持
@@ -18,11 +31,12 @@ class HotSearchTask(TaskBase):
         if self.source_type not in available_sources:
             logger.warning(f"数据源 {source_type} 不在支持列表中: {available_sources}，将使用微博作为默认源")
             self.source_type = "weibo"
+        self.collector.register(self.source_type)
     
     def fetch_data(self) -> Optional[Dict[str, Any]]:
         """获取热搜数据"""
         try:
-            hotsearch_data = self.hotsearch_api.get_hot_by_source(self.source_type)
+            hotsearch_data = self.collector.get(self.source_type)
             
             if hotsearch_data:
                 return {"hotsearch": hotsearch_data}
@@ -32,7 +46,23 @@ class HotSearchTask(TaskBase):
             logger.error(f"获取热搜数据失败: {e}")
             return None
     
+    def get_upstream_urls(self) -> List[str]:
+        """热搜数据源和钉钉"""
+        source_url = self.hotsearch_api.api_configs[self.source_type]["url"]
+        return [source_url] + super().get_upstream_urls()
+    
+    def get_content_fingerprint(self, data: Dict[str, Any]) -> Optional[str]:
+        """按榜单条目的排名和标题计算哈希"""
+        hotsearch_data = data["hotsearch"]
+        return content_fingerprint([(item.rank, item.title) for item in hotsearch_data.items])
+    
     def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
-        """格式化热搜消息"""
+        """格式化热搜消息，附带排名变化"""
         hotsearch_data = data["hotsearch"]
-        return HotSearchFormatter.format_markdown_message(hotsearch_data)
+        diff = self.rank_tracker.diff(self.source_type, hotsearch_data.items) if self.rank_tracker else None
+        return HotSearchFormatter.format_markdown_message(hotsearch_data, diff)
+    
+    def on_delivered(self, data: Dict[str, Any]):
+        """送达后记录本次榜单，下次与之比较"""
+        if self.rank_tracker:
+            self.rank_tracker.update(self.source_type, data["hotsearch"].items)
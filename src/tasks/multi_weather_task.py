@@ -0,0 +1,100 @@
+"""多城市天气播报任务"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+from ..base import TaskBase
+from ..weather import WeatherAPI, WeatherData
+from ..formatter import WeatherFormatter
+from ..config import config, WeatherLocation
+from ..dedup import content_fingerprint
+from ..weather_history import weather_history
+from ..weather_providers import fallback_provider, weather_hedger
+
+class MultiCityWeatherTask(TaskBase):
+    """多城市天气播报任务
+    
+    各城市并发获取，单次运行有总时限；个别城市失败或超时只影响该城市，
+    消息可以是一张对比表（table），也可以每城一条（per_city）。
+    """
+    
+    def __init__(self, dingtalk_bot, locations: List[WeatherLocation], mode: str = "table",
+                 max_workers: int = 8, deadline: float = 30.0):
+        super().__init__("多城市天气", dingtalk_bot)
+        self.weather_api = WeatherAPI(
+            config.caiyun_api_key, fetch_mode=config.caiyun_fetch_mode,
+            fallback=fallback_provider, hedger=weather_hedger
+        )
+        self.weather_formatter = WeatherFormatter()
+        self.locations = locations
+        self.mode = mode
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="weather-fetch")
+    
+    def _fetch_location(self, location: WeatherLocation) -> Optional[WeatherData]:
+        """获取单个城市的天气"""
+        return self.weather_api.get_weather(location.longitude, location.latitude, include_rain_forecast=False)
+    
+    def fetch_data(self) -> Optional[Dict[str, Any]]:
+        """并发获取所有城市的天气，超过时限的城市记为失败"""
+        start = time.monotonic()
+        futures = {self._executor.submit(self._fetch_location, location): location for location in self.locations}
+        done, not_done = wait(futures, timeout=self.deadline)
+        for future in not_done:
+            future.cancel()
+        
+        results: List[Tuple[str, Optional[WeatherData]]] = []
+        for future, location in futures.items():
+            weather_data = None
+            if future in done:
+                try:
+                    weather_data = future.result()
+                except Exception as e:
+                    logger.error(f"获取 {location.name} 天气失败: {e}")
+            else:
+                logger.warning(f"获取 {location.name} 天气超时（{self.deadline:.0f}秒）")
+            if weather_data and weather_history:
+                weather_history.record(location.name, weather_data)
+            results.append((location.name, weather_data))
+        
+        success_count = sum(1 for _, weather_data in results if weather_data)
+        logger.info(
+            f"多城市天气获取完成: {success_count}/{len(results)} 成功，"
+            f"耗时 {time.monotonic() - start:.2f}秒"
+        )
+        if not success_count:
+            return None
+        return {"results": results}
+    
+    def get_upstream_urls(self) -> List[str]:
+        """天气数据源和钉钉"""
+        return self.weather_api.get_upstream_urls() + super().get_upstream_urls()
+    
+    def get_content_fingerprint(self, data: Dict[str, Any]) -> Optional[str]:
+        """按各城市的实时天气计算哈希"""
+        return content_fingerprint([
+            (city_name, weather_data.model_dump(exclude={"hourly_forecast", "daily_forecast", "alerts"})
+             if weather_data else None)
+            for city_name, weather_data in data["results"]
+        ])
+    
+    def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
+        """格式化为多城市对比表"""
+        return WeatherFormatter.format_comparison_table(data["results"])
+    
+    def format_messages(self, data: Dict[str, Any]) -> List[tuple[str, str]]:
+        """按配置生成一张对比表或每城一条消息"""
+        if self.mode != "per_city":
+            return [self.format_message(data)]
+        messages = [
+            self.weather_formatter.format_markdown_message(
+                weather_data, city_name,
+                weather_history.get_summary(city_name) if weather_history else None
+            )
+            for city_name, weather_data in data["results"]
+            if weather_data
+        ]
+        failed = [city_name for city_name, weather_data in data["results"] if weather_data is None]
+        if failed:
+            messages.append(WeatherFormatter.format_fetch_failures(failed))
+        return messages
@@ -0,0 +1,132 @@
+"""短时降水提醒任务"""
+from typing import Optional, Dict, Any, List
+from loguru import logger
+from ..base import TaskBase
+from ..weather import WeatherAPI, MinutelyNowcast
+from ..forecast_series import scan_thresholds, ThresholdScan
+from ..outbound_queue import MessagePriority
+from ..config import config
+
+# 分钟级雷达降水强度分级（mm/h），低于第一档视为无雨
+NOWCAST_LEVEL_BOUNDS = (0.08, 3.44, 11.33, 51.30)
+NOWCAST_LEVEL_NAMES = ("无雨", "小雨", "中雨", "大雨", "暴雨")
+NOWCAST_LEVEL_CHARS = "·░▒▓█"
+
+class NowcastTask(TaskBase):
+    """短时降水提醒任务
+    
+    基于彩云分钟级降水预报：分钟数据或小时预报显示可能降水时加密轮询，
+    无雨时只按cron低频轮询；只在开始下雨、雨停和雨势增强时推送提醒。
+    """
+    
+    priority = MessagePriority.URGENT
+    
+    def __init__(self, dingtalk_bot, fast_interval: float = 120.0, lead_minutes: int = 30,
+                 probability_threshold: float = 0.3, hourly_lookahead: int = 3):
+        super().__init__("短时降水", dingtalk_bot)
+        self.weather_api = WeatherAPI(config.caiyun_api_key, fetch_mode=config.caiyun_fetch_mode)
+        self.longitude = config.longitude
+        self.latitude = config.latitude
+        self.city_name = config.city_name
+        self.fast_interval = fast_interval
+        self.lead_minutes = lead_minutes
+        self.probability_threshold = probability_threshold
+        self.hourly_lookahead = hourly_lookahead
+        
+        self.level = 0  # 上次提醒后的降水等级，0为无雨
+        self.rain_plausible = False  # 是否需要加密轮询
+    
+    def fetch_data(self) -> Optional[Dict[str, Any]]:
+        """获取分钟级降水预报并单遍扫描各强度阈值"""
+        nowcast = self.weather_api.get_minutely_nowcast(self.longitude, self.latitude)
+        if not nowcast or not nowcast.precipitation:
+            logger.warning("未获取到分钟级降水数据")
+            return None
+        
+        scan = scan_thresholds(nowcast.precipitation, NOWCAST_LEVEL_BOUNDS)
+        # 提醒窗口内会达到的最高等级
+        level = sum(1 for index in scan.crossings if index is not None and index < self.lead_minutes)
+        self.rain_plausible = self._is_rain_plausible(nowcast, scan)
+        logger.info(
+            f"分钟级降水: 窗口内等级 {NOWCAST_LEVEL_NAMES[level]}，"
+            f"2小时峰值 {NOWCAST_LEVEL_NAMES[scan.peak_level]}，"
+            f"{'加密轮询' if self.rain_plausible else '低频轮询'}"
+        )
+        return {"nowcast": nowcast, "scan": scan, "level": level}
+    
+    def _is_rain_plausible(self, nowcast: MinutelyNowcast, scan: ThresholdScan) -> bool:
+        """雷达显示2小时内有雨、降水概率较高或小时预报近期有雨时需要加密轮询"""
+        if scan.peak_level > 0 or self.level > 0:
+            return True
+        if nowcast.probability and max(nowcast.probability) >= self.probability_threshold:
+            return True
+        # 按天气播报任务相同的小时数请求，缓存键一致，天气播报的缓存有效期内不再请求彩云
+        weather_data = self.weather_api.get_weather(self.longitude, self.latitude, include_rain_forecast=True)
+        if weather_data and weather_data.hourly_forecast:
+            first_rain = weather_data.hourly_forecast.first_rain_index
+            return first_rain is not None and first_rain < self.hourly_lookahead
+        return False
+    
+    def should_send(self, data: Dict[str, Any]) -> bool:
+        """只在降水状态变化时推送：开始下雨、雨停、雨势增强"""
+        previous, level = self.level, data["level"]
+        scan: ThresholdScan = data["scan"]
+        
+        event = None
+        if previous == 0 and level > 0:
+            start = scan.crossings[0]
+            event = "正在下雨" if start == 0 else f"约{start}分钟后开始下雨"
+        elif level > previous > 0:
+            start = scan.crossings[level - 1]
+            event = f"雨势增强为{NOWCAST_LEVEL_NAMES[level]}" if start == 0 else f"约{start}分钟后转为{NOWCAST_LEVEL_NAMES[level]}"
+        elif previous > 0 and level == 0:
+            event = "降水已停止"
+        
+        data["event"] = event
+        if event is None:
+            # 没有需要推送的变化（如雨势减弱）时直接更新状态
+            self.level = level
+        return event is not None
+    
+    def on_delivered(self, data: Dict[str, Any]):
+        """提醒送达后才更新降水状态，发送失败时下次轮询仍会提醒"""
+        self.level = data["level"]
+    
+    def get_next_poll_delay(self) -> Optional[float]:
+        """可能降水时按短间隔轮询"""
+        return self.fast_interval if self.rain_plausible else None
+    
+    def get_upstream_urls(self) -> List[str]:
+        """彩云天气API和钉钉"""
+        return [self.weather_api.base_url] + super().get_upstream_urls()
+    
+    def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
+        """格式化降水提醒"""
+        nowcast: MinutelyNowcast = data["nowcast"]
+        scan: ThresholdScan = data["scan"]
+        
+        title = f"🌧️ {self.city_name}短时降水提醒"
+        content = f"## 🌧️ {self.city_name}：{data['event']}\n\n"
+        if nowcast.description:
+            content += f"> {nowcast.description}\n\n"
+        
+        if scan.peak_level > 0:
+            peak_time = "当前" if scan.peak_index == 0 else f"约{scan.peak_index}分钟后"
+            content += f"- **2小时内最强：** {NOWCAST_LEVEL_NAMES[scan.peak_level]}（{peak_time}）\n"
+            if scan.end_index is not None:
+                content += f"- **预计雨停：** 约{scan.end_index}分钟后\n"
+        if nowcast.probability:
+            probabilities = " / ".join(f"{probability * 100:.0f}%" for probability in nowcast.probability)
+            content += f"- **每半小时降水概率：** {probabilities}\n"
+        
+        content += f"\n```\n{self._format_strip(nowcast.precipitation)}\n```\n"
+        return title, content
+    
+    @staticmethod
+    def _format_strip(precipitation: List[float], step: int = 10) -> str:
+        """按step分钟取最大值，绘制未来2小时降水强度条"""
+        strip = ""
+        for start in range(0, len(precipitation), step):
+            level = scan_thresholds(precipitation[start:start + step], NOWCAST_LEVEL_BOUNDS).peak_level
+            strip += NOWCAST_LEVEL_CHARS[level]
+        return f"现在 {strip} {len(precipitation) // 60}小时后"
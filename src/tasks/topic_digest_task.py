@@ -0,0 +1,68 @@
+"""全网热点任务"""
+from typing import Optional, Dict, Any, List
+from loguru import logger
+from ..base import TaskBase
+from ..outbound_queue import MessagePriority
+from ..hotsearch_collector import HotSearchCollector, hotsearch_collector
+from ..hotsearch_formatter import HotSearchFormatter
+from ..topic_cluster import TopicClusterer, topic_clusterer
+from ..dedup import content_fingerprint
+
+class TopicDigestTask(TaskBase):
+    """全网热点任务
+    
+    同一件事常以略有不同的标题同时出现在多个热搜榜上，本任务把各数据源的
+    条目聚成话题，只推送出现在多个平台的话题并列出所在平台，代替逐个榜单推送。
+    数据来自共享的热搜采集器，与各热搜任务共用采集结果。
+    """
+    
+    priority = MessagePriority.DIGEST
+    
+    def __init__(self, dingtalk_bot, sources: Optional[List[str]] = None, min_sources: int = 2,
+                 limit: int = 15, collector: Optional[HotSearchCollector] = None,
+                 clusterer: Optional[TopicClusterer] = None):
+        super().__init__("全网热点", dingtalk_bot)
+        self.collector = collector or hotsearch_collector
+        self.clusterer = clusterer or topic_clusterer
+        self.min_sources = min_sources
+        self.limit = limit
+        
+        available_sources = self.collector.api.get_available_sources()
+        self.sources = [source.lower() for source in sources or available_sources]
+        unknown = [source for source in self.sources if source not in available_sources]
+        if unknown:
+            logger.warning(f"全网热点忽略不支持的数据源: {unknown}")
+            self.sources = [source for source in self.sources if source in available_sources]
+        for source in self.sources:
+            self.collector.register(source)
+    
+    def fetch_data(self) -> Optional[Dict[str, Any]]:
+        """获取各数据源的热搜并聚类"""
+        snapshots = self.collector.get_many(self.sources)
+        if not snapshots:
+            return None
+        
+        topics = self.clusterer.cluster(snapshots)
+        topics = [topic for topic in topics if len(topic.ranks) >= self.min_sources][:self.limit]
+        logger.info(f"全网热点：{len(snapshots)} 个数据源，{len(topics)} 个跨平台话题")
+        return {
+            "topics": topics,
+            "sources": [data.source for data in snapshots.values()],
+        }
+    
+    def should_send(self, data: Dict[str, Any]) -> bool:
+        """没有跨平台话题时不推送"""
+        return bool(data["topics"])
+    
+    def get_upstream_urls(self) -> List[str]:
+        """各热搜数据源和钉钉"""
+        api_configs = self.collector.api.api_configs
+        return [api_configs[source]["url"] for source in self.sources] + super().get_upstream_urls()
+    
+    def get_content_fingerprint(self, data: Dict[str, Any]) -> Optional[str]:
+        """按话题标题和所在平台计算哈希"""
+        return content_fingerprint([(topic.title, topic.sources) for topic in data["topics"]])
+    
+    def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
+        """格式化全网热点消息"""
+        return HotSearchFormatter.format_topic_digest(data["topics"], data["sources"])
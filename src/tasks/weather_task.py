@@ -1,19 +1,37 @@
 """天气播报任务"""
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List
 from loguru import logger
 from ..base import TaskBase
 from ..weather import WeatherAPI
 from ..formatter import WeatherFormatter
 from ..config import config
+from ..dedup import content_fingerprint
+from ..weather_history import weather_history
+from ..weather_providers import fallback_provider, weather_hedger
+from ..forecast_diff import ForecastDiffer, ForecastSnapshot
 
 class WeatherTask(TaskBase):
-    """天气播报任务"""
+    """天气播报任务
     
-    def __init__(self, dingtalk_bot, include_rain_chart: bool = True):
+    push_mode为diff时与上次送达的天气快照比较，只在有实质变化时推送并附上
+    变化说明；无变化时按心跳间隔推送。
+    """
+    
+    def __init__(self, dingtalk_bot, include_rain_chart: bool = True, push_mode: str = "full",
+                 heartbeat_hours: float = 6.0, differ: Optional[ForecastDiffer] = None):
         super().__init__("天气播报", dingtalk_bot)
-        self.weather_api = WeatherAPI(config.caiyun_api_key)
+        self.weather_api = WeatherAPI(
+            config.caiyun_api_key, fetch_mode=config.caiyun_fetch_mode,
+            fallback=fallback_provider, hedger=weather_hedger
+        )
         self.weather_formatter = WeatherFormatter()
         self.include_rain_chart = include_rain_chart
+        self.push_mode = push_mode
+        self.heartbeat = heartbeat_hours * 3600
+        self.differ = differ if differ is not None else ForecastDiffer()
+        self._last_snapshot: Optional[ForecastSnapshot] = None  # 上次送达的天气快照
+        self._last_pushed_at: Optional[float] = None
     
     def fetch_data(self) -> Optional[Dict[str, Any]]:
         """获取天气数据"""
@@ -25,23 +43,73 @@ class WeatherTask(TaskBase):
                 include_rain_forecast=self.include_rain_chart
             )
             if weather_data:
+                if weather_history:
+                    weather_history.record(config.city_name, weather_data)
                 return {
                     "weather": weather_data,
-                    "city_name": config.city_name
+                    "city_name": config.city_name,
+                    "history": weather_history.get_summary(config.city_name) if weather_history else None
                 }
             return None
         except Exception as e:
             logger.error(f"获取天气数据失败: {e}")
             return None
     
+    def should_send(self, data: Dict[str, Any]) -> bool:
+        """diff模式下只在天气有实质变化或心跳到期时推送"""
+        if self.push_mode != "diff":
+            return True
+        
+        snapshot = self.differ.snapshot(data["weather"])
+        data["snapshot"] = snapshot
+        if self._last_snapshot is None:
+            return True
+        
+        data["changes"] = self.differ.diff(self._last_snapshot, snapshot)
+        if data["changes"]:
+            logger.info(f"天气有{len(data['changes'])}项变化，推送播报")
+            return True
+        if time.monotonic() - self._last_pushed_at >= self.heartbeat:
+            logger.info("天气无实质变化，心跳到期推送")
+            return True
+        logger.info("天气无实质变化，跳过推送")
+        return False
+    
+    def on_delivered(self, data: Dict[str, Any]):
+        """记录送达的天气快照，作为下次比较的基准"""
+        if "snapshot" in data:
+            self._last_snapshot = data["snapshot"]
+            self._last_pushed_at = time.monotonic()
+    
+    def get_upstream_urls(self) -> List[str]:
+        """天气数据源和钉钉"""
+        return self.weather_api.get_upstream_urls() + super().get_upstream_urls()
+    
+    def get_content_fingerprint(self, data: Dict[str, Any]) -> Optional[str]:
+        """按天气字段计算哈希，忽略随执行时间变化的预报时刻"""
+        weather_data = data["weather"]
+        return content_fingerprint({
+            "city": data["city_name"],
+            "current": weather_data.model_dump(exclude={"hourly_forecast", "daily_forecast", "alerts"}),
+            "hourly": weather_data.hourly_forecast.columns()
+        })
+    
     def format_message(self, data: Dict[str, Any]) -> tuple[str, str]:
         """格式化天气消息"""
         weather_data = data["weather"]
         city_name = data["city_name"]
         
         if self.include_rain_chart:
-            return self.weather_formatter.format_message_with_rain_chart(
-                weather_data, city_name, include_image=True
+            title, content = self.weather_formatter.format_message_with_rain_chart(
+                weather_data, city_name, include_image=True, history=data.get("history")
             )
         else:
-            return self.weather_formatter.format_markdown_message(weather_data, city_name)
+            title, content = self.weather_formatter.format_markdown_message(weather_data, city_name, data.get("history"))
+        
+        # 有变化时把变化说明放在实况标题下方
+        if data.get("changes"):
+            title = f"🔔 {city_name}天气变化"
+            header, separator, body = content.partition("\n---\n\n")
+            changes = ForecastDiffer.format_changes(data["changes"])
+            content = header + separator + changes + body if separator else changes + content
+        return title, content
@@ -0,0 +1,169 @@
+"""跨数据源热点话题聚类模块"""
+import random
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from .hotsearch import HotSearchData, HotSearchItem
+from .rank_tracker import normalize_title
+from .config import config
+
+# MinHash使用的梅森素数和哈希值上限
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# 选择LSH分段时，相似度恰为阈值的两个标题至少以该概率成为候选
+_TARGET_RECALL = 0.9
+
+class HotTopic(BaseModel):
+    """跨数据源聚合后的热点话题"""
+    title: str  # 代表标题，取排名最靠前的条目
+    url: Optional[str] = None  # 代表条目的链接
+    ranks: Dict[str, int]  # 数据源名称 -> 该话题在此数据源的最高排名
+    
+    @property
+    def sources(self) -> List[str]:
+        """话题出现的数据源，按排名排序"""
+        return sorted(self.ranks, key=self.ranks.get)
+    
+    @property
+    def score(self) -> float:
+        """热度分：各数据源排名倒数之和"""
+        return sum(1.0 / rank for rank in self.ranks.values())
+
+def shingle(title: str, size: int = 2) -> Set[str]:
+    """标题归一化后切成字符k-gram，中文没有分词也能比较；短于k的标题整体作为一个片段"""
+    text = normalize_title(title) or title.strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """两个片段集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """选择LSH的(分段数, 每段行数)
+    
+    每段行数越多，不相似的标题越少成为候选；在相似度为阈值的标题仍能以
+    _TARGET_RECALL的概率成为候选的前提下取最多的行数。
+    """
+    for rows in range(num_perm, 0, -1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= _TARGET_RECALL:
+            return bands, rows
+    return num_perm, 1
+
+class MinHasher:
+    """MinHash签名：每个排列为一个(a·x + b) mod p的通用哈希，签名取各排列下片段哈希的最小值
+    
+    片段在各排列下的哈希值按片段缓存，常见的二元组在不同标题、不同批次间
+    只计算一次，签名只需对缓存的行逐列取最小值。
+    """
+    
+    def __init__(self, num_perm: int = 64, seed: int = 1, max_cached: int = 100000):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.max_cached = max_cached
+        self._perms = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+                       for _ in range(num_perm)]
+        self._rows: Dict[str, Tuple[int, ...]] = {}  # 片段 -> 各排列下的哈希值
+    
+    def _row(self, piece: str) -> Tuple[int, ...]:
+        """片段在各排列下的哈希值"""
+        row = self._rows.get(piece)
+        if row is None:
+            h = zlib.crc32(piece.encode("utf-8"))
+            row = tuple(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self._perms)
+            if len(self._rows) >= self.max_cached:
+                self._rows.clear()
+            self._rows[piece] = row
+        return row
+    
+    def signature(self, shingles: Set[str]) -> Tuple[int, ...]:
+        """片段集合的MinHash签名"""
+        return tuple(map(min, zip(*(self._row(piece) for piece in shingles))))
+
+class _UnionFind:
+    """并查集，合并相似的条目"""
+    
+    def __init__(self, size: int):
+        self._parent = list(range(size))
+    
+    def find(self, x: int) -> int:
+        """查找根节点并压缩路径"""
+        root = x
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[x] != root:
+            self._parent[x], x = root, self._parent[x]
+        return root
+    
+    def union(self, a: int, b: int):
+        """合并两个集合"""
+        self._parent[self.find(a)] = self.find(b)
+
+class TopicClusterer:
+    """把各数据源中说的是同一件事的热搜条目聚成话题
+    
+    标题切成字符2-gram后计算MinHash签名，签名分段后按段分桶（LSH），只有
+    至少一段完全相同的条目才成为候选，再用片段集合的Jaccard相似度确认。
+    候选数量随条目数近似线性增长，不需要两两比较所有标题；同一归一化标题
+    只计算一次签名。
+    """
+    
+    def __init__(self, threshold: float = 0.4, num_perm: int = 64, shingle_size: int = 2):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+    
+    def cluster(self, snapshots: Dict[str, HotSearchData]) -> List[HotTopic]:
+        """聚类所有数据源的条目，按覆盖的数据源数和热度分排序"""
+        entries: List[Tuple[str, HotSearchItem]] = [
+            (data.source, item) for data in snapshots.values() for item in data.items
+        ]
+        
+        # 相同归一化标题共用片段和签名
+        key_of = [normalize_title(item.title) or item.title.strip() for _, item in entries]
+        keys = list(dict.fromkeys(key_of))
+        key_index = {key: i for i, key in enumerate(keys)}
+        shingles = [shingle(key, self.shingle_size) for key in keys]
+        signatures = [self.hasher.signature(pieces) for pieces in shingles]
+        
+        # LSH分桶，同桶的标题成为候选，Jaccard达到阈值的合并
+        union = _UnionFind(len(keys))
+        checked: Set[Tuple[int, int]] = set()
+        for band in range(self.bands):
+            start = band * self.rows
+            buckets: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+            for i, signature in enumerate(signatures):
+                buckets[signature[start:start + self.rows]].append(i)
+            for members in buckets.values():
+                for position, i in enumerate(members):
+                    for j in members[position + 1:]:
+                        if (i, j) in checked or union.find(i) == union.find(j):
+                            continue
+                        checked.add((i, j))
+                        if jaccard(shingles[i], shingles[j]) >= self.threshold:
+                            union.union(i, j)
+        
+        groups: Dict[int, List[Tuple[str, HotSearchItem]]] = defaultdict(list)
+        for (source, item), key in zip(entries, key_of):
+            groups[union.find(key_index[key])].append((source, item))
+        
+        topics = []
+        for members in groups.values():
+            ranks: Dict[str, int] = {}
+            for source, item in members:
+                ranks[source] = min(ranks.get(source, item.rank), item.rank)
+            _, lead = min(members, key=lambda member: member[1].rank)
+            topics.append(HotTopic(title=lead.title, url=lead.url, ranks=ranks))
+        topics.sort(key=lambda topic: (-len(topic.ranks), -topic.score))
+        return topics
+
+# 全局话题聚类器
+topic_clusterer = TopicClusterer(threshold=config.topic_digest_similarity)
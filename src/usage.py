@@ -0,0 +1,172 @@
+"""上游调用用量统计模块"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from .config import config
+
+# 超出预算时任务间隔和缓存有效期的最大拉伸倍数
+MAX_STRETCH = 12.0
+# 估算当日用量时至少按1小时计算已过时长，避免凌晨少量调用被放大
+MIN_ELAPSED = 3600.0
+
+def mask_key(api_key: Optional[str]) -> str:
+    """API密钥脱敏，只保留前4位"""
+    if not api_key:
+        return "-"
+    return f"{api_key[:4]}***"
+
+class UsageTracker:
+    """按上游主机和API密钥统计当日调用次数、失败次数、接收字节数和耗时
+    
+    按当日已过时长线性外推全天用量，超出每日预算时给出拉伸倍数，
+    调度器据此拉长非关键任务的执行间隔，天气缓存据此延长有效期。
+    统计按天写入SQLite，重启后以及task_manager.py status都能读到当天的用量。
+    """
+    
+    def __init__(self, path: Optional[str] = None, budgets: Optional[Dict[str, float]] = None,
+                 retention_days: int = 30):
+        self.path = path
+        self.budgets = {host.lower(): budget for host, budget in (budgets or {}).items()}
+        self.retention_days = retention_days
+        
+        self._date = datetime.now().strftime("%Y-%m-%d")
+        self._usage: Dict[Tuple[str, str], List[float]] = {}  # (主机, 密钥) -> [调用, 失败, 字节, 总耗时, 最大耗时]
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """打开数据库，清理过期统计并载入当天的用量"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upstream_usage (
+                    date TEXT NOT NULL,
+                    host TEXT NOT NULL,
+                    api_key TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    errors INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    latency REAL NOT NULL,
+                    max_latency REAL NOT NULL,
+                    PRIMARY KEY (date, host, api_key)
+                )
+            """)
+            conn.execute(
+                "DELETE FROM upstream_usage WHERE date < date('now', 'localtime', ?)",
+                (f"-{self.retention_days} days",)
+            )
+            self._conn = conn
+            self._reload()
+        except sqlite3.Error as e:
+            logger.warning(f"打开用量数据库失败，只在内存中统计: {e}")
+    
+    def _reload(self):
+        """从数据库读取当天的用量，调用方需持有锁或处于初始化阶段"""
+        rows = self._conn.execute(
+            "SELECT host, api_key, calls, errors, bytes, latency, max_latency FROM upstream_usage WHERE date = ?",
+            (self._date,)
+        ).fetchall()
+        self._usage = {(host, api_key): list(values) for host, api_key, *values in rows}
+    
+    def _roll_date(self):
+        """跨天后清零当天的统计，调用方需持有锁"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self._date:
+            self._date = today
+            self._usage = {}
+    
+    def record(self, host: str, api_key: Optional[str], success: bool, nbytes: int, latency: float):
+        """记录一次上游调用"""
+        key = (host.lower(), mask_key(api_key))
+        with self._lock:
+            self._roll_date()
+            usage = self._usage.setdefault(key, [0, 0, 0, 0.0, 0.0])
+            usage[0] += 1
+            usage[1] += 0 if success else 1
+            usage[2] += nbytes
+            usage[3] += latency
+            usage[4] = max(usage[4], latency)
+            if not self._conn:
+                return
+            try:
+                self._conn.execute("""
+                    INSERT INTO upstream_usage (date, host, api_key, calls, errors, bytes, latency, max_latency)
+                    VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT (date, host, api_key) DO UPDATE SET
+                        calls = calls + 1,
+                        errors = errors + excluded.errors,
+                        bytes = bytes + excluded.bytes,
+                        latency = latency + excluded.latency,
+                        max_latency = MAX(max_latency, excluded.max_latency)
+                """, (self._date, *key, 0 if success else 1, nbytes, latency, latency))
+            except sqlite3.Error as e:
+                logger.warning(f"写入用量统计失败: {e}")
+    
+    def get_calls(self, host: str) -> int:
+        """主机当天的调用次数（所有密钥合计）"""
+        host = host.lower()
+        with self._lock:
+            self._roll_date()
+            return int(sum(usage[0] for (usage_host, _), usage in self._usage.items() if usage_host == host))
+    
+    def get_projected(self, host: str) -> float:
+        """按当天已过时长外推的全天调用次数"""
+        now = datetime.now()
+        elapsed = now.hour * 3600 + now.minute * 60 + now.second
+        return self.get_calls(host) / max(elapsed, MIN_ELAPSED) * 86400
+    
+    def get_stretch_factor(self, hosts: Iterable[str]) -> float:
+        """预计超出预算时返回大于1的拉伸倍数，未超出或未设预算时为1"""
+        factor = 1.0
+        for host in hosts:
+            budget = self.budgets.get(host.lower())
+            if not budget:
+                continue
+            if self.get_calls(host) >= budget:
+                return MAX_STRETCH
+            factor = max(factor, min(self.get_projected(host) / budget, MAX_STRETCH))
+        return factor
+    
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """当天各上游和密钥的用量"""
+        with self._lock:
+            self._roll_date()
+            if self._conn:
+                # 其他进程（如运行中的机器人）也会写入，查询时以数据库为准
+                try:
+                    self._reload()
+                except sqlite3.Error as e:
+                    logger.warning(f"读取用量统计失败: {e}")
+            items = sorted(self._usage.items())
+        stats = []
+        for (host, api_key), (calls, errors, nbytes, latency, max_latency) in items:
+            stats.append({
+                "host": host,
+                "api_key": api_key,
+                "calls": int(calls),
+                "errors": int(errors),
+                "bytes": int(nbytes),
+                "avg_latency": latency / calls if calls else 0.0,
+                "max_latency": max_latency,
+                "budget": self.budgets.get(host),
+            })
+        for item in stats:
+            if item["budget"]:
+                item["projected"] = self.get_projected(item["host"])
+        return stats
+
+# 全局用量统计，未启用时为None
+usage_tracker = UsageTracker(
+    config.usage_path or None,
+    budgets=config.usage_budgets
+) if config.usage_enabled else None
@@ -1,9 +1,17 @@
 """彩玉天气API调用模块"""
+import time
 import requests
+from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 from loguru import logger
+from .http_client import HttpTransport, transport as shared_transport
+from .weather_cache import WeatherCache, weather_cache
+from .forecast_series import ForecastSeries
+from .hedging import Hedger
+from .usage import usage_tracker
 
 class HourlyWeatherData(BaseModel):
     """小时级天气数据模型"""
@@ -15,6 +23,41 @@ class HourlyWeatherData(BaseModel):
     wind_direction: float  # 风向
     precipitation: float = 0.0  # 降水量
 
+class DailyWeatherData(BaseModel):
+    """天级天气数据模型"""
+    date: str  # 日期（YYYY-MM-DD）
+    temperature_max: float  # 最高温度
+    temperature_min: float  # 最低温度
+    weather_desc: str  # 天气描述
+    precipitation: float = 0.0  # 平均降水量
+
+class WeatherAlert(BaseModel):
+    """天气预警模型"""
+    alert_id: str  # 预警ID
+    title: str  # 预警标题
+    description: str = ""  # 预警内容
+    code: str = ""  # 预警类型和等级编码
+    status: str = ""  # 预警状态
+    source: str = ""  # 发布单位
+    publish_time: Optional[datetime] = None  # 发布时间
+    
+    @property
+    def alert_type(self) -> str:
+        """预警类型编码（code前两位，如09为暴雨）"""
+        return self.code[:2]
+    
+    @property
+    def level(self) -> int:
+        """预警等级：1蓝色 2黄色 3橙色 4红色，未知为0"""
+        level = self.code[2:4]
+        return int(level) if level.isdigit() else 0
+
+class MinutelyNowcast(BaseModel):
+    """分钟级降水预报模型"""
+    precipitation: List[float] = []  # 未来120分钟逐分钟降水强度（mm/h）
+    probability: List[float] = []  # 未来2小时每半小时的降水概率
+    description: str = ""  # 彩云给出的降水描述
+
 class WeatherData(BaseModel):
     """天气数据模型"""
     temperature: float  # 温度
@@ -28,75 +71,225 @@ class WeatherData(BaseModel):
     pm25: Optional[float] = None  # PM2.5
     pm10: Optional[float] = None  # PM10
     precipitation: float = 0.0  # 当前降水量
-    hourly_forecast: List[HourlyWeatherData] = []  # 未来2小时预报
+    hourly_forecast: ForecastSeries = Field(default_factory=ForecastSeries)  # 未来几小时预报（列式存储）
+    daily_forecast: List[DailyWeatherData] = []  # 未来几天预报
+    alerts: List[WeatherAlert] = []  # 生效中的预警
+    source: str = "彩云天气"  # 数据来源
+    
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    @field_validator("hourly_forecast", mode="before")
+    @classmethod
+    def _to_series(cls, value):
+        """兼容传入HourlyWeatherData列表"""
+        if isinstance(value, ForecastSeries):
+            return value
+        return ForecastSeries.from_points(value)
+
+class WeatherProvider(ABC):
+    """天气数据源，各数据源的响应都映射为WeatherData"""
+    
+    name: str = ""  # 数据源名称
+    base_url: str = ""  # 接口地址，用于预热连接
+    
+    @abstractmethod
+    def fetch_weather(self, longitude: float, latitude: float, hours: int) -> Optional[WeatherData]:
+        """获取实时天气和未来指定小时数的预报，失败返回None"""
 
-class WeatherAPI:
-    """彩玉天气API客户端"""
+class WeatherAPI(WeatherProvider):
+    """彩玉天气API客户端
+    
+    composite模式通过/weather综合接口一次取回实时、小时、天级和预警数据，
+    失败时回退到分别请求/realtime和/hourly的split模式。配置了备用数据源时，
+    彩云超过对冲延迟仍未返回就同时请求备用数据源，先返回者胜出。
+    """
     
-    def __init__(self, api_key: str):
+    name = "彩云天气"
+    
+    def __init__(self, api_key: str, transport: Optional[HttpTransport] = None,
+                 fetch_mode: str = "composite", daily_steps: int = 3,
+                 cache: Optional[WeatherCache] = None, base_url: Optional[str] = None,
+                 fallback: Optional[WeatherProvider] = None, hedger: Optional[Hedger] = None):
         self.api_key = api_key
-        self.base_url = "https://api.caiyunapp.com/v2.6"
+        self.base_url = base_url or "https://api.caiyunapp.com/v2.6"
+        self.transport = transport or shared_transport
+        self.cache = cache if cache is not None else weather_cache
+        self.fetch_mode = fetch_mode
+        self.daily_steps = daily_steps
+        self.fallback = fallback
+        self.hedger = (hedger or Hedger()) if fallback else None
+    
+    def get_upstream_urls(self) -> List[str]:
+        """彩云和备用数据源的接口地址"""
+        urls = [self.base_url]
+        if self.fallback:
+            urls.append(self.fallback.base_url)
+        return urls
     
     def get_weather(self, longitude: float, latitude: float, include_rain_forecast: bool = True) -> Optional[WeatherData]:
         """获取天气数据（包含实时数据和小时预报）"""
+        # 降雨图需要更多小时数据
+        hours = 24 if include_rain_forecast else 2
+        if not self.fallback:
+            return self.fetch_weather(longitude, latitude, hours)
+        
+        weather_data, winner = self.hedger.call(
+            lambda: self.fetch_weather(longitude, latitude, hours),
+            lambda: self.fallback.fetch_weather(longitude, latitude, hours)
+        )
+        if winner == "secondary":
+            logger.info(f"本次天气数据来自备用数据源{self.fallback.name}")
+        return weather_data
+    
+    def fetch_weather(self, longitude: float, latitude: float, hours: int) -> Optional[WeatherData]:
+        """从彩云获取天气数据"""
         try:
-            # 获取实时天气数据
-            realtime_data = self._get_realtime_weather(longitude, latitude)
-            if not realtime_data:
-                return None
-            
-            # 获取小时级预报数据（降雨图需要更多小时数据）
-            hours = 24 if include_rain_forecast else 2
-            hourly_forecast = self._get_hourly_forecast(longitude, latitude, hours=hours)
-            
-            # 合并数据
-            realtime_data.hourly_forecast = hourly_forecast
+            if self.fetch_mode == "composite":
+                weather_data = self._get_composite_weather(longitude, latitude, hours=hours)
+                if weather_data:
+                    return weather_data
+                logger.warning("综合天气接口获取失败，回退到分别获取实时和小时数据")
             
-            return realtime_data
+            return self._get_split_weather(longitude, latitude, hours=hours)
             
         except Exception as e:
             logger.error(f"获取天气数据失败: {e}")
             return None
     
-    def _get_realtime_weather(self, longitude: float, latitude: float) -> Optional[WeatherData]:
-        """获取实时天气数据"""
+    def _get_split_weather(self, longitude: float, latitude: float, hours: int) -> Optional[WeatherData]:
+        """分别请求实时和小时级接口"""
+        # 获取实时天气数据
+        realtime_data = self._get_realtime_weather(longitude, latitude)
+        if not realtime_data:
+            return None
+        
+        # 获取小时级预报数据
+        hourly_forecast = self._get_hourly_forecast(longitude, latitude, hours=hours)
+        
+        # 合并数据
+        realtime_data.hourly_forecast = hourly_forecast
+        
+        return realtime_data
+    
+    def _request(self, longitude: float, latitude: float, kind: str, label: str,
+                 params: Optional[Dict[str, Any]] = None,
+                 cache_kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """请求彩云接口，返回result字段；请求失败或状态异常时返回None
+        
+        启用缓存时同一网格内未过期的响应直接从缓存返回；cache_kind用于
+        让同一接口的不同用途使用各自的有效期，默认与接口名相同。
+        """
+        cache_kind = cache_kind or kind
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(cache_kind, longitude, latitude, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"{label}数据命中缓存")
+                return cached
+        
+        url = f"{self.base_url}/{self.api_key}/{longitude},{latitude}/{kind}"
+        
+        headers = {
+            "User-Agent": "WeatherBot/1.0",
+            "Accept": "application/json"
+        }
+        
+        started = time.monotonic()
+        response = self.transport.get(url, headers=headers, params=params, api_key=self.api_key)
+        response.raise_for_status()
+        
+        data = response.json()
+        logger.info(f"获取{label}数据成功: {data.get('status')}")
+        
+        if data.get("status") != "ok":
+            logger.error(f"{label}API返回错误状态: {data.get('status')}")
+            return None
+        if self.hedger:
+            # 对冲延迟只按真实的网络请求估计，缓存命中不计入
+            self.hedger.tracker.record(time.monotonic() - started)
+        
+        result = data.get("result", {})
+        if cache_key:
+            ttl = self.cache.get_ttl(cache_kind)
+            if usage_tracker:
+                # 预计超出当日配额时延长缓存有效期，后续请求更多地命中缓存
+                ttl *= usage_tracker.get_stretch_factor([urlsplit(url).hostname or ""])
+            self.cache.put(cache_key, result, ttl)
+        return result
+    
+    def _get_composite_weather(self, longitude: float, latitude: float, hours: int) -> Optional[WeatherData]:
+        """通过综合接口一次获取实时、小时、天级和预警数据"""
         try:
-            url = f"{self.base_url}/{self.api_key}/{longitude},{latitude}/realtime"
-            
-            headers = {
-                "User-Agent": "WeatherBot/1.0",
-                "Accept": "application/json"
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            result = self._request(
+                longitude, latitude, "weather", "综合天气",
+                params={"hourlysteps": max(hours, 1), "dailysteps": self.daily_steps, "alert": "true"}
+            )
+            if not result or "realtime" not in result:
+                return None
             
-            data = response.json()
-            logger.info(f"获取实时天气数据成功: {data.get('status')}")
+            weather_data = self._parse_realtime(result["realtime"])
+            weather_data.hourly_forecast = self._parse_hourly(result.get("hourly", {}), hours)
+            weather_data.daily_forecast = self._parse_daily(result.get("daily", {}), self.daily_steps)
+            weather_data.alerts = self._parse_alerts(result.get("alert", {}))
+            logger.info(
+                f"综合接口返回{len(weather_data.hourly_forecast)}小时、"
+                f"{len(weather_data.daily_forecast)}天预报，{len(weather_data.alerts)}条预警"
+            )
+            return weather_data
             
-            if data.get("status") != "ok":
-                logger.error(f"实时天气API返回错误状态: {data.get('status')}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"请求综合天气API失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"解析综合天气数据失败: {e}")
+            return None
+    
+    def get_minutely_nowcast(self, longitude: float, latitude: float) -> Optional[MinutelyNowcast]:
+        """获取未来2小时逐分钟降水预报"""
+        try:
+            result = self._request(longitude, latitude, "minutely", "分钟级降水")
+            if not result or "minutely" not in result:
                 return None
+            minutely = result["minutely"]
+            return MinutelyNowcast(
+                precipitation=minutely.get("precipitation_2h", []),
+                probability=minutely.get("probability", []),
+                description=minutely.get("description") or result.get("forecast_keypoint", "")
+            )
             
-            result = data.get("result", {})
-            realtime = result.get("realtime", {})
-            
-            # 解析天气数据
-            weather_data = WeatherData(
-                temperature=realtime.get("temperature", 0),
-                humidity=realtime.get("humidity", 0) * 100,  # 转换为百分比
-                pressure=realtime.get("pressure", 0),
-                wind_speed=realtime.get("wind", {}).get("speed", 0),
-                wind_direction=realtime.get("wind", {}).get("direction", 0),
-                visibility=realtime.get("visibility", 0),
-                weather_desc=self._get_weather_description(realtime.get("skycon", "")),
-                precipitation=realtime.get("precipitation", {}).get("local", {}).get("intensity", 0),
-                aqi=realtime.get("air_quality", {}).get("aqi", {}).get("chn", None),
-                pm25=realtime.get("air_quality", {}).get("pm25", None),
-                pm10=realtime.get("air_quality", {}).get("pm10", None)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"请求分钟级降水API失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"解析分钟级降水数据失败: {e}")
+            return None
+    
+    def get_alerts(self, longitude: float, latitude: float) -> Optional[List[WeatherAlert]]:
+        """只获取生效中的预警：请求实时接口并附带预警，不拉取预报数据"""
+        try:
+            result = self._request(
+                longitude, latitude, "realtime", "天气预警",
+                params={"alert": "true"}, cache_kind="alert"
             )
+            if result is None:
+                return None
+            return self._parse_alerts(result.get("alert", {}))
             
-            return weather_data
+        except requests.exceptions.RequestException as e:
+            logger.error(f"请求天气预警API失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"解析天气预警数据失败: {e}")
+            return None
+    
+    def _get_realtime_weather(self, longitude: float, latitude: float) -> Optional[WeatherData]:
+        """获取实时天气数据"""
+        try:
+            result = self._request(longitude, latitude, "realtime", "实时天气")
+            if result is None:
+                return None
+            return self._parse_realtime(result.get("realtime", {}))
             
         except requests.exceptions.RequestException as e:
             logger.error(f"请求实时天气API失败: {e}")
@@ -105,79 +298,125 @@ class WeatherAPI:
             logger.error(f"解析实时天气数据失败: {e}")
             return None
     
-    def _get_hourly_forecast(self, longitude: float, latitude: float, hours: int = 2) -> List[HourlyWeatherData]:
+    def _get_hourly_forecast(self, longitude: float, latitude: float, hours: int = 2) -> ForecastSeries:
         """获取小时级预报数据"""
         try:
-            url = f"{self.base_url}/{self.api_key}/{longitude},{latitude}/hourly"
-            
-            headers = {
-                "User-Agent": "WeatherBot/1.0",
-                "Accept": "application/json"
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.info(f"获取小时级预报数据成功: {data.get('status')}")
-            
-            if data.get("status") != "ok":
-                logger.error(f"小时级预报API返回错误状态: {data.get('status')}")
-                return []
-            
-            result = data.get("result", {})
-            hourly = result.get("hourly", {})
-            
-            # 获取各项数据的时间序列
-            temperature = hourly.get("temperature", [])
-            humidity = hourly.get("humidity", [])
-            skycon = hourly.get("skycon", [])
-            wind = hourly.get("wind", [])
-            precipitation = hourly.get("precipitation", [])
-            
-            hourly_data = []
-            current_time = datetime.now()
-            
-            # 只取未来指定小时数的数据
-            for i in range(min(hours, len(temperature))):
-                try:
-                    forecast_time = current_time + timedelta(hours=i+1)
-                    
-                    # 安全获取数据，处理数组长度不一致的情况
-                    temp = temperature[i].get("value", 0) if i < len(temperature) else 0
-                    humid = humidity[i].get("value", 0) * 100 if i < len(humidity) else 0  # 转换为百分比
-                    sky = skycon[i].get("value", "") if i < len(skycon) else ""
-                    wind_data = wind[i] if i < len(wind) else {}
-                    precip = precipitation[i].get("value", 0) if i < len(precipitation) else 0
-                    
-                    wind_speed = wind_data.get("speed", 0) if wind_data else 0
-                    wind_direction = wind_data.get("direction", 0) if wind_data else 0
-                    
-                    hourly_weather = HourlyWeatherData(
-                        datetime=forecast_time,
-                        temperature=temp,
-                        humidity=humid,
-                        weather_desc=self._get_weather_description(sky),
-                        wind_speed=wind_speed,
-                        wind_direction=wind_direction,
-                        precipitation=precip
-                    )
-                    
-                    hourly_data.append(hourly_weather)
-                    
-                except Exception as e:
-                    logger.warning(f"解析第{i+1}小时预报数据失败: {e}")
-                    continue
-            
-            logger.info(f"成功获取{len(hourly_data)}小时的预报数据")
-            return hourly_data
+            result = self._request(longitude, latitude, "hourly", "小时级预报")
+            if result is None:
+                return ForecastSeries()
+            return self._parse_hourly(result.get("hourly", {}), hours)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"请求小时级预报API失败: {e}")
-            return []
+            return ForecastSeries()
         except Exception as e:
             logger.error(f"解析小时级预报数据失败: {e}")
-            return []
+            return ForecastSeries()
+    
+    def _parse_realtime(self, realtime: Dict[str, Any]) -> WeatherData:
+        """解析realtime字段"""
+        return WeatherData(
+            temperature=realtime.get("temperature", 0),
+            humidity=realtime.get("humidity", 0) * 100,  # 转换为百分比
+            pressure=realtime.get("pressure", 0),
+            wind_speed=realtime.get("wind", {}).get("speed", 0),
+            wind_direction=realtime.get("wind", {}).get("direction", 0),
+            visibility=realtime.get("visibility", 0),
+            weather_desc=self._get_weather_description(realtime.get("skycon", "")),
+            precipitation=realtime.get("precipitation", {}).get("local", {}).get("intensity", 0),
+            aqi=realtime.get("air_quality", {}).get("aqi", {}).get("chn", None),
+            pm25=realtime.get("air_quality", {}).get("pm25", None),
+            pm10=realtime.get("air_quality", {}).get("pm10", None)
+        )
+    
+    def _parse_hourly(self, hourly: Dict[str, Any], hours: int) -> ForecastSeries:
+        """解析hourly字段，只取未来指定小时数的数据，直接写入列式序列"""
+        # 获取各项数据的时间序列
+        temperature = hourly.get("temperature", [])
+        humidity = hourly.get("humidity", [])
+        skycon = hourly.get("skycon", [])
+        wind = hourly.get("wind", [])
+        precipitation = hourly.get("precipitation", [])
+        
+        hourly_data = ForecastSeries()
+        current_time = datetime.now()
+        
+        for i in range(min(hours, len(temperature))):
+            try:
+                forecast_time = current_time + timedelta(hours=i+1)
+                
+                # 安全获取数据，处理数组长度不一致的情况
+                temp = temperature[i].get("value", 0) if i < len(temperature) else 0
+                humid = humidity[i].get("value", 0) * 100 if i < len(humidity) else 0  # 转换为百分比
+                sky = skycon[i].get("value", "") if i < len(skycon) else ""
+                wind_data = wind[i] if i < len(wind) else {}
+                precip = precipitation[i].get("value", 0) if i < len(precipitation) else 0
+                
+                wind_speed = wind_data.get("speed", 0) if wind_data else 0
+                wind_direction = wind_data.get("direction", 0) if wind_data else 0
+                
+                hourly_data.append(
+                    forecast_time,
+                    temperature=float(temp),
+                    humidity=float(humid),
+                    weather_desc=self._get_weather_description(sky),
+                    wind_speed=float(wind_speed),
+                    wind_direction=float(wind_direction),
+                    precipitation=float(precip)
+                )
+                
+            except Exception as e:
+                logger.warning(f"解析第{i+1}小时预报数据失败: {e}")
+                continue
+        
+        logger.info(f"成功获取{len(hourly_data)}小时的预报数据")
+        return hourly_data
+    
+    def _parse_daily(self, daily: Dict[str, Any], days: int) -> List[DailyWeatherData]:
+        """解析daily字段"""
+        temperature = daily.get("temperature", [])
+        skycon = daily.get("skycon", [])
+        precipitation = daily.get("precipitation", [])
+        
+        daily_data = []
+        for i in range(min(days, len(temperature))):
+            try:
+                temp = temperature[i]
+                sky = skycon[i].get("value", "") if i < len(skycon) else ""
+                precip = precipitation[i].get("avg", 0) if i < len(precipitation) else 0
+                daily_data.append(DailyWeatherData(
+                    date=str(temp.get("date", ""))[:10],
+                    temperature_max=temp.get("max", 0),
+                    temperature_min=temp.get("min", 0),
+                    weather_desc=self._get_weather_description(sky),
+                    precipitation=precip
+                ))
+            except Exception as e:
+                logger.warning(f"解析第{i+1}天预报数据失败: {e}")
+                continue
+        
+        return daily_data
+    
+    def _parse_alerts(self, alert: Dict[str, Any]) -> List[WeatherAlert]:
+        """解析alert字段"""
+        alerts = []
+        for item in alert.get("content", []) or []:
+            try:
+                pub_timestamp = item.get("pubtimestamp")
+                alerts.append(WeatherAlert(
+                    alert_id=str(item.get("alertId") or f"{item.get('title', '')}@{pub_timestamp}"),
+                    title=item.get("title", ""),
+                    description=item.get("description", ""),
+                    code=str(item.get("code", "")),
+                    status=item.get("status", ""),
+                    source=item.get("source", ""),
+                    publish_time=datetime.fromtimestamp(pub_timestamp) if pub_timestamp else None
+                ))
+            except Exception as e:
+                logger.warning(f"解析预警数据失败: {e}")
+                continue
+        
+        return alerts
     
     def _get_weather_description(self, skycon: str) -> str:
         """将skycon代码转换为中文描述"""
@@ -0,0 +1,216 @@
+"""天气接口响应缓存模块"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from .config import config
+
+# 统计计数累计到该次数或间隔该秒数后写入磁盘
+STATS_FLUSH_EVENTS = 100
+STATS_FLUSH_INTERVAL = 60.0
+
+class WeatherCache:
+    """两级天气响应缓存：内存LRU + SQLite磁盘
+    
+    坐标按网格对齐后作为键，相邻位置共用同一份数据；不同数据类型使用不同的
+    有效期。磁盘层在重启后继续提供未过期的数据。命中统计分批累加到磁盘，
+    task_manager.py status等其他进程也能读到运行中机器人的累计统计。
+    """
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256, grid: float = 0.01,
+                 ttls: Optional[Dict[str, float]] = None, default_ttl: float = 300.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.grid = grid
+        self.ttls: Dict[str, float] = ttls or {}
+        self.default_ttl = default_ttl
+        
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (过期时间, 数据)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}  # 尚未写入磁盘的计数
+        self._stats_events = 0
+        self._stats_flushed_at = time.monotonic()
+    
+    def snap(self, longitude: float, latitude: float) -> Tuple[float, float]:
+        """坐标对齐到网格"""
+        if self.grid <= 0:
+            return longitude, latitude
+        return (round(round(longitude / self.grid) * self.grid, 6),
+                round(round(latitude / self.grid) * self.grid, 6))
+    
+    def make_key(self, kind: str, longitude: float, latitude: float,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """由数据类型、网格坐标和请求参数生成缓存键"""
+        snapped_longitude, snapped_latitude = self.snap(longitude, latitude)
+        key = f"{kind}:{snapped_longitude:.6f},{snapped_latitude:.6f}"
+        if params:
+            key += "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return key
+    
+    def get_ttl(self, kind: str) -> float:
+        """数据类型对应的有效期（秒）"""
+        return self.ttls.get(kind, self.default_ttl)
+    
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """打开磁盘缓存（首次使用时建表），调用方需持有锁"""
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+    
+    def _remember(self, key: str, expires_at: float, value: Any):
+        """写入内存层，超出容量时淘汰最久未使用的条目，调用方需持有锁"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._count("evictions")
+    
+    def _count(self, name: str):
+        """累加统计计数，攒够一批后写入磁盘，调用方需持有锁"""
+        self._stats[name] += 1
+        self._stats_events += 1
+        if (self._stats_events >= STATS_FLUSH_EVENTS
+                or time.monotonic() - self._stats_flushed_at >= STATS_FLUSH_INTERVAL):
+            self._flush_stats()
+    
+    def _flush_stats(self):
+        """把尚未写入的计数累加到磁盘，调用方需持有锁；没有磁盘层时计数留在内存"""
+        self._stats_flushed_at = time.monotonic()
+        try:
+            conn = self._connect()
+            if conn is None:
+                return
+            conn.executemany("""
+                INSERT INTO weather_cache_stats (name, value) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+            """, [(name, value) for name, value in self._stats.items() if value])
+        except sqlite3.Error as e:
+            logger.warning(f"写入天气缓存统计失败: {e}")
+            return
+        self._stats = dict.fromkeys(self._stats, 0)
+        self._stats_events = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，依次查找内存层和磁盘层"""
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached:
+                expires_at, value = cached
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._count("memory_hits")
+                    return value
+                del self._memory[key]
+            
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, expires_at FROM weather_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone() if conn else None
+            except sqlite3.Error as e:
+                logger.warning(f"读取天气磁盘缓存失败: {e}")
+                row = None
+            if row:
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self._count("disk_hits")
+                return value
+            
+            self._count("misses")
+            return None
+    
+    def put(self, key: str, value: Any, ttl: float):
+        """写入两级缓存"""
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            try:
+                conn = self._connect()
+                if conn is None:
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO weather_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    conn.execute("DELETE FROM weather_cache WHERE expires_at <= ?", (time.time(),))
+            except sqlite3.Error as e:
+                logger.warning(f"写入天气磁盘缓存失败: {e}")
+    
+    def clear(self):
+        """清空两级缓存和命中统计"""
+        with self._lock:
+            self._memory.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+            self._stats_events = 0
+            conn = self._connect()
+            if conn:
+                conn.execute("DELETE FROM weather_cache")
+                conn.execute("DELETE FROM weather_cache_stats")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """命中、未命中和淘汰统计，有磁盘层时为所有进程的累计值"""
+        with self._lock:
+            self._flush_stats()
+            stats = dict(self._stats)
+            try:
+                conn = self._connect()
+                rows = conn.execute("SELECT name, value FROM weather_cache_stats").fetchall() if conn else []
+            except sqlite3.Error as e:
+                logger.warning(f"读取天气缓存统计失败: {e}")
+                rows = []
+            for name, value in rows:
+                if name in stats:
+                    stats[name] += value
+            stats["size"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hits"] = hits
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
+
+# 全局天气缓存，未启用时为None
+weather_cache = WeatherCache(
+    config.weather_cache_path or None,
+    max_entries=config.weather_cache_max_entries,
+    grid=config.weather_cache_grid,
+    ttls={
+        "realtime": config.weather_cache_ttl_realtime,
+        "hourly": config.weather_cache_ttl_hourly,
+        "minutely": config.weather_cache_ttl_minutely,
+        "alert": config.weather_cache_ttl_alert,
+        # 综合接口包含实时数据，按实时数据的有效期缓存
+        "weather": config.weather_cache_ttl_realtime,
+    },
+    default_ttl=config.weather_cache_ttl_realtime
+) if config.weather_cache_enabled else None
@@ -0,0 +1,296 @@
+"""天气历史存储与滚动统计模块"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Optional, Tuple
+from loguru import logger
+from .weather import WeatherData
+from .config import config
+
+# 单次观测最多计入1小时的降水，避免长时间未采样时高估累计降水
+MAX_RAIN_INTERVAL = 3600.0
+# 当日累计降水超过该值（mm）记为雨天
+RAINY_DAY_THRESHOLD = 0.1
+
+class RollingWindow:
+    """固定时长的滑动窗口统计
+    
+    单调队列维护窗口内的最高和最低气温，累加和维护平均气温、累计降水和平均AQI，
+    插入均摊O(1)，查询O(1)。
+    """
+    
+    def __init__(self, span: float):
+        self.span = span
+        self._samples: Deque[Tuple[int, float, float, float, Optional[int]]] = deque()  # (序号, 时间, 气温, 降水, AQI)
+        self._max: Deque[Tuple[int, float]] = deque()  # 气温单调递减
+        self._min: Deque[Tuple[int, float]] = deque()  # 气温单调递增
+        self._seq = 0
+        self._temperature_sum = 0.0
+        self._rain_sum = 0.0
+        self._aqi_sum = 0
+        self._aqi_count = 0
+    
+    def add(self, observed_at: float, temperature: float, rain: float, aqi: Optional[int]):
+        """加入一次观测并移出窗口外的旧观测"""
+        self._seq += 1
+        self._samples.append((self._seq, observed_at, temperature, rain, aqi))
+        self._temperature_sum += temperature
+        self._rain_sum += rain
+        if aqi is not None:
+            self._aqi_sum += aqi
+            self._aqi_count += 1
+        
+        while self._max and self._max[-1][1] <= temperature:
+            self._max.pop()
+        self._max.append((self._seq, temperature))
+        while self._min and self._min[-1][1] >= temperature:
+            self._min.pop()
+        self._min.append((self._seq, temperature))
+        
+        self.expire(observed_at)
+    
+    def expire(self, now: float):
+        """移出早于窗口起点的观测"""
+        while self._samples and self._samples[0][1] <= now - self.span:
+            seq, _, temperature, rain, aqi = self._samples.popleft()
+            self._temperature_sum -= temperature
+            self._rain_sum -= rain
+            if aqi is not None:
+                self._aqi_sum -= aqi
+                self._aqi_count -= 1
+            if self._max and self._max[0][0] == seq:
+                self._max.popleft()
+            if self._min and self._min[0][0] == seq:
+                self._min.popleft()
+    
+    @property
+    def oldest(self) -> Optional[Tuple[float, float]]:
+        """窗口内最早一次观测的(时间, 气温)"""
+        if not self._samples:
+            return None
+        _, observed_at, temperature, _, _ = self._samples[0]
+        return observed_at, temperature
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """窗口统计结果"""
+        count = len(self._samples)
+        return {
+            "count": count,
+            "temperature_min": self._min[0][1] if self._min else None,
+            "temperature_max": self._max[0][1] if self._max else None,
+            "temperature_mean": self._temperature_sum / count if count else None,
+            "rainfall": max(self._rain_sum, 0.0),
+            "aqi_mean": self._aqi_sum / self._aqi_count if self._aqi_count else None,
+        }
+
+class LocationHistory:
+    """单个位置的滚动统计"""
+    
+    def __init__(self):
+        self.day = RollingWindow(86400)
+        self.week = RollingWindow(7 * 86400)
+        self.last_observed_at: Optional[float] = None
+        self.last_precipitation = 0.0
+        self.daily_rain: Dict[str, float] = {}  # 日期 -> 当日累计降水
+    
+    def add(self, observed_at: float, temperature: float, precipitation: float, aqi: Optional[int]):
+        """加入一次观测，降水强度按与上次观测的间隔积分为降水量"""
+        rain = 0.0
+        if self.last_observed_at is not None:
+            interval = min(max(observed_at - self.last_observed_at, 0.0), MAX_RAIN_INTERVAL)
+            rain = (self.last_precipitation + precipitation) / 2 * interval / 3600
+        self.last_observed_at = observed_at
+        self.last_precipitation = precipitation
+        
+        self.day.add(observed_at, temperature, rain, aqi)
+        self.week.add(observed_at, temperature, rain, aqi)
+        
+        date = datetime.fromtimestamp(observed_at).strftime("%Y-%m-%d")
+        self.daily_rain[date] = self.daily_rain.get(date, 0.0) + rain
+        if len(self.daily_rain) > 8:
+            self.daily_rain.pop(min(self.daily_rain))
+    
+    def rainy_streak(self, now: float) -> int:
+        """截至今天连续有降水的天数"""
+        streak = 0
+        day = datetime.fromtimestamp(now)
+        while self.daily_rain.get(day.strftime("%Y-%m-%d"), 0.0) > RAINY_DAY_THRESHOLD:
+            streak += 1
+            day -= timedelta(days=1)
+        return streak
+
+class WeatherHistory:
+    """按位置追加保存天气快照的本地历史库
+    
+    每次获取的实况和小时预报写入SQLite（只追加），同时在内存中增量维护24小时
+    和7天的滚动统计，查询不再扫描历史。超过保留期的数据由后台线程清理，
+    7天之前的数据压缩为每小时一条。
+    """
+    
+    def __init__(self, path: Optional[str] = None, retention_days: float = 30.0,
+                 compact_interval: float = 3600.0, min_interval: float = 300.0):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.compact_interval = compact_interval
+        self.min_interval = min_interval  # 同一位置两次记录的最小间隔，避免缓存命中时重复记录
+        
+        self._locations: Dict[str, LocationHistory] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load()
+    
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """打开数据库（首次使用时建表），调用方需持有锁"""
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_history (
+                    location TEXT NOT NULL,
+                    observed_at REAL NOT NULL,
+                    temperature REAL NOT NULL,
+                    humidity REAL NOT NULL,
+                    precipitation REAL NOT NULL,
+                    aqi INTEGER,
+                    weather_desc TEXT NOT NULL,
+                    forecast TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_weather_history_location
+                ON weather_history (location, observed_at)
+            """)
+            self._conn = conn
+        return self._conn
+    
+    def _load(self):
+        """启动时用最近7天的记录重建滚动统计"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                if conn is None:
+                    return
+                rows = conn.execute(
+                    "SELECT location, observed_at, temperature, precipitation, aqi FROM weather_history "
+                    "WHERE observed_at > ? ORDER BY observed_at",
+                    (time.time() - 7 * 86400,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"读取天气历史失败: {e}")
+                return
+            for location, observed_at, temperature, precipitation, aqi in rows:
+                self._locations.setdefault(location, LocationHistory()).add(observed_at, temperature, precipitation, aqi)
+            if rows:
+                logger.info(f"已从天气历史恢复 {len(rows)} 条记录（{len(self._locations)} 个位置）")
+    
+    def record(self, location: str, weather_data: WeatherData, observed_at: Optional[float] = None) -> bool:
+        """记录一次天气快照并更新滚动统计，距上次记录过近时跳过"""
+        observed_at = observed_at or time.time()
+        forecast = weather_data.hourly_forecast
+        forecast_json = json.dumps(
+            {"start": forecast.timestamps[0], **forecast.columns()}, ensure_ascii=False
+        ) if forecast else None
+        
+        with self._lock:
+            history = self._locations.setdefault(location, LocationHistory())
+            if history.last_observed_at and observed_at - history.last_observed_at < self.min_interval:
+                return False
+            history.add(observed_at, weather_data.temperature, weather_data.precipitation, weather_data.aqi)
+            try:
+                conn = self._connect()
+                if conn:
+                    conn.execute(
+                        "INSERT INTO weather_history (location, observed_at, temperature, humidity, "
+                        "precipitation, aqi, weather_desc, forecast) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (location, observed_at, weather_data.temperature, weather_data.humidity,
+                         weather_data.precipitation, weather_data.aqi, weather_data.weather_desc, forecast_json)
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"写入天气历史失败: {e}")
+        return True
+    
+    def get_summary(self, location: str) -> Optional[Dict[str, Any]]:
+        """位置的24小时和7天统计、约24小时前的气温和连续降雨天数"""
+        now = time.time()
+        with self._lock:
+            history = self._locations.get(location)
+            if history is None or history.last_observed_at is None:
+                return None
+            # 窗口只在插入时滑动，查询时先移出已过期的观测
+            history.day.expire(now)
+            history.week.expire(now)
+            oldest = history.day.oldest
+            return {
+                "24h": history.day.snapshot(),
+                "7d": history.week.snapshot(),
+                # 最早的观测距今超过20小时才用于与昨日对比
+                "temperature_yesterday": oldest[1] if oldest and now - oldest[0] >= 20 * 3600 else None,
+                "rainy_streak": history.rainy_streak(now),
+            }
+    
+    def compact(self) -> int:
+        """删除超过保留期的记录，7天前的记录每小时只保留最后一条，返回删除条数"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                deleted = conn.execute(
+                    "DELETE FROM weather_history WHERE observed_at < ?", (now - self.retention,)
+                ).rowcount
+                deleted += conn.execute("""
+                    DELETE FROM weather_history
+                    WHERE observed_at < ? AND rowid NOT IN (
+                        SELECT MAX(rowid) FROM weather_history
+                        WHERE observed_at < ?
+                        GROUP BY location, CAST(observed_at / 3600 AS INTEGER)
+                    )
+                """, (now - 7 * 86400, now - 7 * 86400)).rowcount
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.warning(f"压缩天气历史失败: {e}")
+                return 0
+        if deleted:
+            logger.info(f"天气历史压缩完成，删除 {deleted} 条记录")
+        return deleted
+    
+    def start_compactor(self):
+        """启动后台压缩线程"""
+        if not self.path or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._compact_loop, name="weather-history-compactor", daemon=True)
+        self._thread.start()
+        logger.info("天气历史压缩线程已启动")
+    
+    def stop_compactor(self):
+        """停止后台压缩线程"""
+        self._stop_event.set()
+    
+    def _compact_loop(self):
+        """后台压缩主循环"""
+        while not self._stop_event.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"天气历史压缩异常: {e}")
+
+# 全局天气历史，未启用时为None
+weather_history = WeatherHistory(
+    config.weather_history_path or None,
+    retention_days=config.weather_history_retention_days,
+    compact_interval=config.weather_history_compact_interval
+) if config.weather_history_enabled else None
@@ -0,0 +1,139 @@
+"""备用天气数据源模块"""
+import requests
+from datetime import datetime
+from typing import Any, Dict, Optional
+from loguru import logger
+from .weather import WeatherProvider, WeatherData
+from .forecast_series import ForecastSeries
+from .http_client import HttpTransport, transport as shared_transport
+from .hedging import Hedger, LatencyTracker
+from .config import config
+
+# WMO天气代码到中文描述，措辞与彩云skycon的描述保持一致
+WMO_WEATHER_CODES = {
+    0: "晴天", 1: "多云", 2: "多云", 3: "阴天",
+    45: "雾", 48: "雾",
+    51: "小雨", 53: "小雨", 55: "中雨", 56: "冻雨", 57: "冻雨",
+    61: "小雨", 63: "中雨", 65: "大雨", 66: "冻雨", 67: "冻雨",
+    71: "小雪", 73: "中雪", 75: "大雪", 77: "小雪",
+    80: "小雨", 81: "中雨", 82: "暴雨", 85: "小雪", 86: "大雪",
+    95: "雷阵雨", 96: "雷阵雨", 99: "雷阵雨",
+}
+OPEN_METEO_CURRENT = (
+    "temperature_2m,relative_humidity_2m,surface_pressure,wind_speed_10m,"
+    "wind_direction_10m,weather_code,precipitation,visibility"
+)
+OPEN_METEO_HOURLY = (
+    "temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m,"
+    "wind_direction_10m,precipitation"
+)
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo天气数据源
+    
+    免密钥，单次请求取回实况和小时预报；不提供空气质量和预警，
+    这些字段在映射后的WeatherData中为空。
+    """
+    
+    name = "Open-Meteo"
+    
+    def __init__(self, base_url: str = "https://api.open-meteo.com/v1",
+                 transport: Optional[HttpTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport or shared_transport
+    
+    def fetch_weather(self, longitude: float, latitude: float, hours: int) -> Optional[WeatherData]:
+        """获取实况和未来指定小时数的预报"""
+        try:
+            response = self.transport.get(
+                f"{self.base_url}/forecast",
+                headers={"User-Agent": "WeatherBot/1.0", "Accept": "application/json"},
+                params={
+                    "longitude": longitude,
+                    "latitude": latitude,
+                    "current": OPEN_METEO_CURRENT,
+                    "hourly": OPEN_METEO_HOURLY,
+                    "forecast_days": 2 if hours <= 24 else 3,
+                    "timezone": "auto",
+                }
+            )
+            response.raise_for_status()
+            data = response.json()
+            if "current" not in data:
+                logger.error(f"Open-Meteo返回错误: {data.get('reason', '缺少current字段')}")
+                return None
+            
+            weather_data = self._parse_current(data["current"])
+            weather_data.hourly_forecast = self._parse_hourly(data.get("hourly", {}), hours)
+            logger.info(f"获取Open-Meteo数据成功，{len(weather_data.hourly_forecast)}小时预报")
+            return weather_data
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"请求Open-Meteo失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"解析Open-Meteo数据失败: {e}")
+            return None
+    
+    def _parse_current(self, current: Dict[str, Any]) -> WeatherData:
+        """解析current字段，单位换算为与彩云一致"""
+        # current的降水量是上一个统计间隔内的累计值，换算为每小时强度
+        interval = current.get("interval") or 3600
+        return WeatherData(
+            temperature=current.get("temperature_2m") or 0,
+            humidity=current.get("relative_humidity_2m") or 0,
+            pressure=(current.get("surface_pressure") or 0) * 100,  # hPa转换为Pa
+            wind_speed=current.get("wind_speed_10m") or 0,
+            wind_direction=current.get("wind_direction_10m") or 0,
+            visibility=(current.get("visibility") or 0) / 1000,  # m转换为km
+            weather_desc=WMO_WEATHER_CODES.get(current.get("weather_code"), "未知天气"),
+            precipitation=(current.get("precipitation") or 0) * 3600 / interval,
+            source=self.name
+        )
+    
+    def _parse_hourly(self, hourly: Dict[str, Any], hours: int) -> ForecastSeries:
+        """解析hourly字段，跳过当前整点及之前的时刻"""
+        times = hourly.get("time", [])
+        temperature = hourly.get("temperature_2m", [])
+        humidity = hourly.get("relative_humidity_2m", [])
+        weather_code = hourly.get("weather_code", [])
+        wind_speed = hourly.get("wind_speed_10m", [])
+        wind_direction = hourly.get("wind_direction_10m", [])
+        precipitation = hourly.get("precipitation", [])
+        
+        def value(column, i):
+            return (column[i] if i < len(column) else None) or 0
+        
+        series = ForecastSeries()
+        now = datetime.now()
+        for i, time_text in enumerate(times):
+            if len(series) >= hours:
+                break
+            forecast_time = datetime.fromisoformat(time_text)
+            if forecast_time <= now:
+                continue
+            series.append(
+                forecast_time,
+                temperature=float(value(temperature, i)),
+                humidity=float(value(humidity, i)),
+                weather_desc=WMO_WEATHER_CODES.get(weather_code[i] if i < len(weather_code) else None, "未知天气"),
+                wind_speed=float(value(wind_speed, i)),
+                wind_direction=float(value(wind_direction, i)),
+                precipitation=float(value(precipitation, i))
+            )
+        return series
+
+def create_provider(name: str) -> Optional[WeatherProvider]:
+    """按名称创建备用数据源，none或未知名称返回None"""
+    if name == "open-meteo":
+        return OpenMeteoProvider(config.open_meteo_base_url)
+    if name and name != "none":
+        logger.warning(f"未知的备用天气数据源: {name}")
+    return None
+
+# 全局备用数据源和对冲执行器，各天气任务共用，彩云的耗时分布因此合并统计
+fallback_provider = create_provider(config.weather_fallback_provider)
+weather_hedger = Hedger(
+    LatencyTracker(default=config.weather_hedge_delay),
+    quantile=config.weather_hedge_quantile
+) if fallback_provider else None
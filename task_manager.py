@@ -6,7 +6,10 @@
 import argparse
 import sys
 from loguru import logger
-from src import MultiTaskBot, config
+from src import MultiTaskBot, HotSearchAPI, config
+from src.weather_cache import weather_cache
+from src.usage import usage_tracker
+from src.circuit_breaker import OPEN, STATE_NAMES, circuit_breakers
 
 def setup_logging(level="INFO"):
     """设置日志配置"""
@@ -86,13 +89,50 @@ def show_status(bot):
         else:
             print(f"   上次运行: 从未运行")
         
+        latency = task_info.get('last_delivery_latency')
+        if latency is not None:
+            print(f"   触发到送达: {latency:.2f}秒")
+        
         last_error = task_info.get('last_error')
         if last_error:
             print(f"   最后错误: {last_error}")
+    
+    if weather_cache:
+        stats = weather_cache.get_stats()
+        print(f"\n🗄️ 天气缓存（累计）: 命中 {stats['hits']} (内存 {stats['memory_hits']} / 磁盘 {stats['disk_hits']}), "
+              f"未命中 {stats['misses']}, 淘汰 {stats['evictions']}, 命中率 {stats['hit_rate']:.0%}")
+    
+    if usage_tracker:
+        print("\n📈 今日上游用量:")
+        usage = usage_tracker.get_stats()
+        if not usage:
+            print("  暂无调用")
+        for item in usage:
+            line = (f"  {item['host']} [{item['api_key']}]: 调用 {item['calls']} 次, 失败 {item['errors']} 次, "
+                    f"接收 {item['bytes'] / 1024:.1f}KB, 平均耗时 {item['avg_latency']:.2f}秒, "
+                    f"最大耗时 {item['max_latency']:.2f}秒")
+            if item["budget"]:
+                line += f", 预算 {item['budget']:.0f} 次/天, 预计全天 {item['projected']:.0f} 次"
+                if item["projected"] > item["budget"]:
+                    line += " ⚠️"
+            print(line)
+    
+    breakers = circuit_breakers.get_stats()
+    if breakers:
+        print("\n🔌 热搜数据源熔断器:")
+        for item in breakers:
+            icon = "🔴" if item["state"] == OPEN else "🟢" if item["state"] == "closed" else "🟡"
+            line = (f"  {icon} {item['name']}: {STATE_NAMES[item['state']]}, 最近 {item['calls']} 次调用失败率 "
+                    f"{item['failure_rate']:.0%}, 超时 {item['timeout']:.1f}秒")
+            if item["p99"] is not None:
+                line += f" (p99 {item['p99']:.2f}秒)"
+            if item["retry_in"] is not None:
+                line += f", {item['retry_in']:.0f}秒后探测"
+            print(line)
 
 def add_hotsearch_task(bot, source_type):
     """添加热搜任务"""
-    available_sources = ["weibo", "zhihu", "douyin", "toutiao", "bilibili", "baidu"]
+    available_sources = HotSearchAPI().get_available_sources()
     if source_type not in available_sources:
         print(f"❌ 不支持的热搜源: {source_type}")
         print(f"支持的热搜源: {', '.join(available_sources)}")
@@ -108,17 +148,8 @@ def add_hotsearch_task(bot, source_type):
 def list_available_sources():
     """列出可用的热搜源"""
     print("📋 可用的热搜数据源:")
-    sources = [
-        ("weibo", "微博热搜"),
-        ("zhihu", "知乎热榜"),
-        ("douyin", "抖音热搜"),
-        ("toutiao", "今日头条热搜"),
-        ("bilibili", "哔哩哔哩热榜"),
-        ("baidu", "百度热搜")
-    ]
-    
-    for code, name in sources:
-        print(f"  📊 {code} - {name}")
+    for code, definition in HotSearchAPI().api_configs.items():
+        print(f"  📊 {code} - {definition['name']}")
 
 def main():
     """主函数"""
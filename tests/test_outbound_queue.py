@@ -0,0 +1,56 @@
+"""出站队列测试"""
+import os
+import unittest
+from unittest import mock
+
+# src.config在导入时读取环境变量，必填项先给出占位值
+os.environ.setdefault("CAIYUN_API_KEY", "test")
+os.environ.setdefault("DINGTALK_WEBHOOK", "https://oapi.dingtalk.com/robot/send?access_token=test")
+
+from src.config import Config
+from src.dingtalk import DingTalkBot
+from src.outbound_queue import OutboundQueue, MessagePriority
+
+class FakeResponse:
+    """钉钉成功响应"""
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return {"errcode": 0, "errmsg": "ok"}
+
+class FakeTransport:
+    """记录发出的请求，不访问网络"""
+    
+    def __init__(self):
+        self.posts = []
+    
+    def post(self, url, **kwargs):
+        self.posts.append(url)
+        return FakeResponse()
+
+class LowRateLimitTest(unittest.TestCase):
+    """每分钟额度不大于摘要预留额度时，摘要消息仍能发出"""
+    
+    def test_reserve_clamped_below_rate_limit(self):
+        with mock.patch.dict(os.environ, {"DINGTALK_RATE_LIMIT": "3", "OUTBOUND_DIGEST_RESERVE": "5"}):
+            config = Config.from_env()
+        self.assertEqual(config.outbound_digest_reserve, 2)
+    
+    def test_digest_delivered_with_low_rate_limit(self):
+        with mock.patch.dict(os.environ, {"DINGTALK_RATE_LIMIT": "3", "OUTBOUND_DIGEST_RESERVE": "5"}):
+            config = Config.from_env()
+        transport = FakeTransport()
+        bot = DingTalkBot("https://oapi.dingtalk.com/robot/send?access_token=low-rate",
+                          transport=transport, rate_limit=config.dingtalk_rate_limit)
+        queue = OutboundQueue(max_workers=1, digest_reserve=config.outbound_digest_reserve, send_timeout=5)
+        try:
+            sent = queue.send(bot, bot.build_text_payload("热搜"), MessagePriority.DIGEST, timeout=5)
+        finally:
+            queue.stop()
+        self.assertTrue(sent)
+        self.assertEqual(len(transport.posts), 1)
+
+if __name__ == "__main__":
+    unittest.main()